@@ -0,0 +1,336 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from eyesdetecv1 import EYE_STATES, LOG_DTYPE
+
+# ============================================
+# FORMAT DU MAGASIN COLONNAIRE
+# ============================================
+# Un fichier binaire brut par colonne (lu par np.memmap) et un index JSON :
+#   - fichiers déjà ingérés (octets lus, pour l'ingestion incrémentale)
+#   - morceaux (début, fin, unité, t_min, t_max) : un par ingestion de fichier,
+#     triés par temps à l'intérieur, pour ne lire que les lignes d'une requête
+# Les horodatages sont en secondes, heure locale (comme dans les CSV).
+COLUMNS = {
+    'timestamp': np.dtype('<f8'),
+    'ear': np.dtype('<f4'),
+    'eye_state': np.dtype('u1'),
+    'eyes_detected': np.dtype('u1'),
+    'drowsy': np.dtype('u1'),
+    'blinks': np.dtype('<u4'),
+}
+INDEX_FILE = 'index.json'
+CLOSED = EYE_STATES.index('FERME')
+UNKNOWN = EYE_STATES.index('INCONNU')
+GAP_SECONDS = 5.0  # Écart au-delà duquel le temps n'est pas compté comme observé
+GROUPS = {'hour': 3600, 'day': 86400, 'total': None}
+
+
+# ============================================
+# LECTURE DES JOURNAUX
+# ============================================
+
+def parse_csv(text):
+    """Colonnes numpy depuis le texte d'un CSV DataLogger (sans en-tête)"""
+    lines = [line for line in text.splitlines() if line]
+    if not lines:
+        return None
+    cells = np.array([line.split(',') for line in lines])
+    states = cells[:, 2]
+    eye_state = np.zeros(len(lines), dtype=np.uint8)
+    for code, name in enumerate(EYE_STATES):
+        eye_state[states == name] = code
+    return {
+        # 'AAAA-MM-JJ HH:MM:SS' -> secondes (heure locale, sans fuseau)
+        'timestamp': cells[:, 0].astype('datetime64[s]').astype(np.float64),
+        'ear': cells[:, 1].astype(np.float32),
+        'eye_state': eye_state,
+        'eyes_detected': cells[:, 3].astype(np.int64).clip(0, 255).astype(np.uint8),
+        'drowsy': (cells[:, 4] == 'True').astype(np.uint8),
+        'blinks': cells[:, 5].astype(np.uint32),
+    }
+
+
+def parse_bin(data):
+    """Colonnes numpy depuis des enregistrements LOG_DTYPE (journal .bin)"""
+    records = np.frombuffer(data, dtype=LOG_DTYPE)
+    if not len(records):
+        return None
+    # Horodatage Unix -> heure locale, comme les CSV
+    offset = time.localtime(float(records['timestamp'][0])).tm_gmtoff
+    return {
+        'timestamp': records['timestamp'] + offset,
+        'ear': records['ear'],
+        'eye_state': records['eye_state'],
+        'eyes_detected': records['eyes_detected'],
+        'drowsy': records['drowsy'].astype(np.uint8),
+        'blinks': records['blinks'],
+    }
+
+
+def find_logs(paths):
+    """Journaux à ingérer ; un .bin remplace le .csv de même nom (plus précis)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '**', 'drowsiness_*.csv'), recursive=True))
+            files.extend(glob.glob(os.path.join(path, '**', 'drowsiness_*.bin'), recursive=True))
+        else:
+            files.extend(glob.glob(path) or [path])
+    files = sorted(set(os.path.abspath(f) for f in files))
+    binaries = {os.path.splitext(f)[0] for f in files if f.endswith('.bin')}
+    return [f for f in files if f.endswith('.bin') or os.path.splitext(f)[0] not in binaries]
+
+
+# ============================================
+# MAGASIN
+# ============================================
+
+class ColumnStore:
+    """Magasin colonnaire projeté en mémoire, alimenté de façon incrémentale"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as f:
+                self.index = json.load(f)
+        else:
+            self.index = {'rows': 0, 'units': [], 'files': {}, 'chunks': []}
+
+    @property
+    def rows(self):
+        return self.index['rows']
+
+    def column_path(self, name):
+        return os.path.join(self.path, f"{name}.col")
+
+    def column(self, name):
+        """Colonne complète en lecture seule (np.memmap, sans copie)"""
+        if not self.rows:
+            return np.zeros(0, dtype=COLUMNS[name])
+        return np.memmap(self.column_path(name), dtype=COLUMNS[name], mode='r', shape=(self.rows,))
+
+    def _save_index(self):
+        tmp = os.path.join(self.path, INDEX_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, os.path.join(self.path, INDEX_FILE))
+
+    def unit_id(self, unit):
+        if unit not in self.index['units']:
+            self.index['units'].append(unit)
+        return self.index['units'].index(unit)
+
+    def append(self, columns, unit):
+        """Ajouter des lignes (triées par temps) comme un nouveau morceau"""
+        count = len(columns['timestamp'])
+        order = np.argsort(columns['timestamp'], kind='stable')
+        for name, dtype in COLUMNS.items():
+            path = self.column_path(name)
+            with open(path, 'ab') as f:
+                # Ignorer une fin de fichier écrite sans index (ingestion interrompue)
+                f.truncate(self.rows * dtype.itemsize)
+                np.asarray(columns[name], dtype=dtype)[order].tofile(f)
+
+        timestamps = columns['timestamp']
+        self.index['chunks'].append([self.rows, self.rows + count, self.unit_id(unit),
+                                     float(timestamps.min()), float(timestamps.max())])
+        self.index['rows'] += count
+
+    def ingest(self, path, unit=None):
+        """Ingérer les nouvelles lignes d'un journal ; retourne le nombre ajouté"""
+        unit = unit or os.path.basename(os.path.dirname(path)) or 'default'
+        seen = self.index['files'].get(path, {'offset': 0})
+        size = os.path.getsize(path)
+        if size <= seen['offset']:
+            return 0
+
+        with open(path, 'rb') as f:
+            f.seek(seen['offset'])
+            data = f.read(size - seen['offset'])
+
+        if path.endswith('.bin'):
+            # Enregistrements complets seulement (le journal peut être en cours d'écriture)
+            usable = len(data) - len(data) % LOG_DTYPE.itemsize
+            columns = parse_bin(data[:usable])
+        else:
+            # Lignes complètes seulement ; l'en-tête est sauté à la première lecture
+            usable = data.rfind(b'\n') + 1
+            text = data[:usable].decode('utf-8')
+            if seen['offset'] == 0:
+                text = text.split('\n', 1)[1] if '\n' in text else ''
+            columns = parse_csv(text)
+
+        if columns is not None:
+            self.append(columns, unit)
+        self.index['files'][path] = {'offset': seen['offset'] + usable, 'unit': unit}
+        self._save_index()
+        return 0 if columns is None else len(columns['timestamp'])
+
+    def select(self, units=None, since=None, until=None):
+        """Colonnes des lignes demandées et masque des débuts de morceau"""
+        unit_ids = None
+        if units:
+            unit_ids = {self.index['units'].index(u) for u in units if u in self.index['units']}
+        lo = -np.inf if since is None else since
+        hi = np.inf if until is None else until
+
+        timestamps = self.column('timestamp')
+        slices = []
+        for start, end, unit_id, t_min, t_max in self.index['chunks']:
+            if unit_ids is not None and unit_id not in unit_ids:
+                continue
+            if t_max < lo or t_min >= hi:
+                continue
+            # Morceau trié par temps : bornes par recherche dichotomique
+            chunk = timestamps[start:end]
+            first = start + int(np.searchsorted(chunk, lo, side='left'))
+            last = start + int(np.searchsorted(chunk, hi, side='left'))
+            if last > first:
+                slices.append((first, last))
+
+        selected = {}
+        for name in COLUMNS:
+            column = self.column(name)
+            selected[name] = (np.concatenate([column[a:b] for a, b in slices])
+                              if slices else np.zeros(0, dtype=COLUMNS[name]))
+        starts = np.zeros(len(selected['timestamp']), dtype=bool)
+        position = 0
+        for a, b in slices:
+            starts[position] = True
+            position += b - a
+        return selected, starts
+
+
+# ============================================
+# AGRÉGATIONS VECTORISÉES
+# ============================================
+
+def aggregate(columns, starts, group='hour'):
+    """PERCLOS, clignements/min, épisodes de somnolence et yeux non détectés par groupe"""
+    timestamps = columns['timestamp']
+    if not len(timestamps):
+        return []
+
+    # Temps observé : écarts entre lignes, hors changements de morceau et trous
+    dt = np.diff(timestamps, prepend=timestamps[0])
+    dt[starts] = 0.0
+    dt[(dt < 0) | (dt > GAP_SECONDS)] = 0.0
+
+    # Clignements : le compteur est cumulatif par session
+    blinks = np.diff(columns['blinks'].astype(np.int64), prepend=0)
+    blinks[starts] = 0
+    blinks[blinks < 0] = 0
+
+    # Épisodes : fronts montants de la colonne somnolence
+    drowsy = columns['drowsy'].astype(bool)
+    previous = np.roll(drowsy, 1)
+    previous[starts] = False
+    episodes = drowsy & ~previous
+
+    with_face = columns['eye_state'] != UNKNOWN
+    closed = columns['eye_state'] == CLOSED
+    no_eyes = with_face & (columns['eyes_detected'] == 0)
+
+    # Groupes par comptage direct (bincount) : pas de tri, même sur une année
+    size = GROUPS[group]
+    if size is None:
+        inverse = np.zeros(len(timestamps), dtype=np.int64)
+        first = 0
+    else:
+        inverse = (timestamps // size).astype(np.int64)
+        first = int(inverse.min())
+        inverse -= first
+
+    def total(values):
+        return np.bincount(inverse, weights=values)
+
+    rows = np.bincount(inverse)
+    keys = np.flatnonzero(rows)
+    face_rows = total(with_face)
+    seconds = total(dt)
+    blink_total = total(blinks)
+    closed_rows = total(closed)
+    no_eyes_rows = total(no_eyes)
+    episode_count = total(episodes)
+
+    report = []
+    for i in keys:
+        start = timestamps.min() if size is None else (first + i) * size
+        report.append({
+            'start': str(np.datetime64(int(start), 's')),
+            'rows': int(rows[i]),
+            'observed_s': float(seconds[i]),
+            'perclos': float(closed_rows[i] / face_rows[i]) if face_rows[i] else 0.0,
+            'blink_rate': float(blink_total[i] * 60.0 / seconds[i]) if seconds[i] else 0.0,
+            'drowsy_episodes': int(episode_count[i]),
+            'eyes_not_detected': float(no_eyes_rows[i] / face_rows[i]) if face_rows[i] else 0.0,
+        })
+    return report
+
+
+def parse_time(text):
+    """'AAAA-MM-JJ[ HH:MM[:SS]]' -> secondes heure locale"""
+    if text is None:
+        return None
+    return float(np.datetime64(text.replace(' ', 'T'), 's').astype(np.int64))
+
+
+def print_report(report, group):
+    print(f"\n📊 {'période':<21}{'lignes':>9}{'PERCLOS':>9}{'clign/min':>11}"
+          f"{'épisodes':>10}{'sans yeux':>11}")
+    for row in report:
+        label = row['start'].replace('T', ' ') if group != 'total' else 'total'
+        print(f"   {label:<21}{row['rows']:>9}{row['perclos']:>9.1%}{row['blink_rate']:>11.1f}"
+              f"{row['drowsy_episodes']:>10}{row['eyes_not_detected']:>11.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse de l'historique des journaux de somnolence")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ing = sub.add_parser('ingest', help="ajouter des journaux CSV / .bin au magasin")
+    ing.add_argument('store', help="dossier du magasin colonnaire")
+    ing.add_argument('paths', nargs='+', help="fichiers, motifs ou dossiers de journaux")
+    ing.add_argument('--unit', default=None,
+                     help="unité (véhicule, poste) ; par défaut le dossier du journal")
+
+    rep = sub.add_parser('report', help="agrégats sur une période")
+    rep.add_argument('store', help="dossier du magasin colonnaire")
+    rep.add_argument('--unit', action='append', default=None, help="unité(s) à inclure")
+    rep.add_argument('--since', default=None, help="début, ex. 2024-01-01 ou '2024-01-01 08:00'")
+    rep.add_argument('--until', default=None, help="fin (exclue)")
+    rep.add_argument('--by', choices=list(GROUPS), default='hour', help="regroupement")
+    rep.add_argument('--json', action='store_true', help="sortie JSON")
+
+    args = parser.parse_args()
+    store = ColumnStore(args.store)
+
+    if args.command == 'ingest':
+        start = time.perf_counter()
+        files = find_logs(args.paths)
+        added = sum(store.ingest(path, args.unit) for path in files)
+        print(f"📥 {added} lignes ajoutées depuis {len(files)} fichiers "
+              f"({store.rows} au total, {time.perf_counter() - start:.2f} s)")
+        return
+
+    start = time.perf_counter()
+    columns, starts = store.select(args.unit, parse_time(args.since), parse_time(args.until))
+    report = aggregate(columns, starts, args.by)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.by)
+        print(f"\n⚡ {len(columns['timestamp'])} lignes analysées en {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
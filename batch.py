@@ -0,0 +1,172 @@
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import time
+
+import cv2
+
+from eyesdetecv1 import CONFIG, AdvancedDrowsinessDetector
+
+# Champs de detect() exportés pour chaque frame
+RESULT_FIELDS = ['face_detected', 'eyes_detected', 'ear', 'eye_state',
+                 'is_drowsy', 'is_blinking', 'blink_count', 'face_tracked',
+                 'perclos', 'blink_rate', 'blink_duration']
+
+
+def iter_video_frames(cap, stride=1, start=0.0, end=None):
+    """Parcourir (index, temps_s, frame) en sautant les frames hors pas sans les décoder"""
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    index = 0
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+        index = int(round(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+    first = index
+
+    while True:
+        timestamp = index / fps
+        if end is not None and timestamp > end:
+            break
+
+        if (index - first) % stride:
+            # grab() avance sans décoder l'image
+            if not cap.grab():
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, timestamp, frame
+        index += 1
+
+
+def analyze_video(path, stride=1, start=0.0, end=None, output_dir=None, config=None):
+    """Analyser une vidéo sans affichage ni son ; retourne le résumé du fichier"""
+    if config is not None:
+        CONFIG.update(config)
+    cv2.setNumThreads(1)
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return {'file': path, 'error': "ouverture impossible"}
+
+    detector = AdvancedDrowsinessDetector()
+    writer = None
+    out_file = None
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        out_file = open(os.path.join(output_dir, f"{name}_analysis.csv"),
+                        'w', newline='', encoding='utf-8')
+        writer = csv.writer(out_file)
+        writer.writerow(['Frame', 'Time'] + RESULT_FIELDS)
+
+    frames = 0
+    face_frames = 0
+    drowsy_frames = 0
+    reused_frames = 0
+    drowsy_episodes = 0
+    was_drowsy = False
+    first_ts = last_ts = None
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    try:
+        for index, timestamp, frame in iter_video_frames(cap, stride, start, end):
+            results = detector.detect(frame, timestamp=timestamp)
+
+            frames += 1
+            face_frames += int(results['face_detected'])
+            drowsy_frames += int(results['is_drowsy'])
+            reused_frames += int(results['eye_reused'])
+            if results['is_drowsy'] and not was_drowsy:
+                drowsy_episodes += 1
+            was_drowsy = results['is_drowsy']
+            if first_ts is None:
+                first_ts = timestamp
+            last_ts = timestamp
+
+            if writer is not None:
+                writer.writerow([index, f"{timestamp:.3f}"] + [
+                    f"{results[k]:.3f}" if isinstance(results[k], float) else results[k]
+                    for k in RESULT_FIELDS])
+    finally:
+        cap.release()
+        if out_file is not None:
+            out_file.close()
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {
+        'file': path,
+        'frames': frames,
+        'video_seconds': (last_ts - first_ts) if frames else 0.0,
+        'face_ratio': face_frames / frames if frames else 0.0,
+        'blinks': detector.state.blink_counter,
+        'drowsy_frames': drowsy_frames,
+        'drowsy_episodes': drowsy_episodes,
+        # Part des frames où MOTION_GATING a évité la détection des yeux
+        'eye_reuse_ratio': reused_frames / frames if frames else 0.0,
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'fps': frames / wall if wall > 0 else 0.0,
+    }
+
+
+def _analyze_job(job):
+    return analyze_video(**job)
+
+
+def run_batch(files, stride=1, start=0.0, end=None, output_dir=None, jobs=1):
+    """Analyser plusieurs fichiers, en parallèle sur `jobs` processus"""
+    work = [dict(path=f, stride=stride, start=start, end=end,
+                 output_dir=output_dir, config=dict(CONFIG)) for f in files]
+    if jobs <= 1 or len(work) <= 1:
+        return [_analyze_job(job) for job in work]
+
+    with mp.Pool(min(jobs, len(work))) as pool:
+        return list(pool.imap(_analyze_job, work))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse hors ligne de vidéos enregistrées")
+    parser.add_argument('files', nargs='+', help="fichiers vidéo à analyser")
+    parser.add_argument('--stride', type=int, default=1,
+                        help="ne traiter qu'une frame sur N")
+    parser.add_argument('--start', type=float, default=0.0, help="début (secondes)")
+    parser.add_argument('--end', type=float, default=None, help="fin (secondes)")
+    parser.add_argument('--jobs', type=int, default=mp.cpu_count(),
+                        help="fichiers traités en parallèle")
+    parser.add_argument('--output', default=None,
+                        help="dossier des CSV par frame (aucun si absent)")
+    parser.add_argument('--summary', default=None,
+                        help="écrire le résumé JSON dans ce fichier")
+    args = parser.parse_args()
+
+    wall_start = time.perf_counter()
+    summaries = run_batch(args.files, max(1, args.stride), args.start, args.end,
+                          args.output, args.jobs)
+    wall = time.perf_counter() - wall_start
+
+    print(f"\n📊 Résumé par fichier:")
+    for summary in summaries:
+        if 'error' in summary:
+            print(f"   ❌ {summary['file']}: {summary['error']}")
+            continue
+        print(f"   {summary['file']}: {summary['frames']} frames, "
+              f"visage {summary['face_ratio']:.0%}, {summary['blinks']} clignements, "
+              f"{summary['drowsy_episodes']} épisodes de somnolence, {summary['fps']:.1f} FPS")
+
+    total_frames = sum(s.get('frames', 0) for s in summaries)
+    total_cpu = sum(s.get('cpu_seconds', 0.0) for s in summaries)
+    print(f"\n⚡ Débit: {total_frames / wall:.1f} FPS total, "
+          f"{total_frames / total_cpu if total_cpu > 0 else 0.0:.1f} FPS par cœur")
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
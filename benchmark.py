@@ -0,0 +1,295 @@
+import argparse
+import ast
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from eyesdetecv1 import (CONFIG, AdvancedDrowsinessDetector, DataLogger, SubjectState,
+                         draw_advanced_ui, draw_detections)
+
+# Étapes rapportées, dans l'ordre du pipeline
+STAGES = ['gray', 'clahe', 'pyramid', 'face', 'eye_cascade', 'ear', 'render', 'log', 'total']
+PERCENTILES = [50, 90, 95, 99]
+
+
+# ============================================
+# SOURCES DE FRAMES
+# ============================================
+
+def synthetic_frames(count, width=None, height=None, seed=0):
+    """Frames synthétiques reproductibles : fond bruité et visage stylisé qui bouge"""
+    width = width or CONFIG['FRAME_WIDTH']
+    height = height or CONFIG['FRAME_HEIGHT']
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(
+        rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        cx = width // 2 + int(40 * np.sin(i / 15.0))
+        cy = height // 2 + int(20 * np.cos(i / 20.0))
+        cv2.ellipse(frame, (cx, cy), (90, 120), 0, 0, 360, (150, 170, 200), -1)
+        # Yeux fermés une frame sur dix pour exercer la logique de clignement
+        eye_h = 3 if i % 10 == 0 else 12
+        for dx in (-35, 35):
+            cv2.ellipse(frame, (cx + dx, cy - 30), (18, eye_h), 0, 0, 360, (40, 40, 40), -1)
+        frames.append(frame)
+    return frames
+
+
+def video_frames(path, count):
+    """Charger au plus `count` frames d'une vidéo en mémoire (décodage hors mesure)"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"❌ Aucune frame lisible dans {path}")
+    return frames
+
+
+# ============================================
+# MESURE
+# ============================================
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    stats = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    stats['mean'] = float(values.mean())
+    stats['max'] = float(values.max())
+    return stats
+
+
+def process_frame(detector, frame, render, logger):
+    """Détection, dessin et logging d'une frame ; retourne (résultats, instants t0..t3)"""
+    t0 = time.perf_counter()
+    results = detector.detect(frame)
+    t1 = time.perf_counter()
+
+    if render:
+        draw_detections(frame, results)
+        draw_advanced_ui(frame, 30.0, "BENCHMARK", results, False)
+    t2 = time.perf_counter()
+
+    if logger is not None:
+        logger.log(results['ear'], results['eye_state'], results['eyes_detected'],
+                   results['is_drowsy'], results['blink_count'])
+    t3 = time.perf_counter()
+    return results, (t0, t1, t2, t3)
+
+
+def peak_python_memory(detector, frames, render, logger):
+    """Pic mémoire Python sur une passe séparée : tracemalloc ralentit chaque allocation"""
+    tracemalloc.start()
+    try:
+        for frame in frames:
+            process_frame(detector, frame.copy(), render, logger)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(frames, warmup=10, render=True, log=True):
+    """Rejouer les frames et mesurer chaque étape ; retourne un dict sérialisable"""
+    detector = AdvancedDrowsinessDetector()
+    samples = {stage: [] for stage in STAGES}
+
+    workdir = tempfile.TemporaryDirectory()
+    previous_cwd = os.getcwd()
+    os.chdir(workdir.name)
+    logger = DataLogger() if log else None
+
+    # Chauffe (caches OpenCV, allocations) hors mesure
+    for frame in frames[:warmup]:
+        detector.detect(frame.copy())
+
+    start = time.perf_counter()
+    try:
+        for frame in frames:
+            results, (t0, t1, t2, t3) = process_frame(detector, frame.copy(), render, logger)
+
+            timings = results['timings']
+            for stage in ('gray', 'clahe', 'pyramid', 'face', 'eye_cascade', 'ear'):
+                samples[stage].append(timings.get(stage, 0.0))
+            samples['render'].append((t2 - t1) * 1000)
+            samples['log'].append((t3 - t2) * 1000)
+            samples['total'].append((t3 - t0) * 1000)
+        elapsed = time.perf_counter() - start
+
+        # Mémoire mesurée après coup : les latences ci-dessus sont sans tracemalloc
+        peak_python = peak_python_memory(detector, frames, render, logger)
+    finally:
+        if logger is not None:
+            logger.close()
+        os.chdir(previous_cwd)
+        workdir.cleanup()
+
+    return {
+        'frames': len(frames),
+        'resolution': list(frames[0].shape[1::-1]),
+        'throughput_fps': len(frames) / elapsed if elapsed > 0 else 0.0,
+        'stages_ms': {stage: percentiles(samples[stage]) for stage in STAGES},
+        'peak_python_bytes': peak_python,
+        # Tampons de prétraitement alloués (une fois par résolution en régime établi)
+        'preprocessing_allocations': detector.preprocessor.allocations,
+        # ru_maxrss est en Ko sous Linux
+        'peak_rss_bytes': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+                           if resource is not None else 0),
+        'config': {k: v for k, v in CONFIG.items() if isinstance(v, (int, float, bool, str))},
+        'opencv': cv2.__version__,
+    }
+
+
+def fill_state(state, seconds=600.0, fps=30.0):
+    """Remplir les fenêtres temporelles d'un état comme après `seconds` de suivi"""
+    for i in range(int(seconds * fps)):
+        now = i / fps
+        state.ear_history.push(0.3, now)
+        state.closure_history.push(i % 10 == 0, now)
+        if i % 90 == 0:
+            state.blink_history.push(0.15, now)
+    return state
+
+
+def allocated_bytes(factory, count):
+    """Octets Python alloués par objet, mesurés sur `count` objets"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    objects = [factory() for _ in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def run_memory_benchmark(sessions=1000):
+    """Mémoire par session : état de suivi seul, rempli, sérialisé, et détecteur complet"""
+    AdvancedDrowsinessDetector()  # Charger les modèles partagés hors mesure
+    full = fill_state(SubjectState())
+    return {
+        'sessions': sessions,
+        'state_bytes': allocated_bytes(SubjectState, sessions),
+        'state_full_bytes': allocated_bytes(lambda: fill_state(SubjectState(), seconds=120), 20),
+        'serialized_bytes': len(SubjectState().to_bytes()),
+        'serialized_full_bytes': len(full.to_bytes()),
+        'detector_bytes': allocated_bytes(AdvancedDrowsinessDetector, min(sessions, 100)),
+    }
+
+
+def compare(report, baseline, max_regression):
+    """Lister les régressions au-delà de max_regression % par rapport à la référence"""
+    failures = []
+    for stage in STAGES:
+        new = report['stages_ms'][stage]['p50']
+        old = baseline.get('stages_ms', {}).get(stage, {}).get('p50')
+        # Ignorer les étapes trop courtes pour être mesurées de façon fiable
+        if old is None or old < 0.05:
+            continue
+        change = (new - old) / old * 100
+        if change > max_regression:
+            failures.append(f"{stage}: p50 {old:.2f} -> {new:.2f} ms (+{change:.0f}%)")
+
+    old_fps = baseline.get('throughput_fps')
+    if old_fps:
+        change = (old_fps - report['throughput_fps']) / old_fps * 100
+        if change > max_regression:
+            failures.append(f"débit: {old_fps:.1f} -> {report['throughput_fps']:.1f} FPS (-{change:.0f}%)")
+    return failures
+
+
+def parse_override(text):
+    """KEY=VALUE -> (KEY, valeur Python) pour surcharger CONFIG"""
+    key, _, value = text.partition('=')
+    if key not in CONFIG:
+        raise SystemExit(f"❌ Clé CONFIG inconnue: {key}")
+    try:
+        return key, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return key, value
+
+
+def print_report(report):
+    print(f"\n📊 {report['frames']} frames {report['resolution'][0]}x{report['resolution'][1]}")
+    print(f"   {'étape':<12}{'p50':>8}{'p90':>8}{'p95':>8}{'p99':>8}  (ms)")
+    for stage, stats in report['stages_ms'].items():
+        print(f"   {stage:<12}{stats['p50']:>8.2f}{stats['p90']:>8.2f}"
+              f"{stats['p95']:>8.2f}{stats['p99']:>8.2f}")
+    print(f"   Débit: {report['throughput_fps']:.1f} FPS")
+    print(f"   Mémoire: pic Python {report['peak_python_bytes'] / 1e6:.1f} Mo, "
+          f"RSS max {report['peak_rss_bytes'] / 1e6:.1f} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark par étape du détecteur de somnolence")
+    parser.add_argument('--video', default=None,
+                        help="clip enregistré à rejouer (sinon frames synthétiques)")
+    parser.add_argument('--frames', type=int, default=300, help="nombre de frames mesurées")
+    parser.add_argument('--warmup', type=int, default=10, help="frames de chauffe non mesurées")
+    parser.add_argument('--set', dest='overrides', action='append', default=[],
+                        metavar='KEY=VALUE', help="surcharger une valeur de CONFIG")
+    parser.add_argument('--no-render', action='store_true', help="ne pas mesurer le dessin")
+    parser.add_argument('--no-log', action='store_true', help="ne pas mesurer le logging")
+    parser.add_argument('--sessions', type=int, default=0,
+                        help="mesurer la mémoire par session sur N états de suivi")
+    parser.add_argument('--output', default=None, help="écrire le rapport JSON dans ce fichier")
+    parser.add_argument('--baseline', default=None, help="rapport JSON de référence")
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help="régression tolérée en %% par rapport à --baseline")
+    args = parser.parse_args()
+
+    CONFIG.update(parse_override(o) for o in args.overrides)
+    CONFIG['LOG_DATA'] = not args.no_log
+
+    if args.video:
+        frames = video_frames(args.video, args.frames)
+    else:
+        frames = synthetic_frames(args.frames)
+
+    report = run_benchmark(frames, args.warmup, render=not args.no_render, log=not args.no_log)
+    report['source'] = args.video or 'synthetic'
+    print_report(report)
+
+    if args.sessions:
+        memory = report['memory_per_session'] = run_memory_benchmark(args.sessions)
+        print(f"\n🧠 Mémoire par session ({memory['sessions']} états):")
+        print(f"   État neuf: {memory['state_bytes'] / 1024:.1f} Ko, "
+              f"après 2 min: {memory['state_full_bytes'] / 1024:.1f} Ko")
+        print(f"   Sérialisé: {memory['serialized_bytes'] / 1024:.1f} Ko neuf, "
+              f"{memory['serialized_full_bytes'] / 1024:.1f} Ko fenêtres pleines")
+        print(f"   Détecteur complet (modèles partagés): {memory['detector_bytes'] / 1024:.1f} Ko")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            failures = compare(report, json.load(f), args.max_regression)
+        if failures:
+            print("\n❌ Régressions détectées:")
+            for failure in failures:
+                print(f"   {failure}")
+            sys.exit(1)
+        print("\n✅ Aucune régression au-delà du seuil")
+
+
+if __name__ == "__main__":
+    main()
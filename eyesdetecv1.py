@@ -1,11 +1,23 @@
-import cv2
-import pygame
 import time
+
+_IMPORT_START = time.perf_counter()
+
+import cv2
 import os
+import threading
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import csv
-from scipy.spatial import distance as dist
+import hashlib
+import pickle
+import json
+import urllib.request
+
+# Temps de démarrage par étape (ms), complété par main()
+STARTUP_TIMINGS = {'imports': (time.perf_counter() - _IMPORT_START) * 1000}
 
 # ============================================
 # CONFIGURATION
@@ -17,11 +29,68 @@ CONFIG = {
     'FRAME_WIDTH': 640,
     'FRAME_HEIGHT': 480,
     'LOG_DATA': True,
+    'LOG_BATCH_SIZE': 256,  # Lignes en tampon avant écriture
+    'LOG_FLUSH_INTERVAL': 2.0,  # Écriture au plus tard toutes les N secondes
+    'LOG_ROTATE_MB': 50,  # Nouveau fichier au-delà de cette taille (0 = jamais)
+    'LOG_ROTATE_HOURLY': False,  # Nouveau fichier à chaque heure
+    'LOG_BINARY': False,  # Copie binaire compacte (.bin, voir LOG_DTYPE)
+    'LOG_MAX_BUFFER': 100000,  # Lignes gardées en mémoire si l'écriture échoue (les plus anciennes sont jetées)
     'SHOW_FPS': True,
+    'DISPLAY_FPS': 0,  # Cadence max de l'affichage, indépendante de la détection (0 = chaque frame)
     'ENABLE_BEEP': True,
     'ALARM_SOUND_PATH': r"D:\Attention_Beep.wav",
+    'CACHE_DIR': os.path.join(os.path.expanduser('~'), '.cache', 'drowsiness'),
+    'MULTI_FACE': False,  # Suivre tous les visages (un état par visage)
+    'MAX_FACES': 6,
+    'FACE_WORKERS': 4,  # Threads pour les yeux / EAR des visages d'une frame
+    'FACE_MATCH_IOU': 0.3,  # Recouvrement min pour associer un visage à une piste
+    'FACE_MAX_MISSES': 15,  # Frames sans visage avant d'oublier une piste
+    'MOTION_GATING': False,  # Réutiliser yeux / EAR si la zone des yeux n'a pas bougé
+    'MOTION_THRESHOLD': 1.5,  # Écart moyen (niveaux de gris) de la zone réduite sous lequel on réutilise
+    'MOTION_MAX_REUSE': 2,  # Réutilisations consécutives max (une vraie détection au moins toutes les N+1 frames)
+    'MOTION_GRID': (32, 12),  # Taille de la zone des yeux réduite pour la comparaison
+    'CALIBRATION_PROFILES': True,  # Reprendre la calibration du sujet au démarrage
+    'SUBJECT_ID': None,  # Sujet ou caméra (None = 'camera-0')
+    'PROFILE_SAVE_INTERVAL': 300,  # Frames entre deux mises à jour du profil sur disque
     'MIN_FACE_SIZE': 100,
     'MAX_FACE_SIZE': 400,
+    'FACE_BACKEND': 'haar',  # haar | lbp | yunet
+    'EYE_BACKEND': 'haar',  # haar | landmarks
+    'LBP_FACE_MODEL': 'lbpcascade_frontalface_improved.xml',
+    'YUNET_MODEL': 'face_detection_yunet_2023mar.onnx',
+    'YUNET_SCORE_THRESHOLD': 0.7,
+    'LBF_MODEL': 'lbfmodel.yaml',  # Modèle Facemark LBF (opencv-contrib)
+    'FACE_TRACKING': True,  # Suivre le visage entre deux détections complètes
+    'FACE_REDETECT_INTERVAL': 10,  # Détection complète toutes les N frames
+    'TRACK_SEARCH_MARGIN': 0.25,  # Marge de recherche autour du dernier visage
+    'TRACK_TEMPLATE_SIZE': 48,  # Largeur du modèle de suivi (px)
+    'TRACK_MIN_SCORE': 0.6,  # Corrélation minimale avant re-détection
+    'FACE_PYRAMID_LEVEL': 1,  # Recherche du visage à 1/2^N de la résolution
+    'FACE_SCALE_FACTOR': 1.1,  # Pas d'échelle de la cascade visage
+    'EYE_SCALE_FACTOR': 1.1,  # Pas d'échelle de la cascade yeux
+    'EYE_MIN_NEIGHBORS': 5,  # Voisins min de la cascade yeux
+    'EYE_ROI_TOP': 0.2,  # Début de la bande des yeux (fraction de la hauteur du visage)
+    'EYE_ROI_HEIGHT': 0.4,  # Hauteur de la bande des yeux (fraction)
+    'EAR_BANDS': ((0.4, 0.35), (0.3, 0.28), (0.2, 0.22), (0.1, 0.18)),  # (ratio h/l min, EAR)
+    'EAR_CLOSED': 0.15,  # EAR sous la dernière bande
+    'THREADED_PIPELINE': True,  # Capture, détection et affichage en parallèle
+    'PIPELINE_QUEUE_SIZE': 1,  # Profondeur max des files (la plus récente gagne)
+    'EYE_PREDICTION': True,  # Chercher les yeux autour de leur dernière position
+    'EYE_SEARCH_MARGIN': 0.5,  # Marge des fenêtres (fraction de la taille de l'œil)
+    'EYE_SIZE_TOLERANCE': 0.3,  # Variation de taille admise d'une frame à l'autre
+    'EYE_PREDICTION_MAX_MISSES': 15,  # Frames sans yeux avant d'oublier leur position
+    'EYE_BAND_FALLBACK_FRAMES': 5,  # Frames consécutives à un seul œil avant de rechercher dans toute la bande
+    'PERCLOS_WINDOW': 60.0,  # Fenêtre du PERCLOS (secondes)
+    'BLINK_RATE_WINDOW': 60.0,  # Fenêtre de la fréquence de clignement (secondes)
+    'TEMPORAL_CAPACITY': 4096,  # Frames max gardées dans une fenêtre temporelle
+    'LATENCY_BUDGET_MS': 0,  # Budget de latence par frame (0 = réglages fixes)
+    'NOMINAL_FPS': 30,  # Cadence pour laquelle EYE_AR_CONSEC_FRAMES est défini
+    'RECORD_PATH': None,  # Enregistrer les frames analysées (voir framestore.py)
+    'WEBHOOK_URL': None,  # POST JSON des événements (alarme, somnolence, visage perdu)
+    'WEBHOOK_TIMEOUT': 2.0,
+    'METRICS_PORT': 0,  # Port HTTP des métriques Prometheus (0 = désactivé)
+    'METRICS_HOST': '127.0.0.1',
+    'METRICS_WINDOW': 300,  # Frames gardées pour les quantiles récents
 }
 
 
@@ -41,53 +110,629 @@ def eye_aspect_ratio_simple(eye_rect):
         # Ratio hauteur/largeur - plus réaliste pour un œil
         aspect_ratio = eh / ew
 
-        # Convertir ratio en EAR (0.15-0.35)
+        # Convertir ratio en EAR (0.15-0.35) par bandes (EAR_BANDS)
         # Un œil ouvert a un ratio d'environ 0.3-0.5 (hauteur ~30-50% de la largeur)
         # Un œil fermé a un ratio < 0.2
+        # Par défaut : très ouvert, normalement ouvert, à moitié ouvert, presque fermé
+        for min_ratio, ear in CONFIG['EAR_BANDS']:
+            if aspect_ratio > min_ratio:
+                return ear
 
-        if aspect_ratio > 0.4:
-            ear = 0.35  # Très ouvert
-        elif aspect_ratio > 0.3:
-            ear = 0.28  # Normalement ouvert
-        elif aspect_ratio > 0.2:
-            ear = 0.22  # À moitié ouvert
-        elif aspect_ratio > 0.1:
-            ear = 0.18  # Presque fermé
-        else:
-            ear = 0.15  # Fermé
-
-        return ear
+        return CONFIG['EAR_CLOSED']  # Fermé
     except:
         return 0.25
 
 
-class AdvancedDrowsinessDetector:
-    """Détecteur avancé sans Dlib/MediaPipe"""
+def landmark_eye_aspect_ratio(points):
+    """EAR classique à partir des 6 points d'un œil (p1..p6)"""
+    vertical = (np.linalg.norm(points[1] - points[5]) +
+                np.linalg.norm(points[2] - points[4]))
+    horizontal = np.linalg.norm(points[0] - points[3])
+    if horizontal == 0:
+        return 0.25
+    return float(vertical / (2.0 * horizontal))
 
-    def __init__(self):
-        # Charger les classificateurs Haar
+
+# ============================================
+# BACKENDS DE DÉTECTION (VISAGE / YEUX)
+# ============================================
+
+class CascadePool:
+    """Cascades OpenCV déjà chargées, prêtées le temps d'un appel
+
+    detectMultiScale garde des tampons internes : une même instance ne doit
+    pas servir à deux threads en même temps. Les instances libres sont
+    réutilisées par n'importe quel thread : celle chauffée par warm_up()
+    sert au thread de détection sans recharger le XML. Une nouvelle instance
+    n'est créée que si toutes sont occupées.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
+            raise FileNotFoundError(f"Classificateur introuvable: {path}")
+        self.free = [cascade]
+
+    def call(self, method, *args, **kwargs):
+        """Appeler `method` (ex. 'detectMultiScale') sur une instance libre"""
+        with self.lock:
+            cascade = self.free.pop() if self.free else None
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.path)
         try:
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
+            return getattr(cascade, method)(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.free.append(cascade)
 
-            self.eye_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_eye.xml'
-            )
 
-            # Vérifier le chargement
-            if self.face_cascade.empty() or self.eye_cascade.empty():
-                print("❌ Impossible de charger les classificateurs")
-                print("Vérifiez que les fichiers XML sont dans le bon dossier")
-                print("Téléchargez depuis: https://github.com/opencv/opencv/tree/master/data/haarcascades")
-                exit(1)
+class CascadeFaceBackend:
+    """Visage par cascade OpenCV (Haar ou LBP)"""
 
-            print("✅ Classificateurs chargés avec succès")
+    def __init__(self, name, path):
+        self.name = name
+        self.cascades = CascadePool(path)
 
-        except Exception as e:
-            print(f"❌ Erreur d'initialisation: {e}")
-            exit(1)
+    def detect(self, prep, min_size, max_size):
+        """Visages sur prep['small'] : (rectangles, scores = nombre de voisins)"""
+        faces, neighbours = self.cascades.call(
+            'detectMultiScale2',
+            prep['small'],
+            scaleFactor=CONFIG['FACE_SCALE_FACTOR'],
+            minNeighbors=5,
+            minSize=(min_size, min_size),
+            maxSize=(max_size, max_size)
+        )
+        return ([tuple(int(v) for v in face) for face in faces],
+                [float(n) for n in np.ravel(neighbours)])
+
+
+class YuNetFaceBackend:
+    """Visage par réseau FaceDetectorYN (OpenCV DNN, CPU) depuis un modèle local"""
+
+    name = 'yunet'
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Modèle YuNet introuvable: {path}")
+        self.model = cv2.FaceDetectorYN.create(path, "", (320, 320),
+                                               CONFIG['YUNET_SCORE_THRESHOLD'])
+        # setInputSize + detect ne sont pas sûrs entre threads
+        self.lock = threading.Lock()
+
+    def detect(self, prep, min_size, max_size):
+        """Visages sur le niveau réduit : (rectangles, scores de confiance 0-1)"""
+        height, width = prep['small'].shape[:2]
+        image = prep['frame']
+        if image.shape[:2] != (height, width):
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+        with self.lock:
+            self.model.setInputSize((width, height))
+            _, faces = self.model.detect(image)
+        if faces is None:
+            return [], []
+
+        rects, scores = [], []
+        for face in faces:
+            x, y, w, h = (int(v) for v in face[:4])
+            if min_size <= max(w, h) <= max_size:
+                rects.append((max(0, x), max(0, y), w, h))
+                scores.append(float(face[-1]))
+        return rects, scores
+
+
+class CascadeEyeBackend:
+    """Yeux par cascade Haar ; l'EAR est estimé depuis le rectangle"""
+
+    name = 'haar'
+    provides_ear = False
+
+    def __init__(self, path):
+        self.cascades = CascadePool(path)
+
+    def detect(self, gray, min_size, max_size):
+        """Rectangles des yeux dans `gray` (coordonnées de l'image fournie)"""
+        return self.cascades.call(
+            'detectMultiScale',
+            gray,
+            scaleFactor=CONFIG['EYE_SCALE_FACTOR'],
+            minNeighbors=CONFIG['EYE_MIN_NEIGHBORS'],  # Moins strict pour détecter plus d'yeux
+            minSize=(min_size, min_size),
+            maxSize=(max_size, max_size)
+        )
+
+
+class LandmarkEyeBackend:
+    """Ouverture des yeux par points caractéristiques (Facemark LBF, opencv-contrib)"""
+
+    name = 'landmarks'
+    provides_ear = True
+    # Indices des yeux dans le modèle 68 points
+    EYE_INDICES = (list(range(36, 42)), list(range(42, 48)))
+
+    def __init__(self, path):
+        if not hasattr(cv2, 'face'):
+            raise ImportError("opencv-contrib-python est requis pour EYE_BACKEND='landmarks'")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Modèle LBF introuvable: {path}")
+        self.facemark = cv2.face.createFacemarkLBF()
+        self.facemark.loadModel(path)
+        self.lock = threading.Lock()
+
+    def eyes_with_ear(self, gray, face_rect):
+        """Rectangles absolus des yeux et EAR réel de chaque œil"""
+        with self.lock:
+            ok, landmarks = self.facemark.fit(gray, np.array([face_rect], dtype=np.int32))
+        if not ok:
+            return [], []
+
+        points = landmarks[0][0]
+        eyes, ears = [], []
+        for indices in self.EYE_INDICES:
+            eye = points[indices]
+            x0, y0 = eye.min(axis=0)
+            x1, y1 = eye.max(axis=0)
+            pad = 0.25 * (x1 - x0)
+            eyes.append((int(x0 - pad), int(y0 - pad), int(x1 - x0 + 2 * pad), int(y1 - y0 + 2 * pad)))
+            ears.append(landmark_eye_aspect_ratio(eye))
+        return eyes, ears
+
+
+# Backends chargés une seule fois par processus et partagés entre détecteurs
+_BACKEND_CACHE = {}
+_BACKEND_LOCK = threading.Lock()
+
+
+def load_backend(kind, name):
+    """Backend 'face' ou 'eye' partagé (les modèles ne sont lus qu'une fois)"""
+    key = (kind, name, CONFIG['LBP_FACE_MODEL'], CONFIG['YUNET_MODEL'], CONFIG['LBF_MODEL'])
+    with _BACKEND_LOCK:
+        backend = _BACKEND_CACHE.get(key)
+        if backend is None:
+            factory = create_face_backend if kind == 'face' else create_eye_backend
+            backend = _BACKEND_CACHE[key] = factory(name)
+        return backend
+
+
+def create_face_backend(name):
+    """Instancier le backend visage choisi dans CONFIG['FACE_BACKEND']"""
+    if name == 'haar':
+        return CascadeFaceBackend('haar', cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    if name == 'lbp':
+        return CascadeFaceBackend('lbp', CONFIG['LBP_FACE_MODEL'])
+    if name == 'yunet':
+        return YuNetFaceBackend(CONFIG['YUNET_MODEL'])
+    raise ValueError(f"Backend visage inconnu: {name}")
+
+
+def create_eye_backend(name):
+    """Instancier le backend yeux choisi dans CONFIG['EYE_BACKEND']"""
+    if name == 'haar':
+        return CascadeEyeBackend(cv2.data.haarcascades + 'haarcascade_eye.xml')
+    if name == 'landmarks':
+        return LandmarkEyeBackend(CONFIG['LBF_MODEL'])
+    raise ValueError(f"Backend yeux inconnu: {name}")
+
+
+class RingBuffer:
+    """Tampon circulaire borné (tableaux numpy) avec somme courante
+
+    push() et expire() sont en O(1) (amorti) : la moyenne d'une fenêtre ne
+    coûte pas plus cher quand la fenêtre s'allonge. Les tableaux démarrent
+    petits et doublent jusqu'à `capacity` : un tampon peu rempli reste léger.
+    """
+
+    __slots__ = ('capacity', 'values', 'timestamps', 'start', 'count', 'total')
+
+    INITIAL_SIZE = 64
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        size = min(self.capacity, self.INITIAL_SIZE)
+        self.values = np.zeros(size, dtype=np.float64)
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        self.total = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        """Doubler les tableaux (dans la limite de capacity) en remettant l'ordre à zéro"""
+        size = min(self.capacity, 2 * len(self.values))
+        order = (np.arange(self.count) + self.start) % len(self.values)
+        values = np.zeros(size, dtype=np.float64)
+        timestamps = np.zeros(size, dtype=np.float64)
+        values[:self.count] = self.values[order]
+        timestamps[:self.count] = self.timestamps[order]
+        self.values, self.timestamps, self.start = values, timestamps, 0
+
+    def push(self, value, timestamp=0.0):
+        """Ajouter une valeur ; la plus ancienne est évincée si le tampon est plein"""
+        size = len(self.values)
+        if self.count == size and size < self.capacity:
+            self._grow()
+            size = len(self.values)
+        if self.count == size:
+            self.total -= self.values[self.start]
+            self.start = (self.start + 1) % size
+            self.count -= 1
+        index = (self.start + self.count) % size
+        self.values[index] = value
+        self.timestamps[index] = timestamp
+        self.total += value
+        self.count += 1
+
+    def expire(self, before):
+        """Retirer les valeurs horodatées avant `before`"""
+        size = len(self.values)
+        while self.count and self.timestamps[self.start] < before:
+            self.total -= self.values[self.start]
+            self.start = (self.start + 1) % size
+            self.count -= 1
+        if not self.count:
+            self.total = 0.0  # Éviter la dérive des arrondis
+
+    def mean(self, default=0.0):
+        return self.total / self.count if self.count else default
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+        self.total = 0.0
+
+    def __getstate__(self):
+        # Sérialiser uniquement les valeurs présentes, dans l'ordre
+        order = (np.arange(self.count) + self.start) % len(self.values)
+        return self.capacity, self.values[order], self.timestamps[order], self.total
+
+    def __setstate__(self, state):
+        self.capacity, values, timestamps, self.total = state
+        size = min(self.capacity, max(self.INITIAL_SIZE, len(values)))
+        self.values = np.zeros(size, dtype=np.float64)
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.values[:len(values)] = values
+        self.timestamps[:len(values)] = timestamps
+        self.start = 0
+        self.count = len(values)
+
+
+class BufferPool:
+    """Tampons d'image réutilisables, regroupés par forme et type
+
+    acquire() rend un tampon libre (ou en alloue un s'il n'y en a pas) ;
+    release() le remet à disposition. En régime établi, `allocations`
+    ne bouge plus : seules les réutilisations augmentent.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.free = {}
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                self.reuses += 1
+                return buffers.pop()
+            self.allocations += 1
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer):
+        if buffer is None:
+            return
+        key = (buffer.shape, buffer.dtype.str)
+        with self.lock:
+            self.free.setdefault(key, []).append(buffer)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'free': sum(len(buffers) for buffers in self.free.values()),
+            }
+
+
+class FrameReader:
+    """Lecture caméra + miroir dans des tampons préalloués
+
+    cap.read() écrit dans un tampon brut réutilisé et cv2.flip dans un
+    tampon du pool : aucune allocation par frame en régime établi. Le
+    propriétaire final de la frame la rend avec release().
+    """
+
+    def __init__(self, cap, pool=None):
+        self.cap = cap
+        self.pool = pool or BufferPool()
+        self.raw = None
+
+    def read(self):
+        ret, raw = self.cap.read(self.raw)
+        if not ret or raw is None:
+            return False, None
+        if raw is not self.raw and raw.flags.writeable:
+            if self.raw is not None:
+                self.pool.allocations += 1  # Réallocation par le backend de capture
+            self.raw = raw
+        frame = self.pool.acquire(raw.shape, raw.dtype)
+        # Miroir pour effet naturel
+        cv2.flip(raw, 1, dst=frame)
+        return True, frame
+
+    def release(self, frame):
+        self.pool.release(frame)
+
+
+class FramePreprocessor:
+    """Prétraitement unique par frame partagé par toutes les détections
 
+    Les images intermédiaires (gris, CLAHE, pyramide) sont écrites dans des
+    tampons alloués une fois par résolution : elles ne sont valables que
+    jusqu'au process() suivant.
+    """
+
+    def __init__(self):
+        # Un seul objet CLAHE réutilisé pour toutes les frames
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self.timings = {}
+        self.buffers = {}
+        self.allocations = 0
+
+    def buffer(self, name, shape):
+        """Tampon nommé, réalloué seulement si la résolution change"""
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self.buffers[name] = np.empty(shape, dtype=np.uint8)
+            self.allocations += 1
+        return buffer
+
+    def process(self, frame):
+        """Niveaux de gris, CLAHE et pyramide, calculés une seule fois
+
+        Retourne un dict : 'gray' (brut), 'equalized' (CLAHE), 'small'
+        (niveau de pyramide pour la recherche du visage) et 'scale'
+        (facteur pour revenir à la pleine résolution).
+        """
+        t0 = time.perf_counter()
+        shape = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.buffer('gray', shape))
+        t1 = time.perf_counter()
+        equalized = self.clahe.apply(gray, dst=self.buffer('equalized', shape))
+        t2 = time.perf_counter()
+
+        # Lu une seule fois : rectangles et échelle restent cohérents
+        pyramid_level = CONFIG['FACE_PYRAMID_LEVEL']
+        small = equalized
+        for level in range(pyramid_level):
+            shape = ((shape[0] + 1) // 2, (shape[1] + 1) // 2)
+            small = cv2.pyrDown(small, dst=self.buffer(f"pyramid{level}", shape))
+        t3 = time.perf_counter()
+
+        self.timings = {
+            'gray': (t1 - t0) * 1000,
+            'clahe': (t2 - t1) * 1000,
+            'pyramid': (t3 - t2) * 1000,
+        }
+
+        return {
+            'frame': frame,
+            'gray': gray,
+            'equalized': equalized,
+            'small': small,
+            'scale': 2 ** pyramid_level,
+        }
+
+
+class DetectionModels:
+    """Modèles de détection immuables, partagés par tous les sujets d'un processus
+
+    Les backends sont sûrs entre threads (cascades prêtées par un
+    CascadePool le temps d'un appel, verrou pour les modèles DNN /
+    Facemark) : un seul jeu de modèles sert tous les
+    détecteurs, quel que soit le nombre de sujets suivis.
+    """
+
+    def __init__(self, face_name=None, eye_name=None):
+        self.face_backend = load_backend('face', face_name or CONFIG['FACE_BACKEND'])
+        self.eye_backend = load_backend('eye', eye_name or CONFIG['EYE_BACKEND'])
+
+    @classmethod
+    def shared(cls):
+        """Jeu de modèles correspondant à CONFIG (chargé une seule fois)"""
+        key = (CONFIG['FACE_BACKEND'], CONFIG['EYE_BACKEND'])
+        with _BACKEND_LOCK:
+            models = _MODELS_CACHE.get(key)
+        if models is None:
+            models = cls()
+            print(f"✅ Classificateurs chargés avec succès "
+                  f"(visage: {models.face_backend.name}, yeux: {models.eye_backend.name})")
+            with _BACKEND_LOCK:
+                models = _MODELS_CACHE.setdefault(key, models)
+        return models
+
+
+_MODELS_CACHE = {}
+
+
+# ============================================
+# PROFILS DE CALIBRATION
+# ============================================
+
+class StreamingMedian:
+    """Médiane en flux par l'algorithme P² (Jain & Chlamtac)
+
+    Cinq marqueurs suffisent, quel que soit le nombre de valeurs vues :
+    pas de liste qui grossit, et l'état tient dans un enregistrement fixe.
+    """
+
+    __slots__ = ('count', 'heights', 'positions')
+
+    def __init__(self, count=0, heights=None, positions=None):
+        self.count = int(count)
+        self.heights = list(heights) if heights is not None else [0.0] * 5
+        self.positions = list(positions) if positions is not None else [1.0, 2.0, 3.0, 4.0, 5.0]
+
+    def add(self, value):
+        value = float(value)
+        q, n = self.heights, self.positions
+        if self.count < 5:
+            q[self.count] = value
+            self.count += 1
+            if self.count == 5:
+                q.sort()
+            return
+
+        # Cellule de la nouvelle valeur, en élargissant les extrêmes si besoin
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = 0
+            while k < 3 and value >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        self.count += 1
+
+        # Positions souhaitées des marqueurs pour le quantile 0.5
+        total = self.count - 1
+        desired = (1.0, 1.0 + total / 4, 1.0 + total / 2, 1.0 + 3 * total / 4, float(self.count))
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1.0 if d > 0 else -1.0
+                # Interpolation parabolique, linéaire si elle sort de l'intervalle
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    j = i + int(d)
+                    height = q[i] + d * (q[j] - q[i]) / (n[j] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self, default=0.3):
+        if self.count >= 5:
+            return self.heights[2]
+        if self.count == 0:
+            return default
+        return float(np.median(self.heights[:self.count]))
+
+
+PROFILE_DTYPE = np.dtype([
+    ('subject', 'S64'),
+    ('ear_reference', '<f8'),
+    ('count', '<i8'),
+    ('heights', '<f8', 5),
+    ('positions', '<f8', 5),
+    ('updated', '<f8'),
+])
+
+
+def profile_key(subject):
+    """Clé d'enregistrement d'un sujet (octets, 64 max)
+
+    Un identifiant trop long n'est jamais tronqué (coupure possible au
+    milieu d'un caractère UTF-8, collisions) : il est remplacé par son SHA-1,
+    stable d'une exécution à l'autre.
+    """
+    key = subject.encode('utf-8')
+    if len(key) > PROFILE_DTYPE['subject'].itemsize:
+        key = b'sha1:' + hashlib.sha1(key).hexdigest().encode('ascii')
+    return key
+
+
+class CalibrationProfiles:
+    """Index sur disque des calibrations par sujet / caméra
+
+    Fichier d'enregistrements fixes (PROFILE_DTYPE) projeté en mémoire :
+    le chargement ne lit qu'un tableau numpy, et une mise à jour réécrit
+    un seul enregistrement sur place (ajout en fin de fichier pour un
+    nouveau sujet).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CONFIG['CACHE_DIR'], 'calibration_profiles.bin')
+        self.lock = threading.Lock()
+        self.records = None
+        self.index = {}
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= PROFILE_DTYPE.itemsize:
+            count = os.path.getsize(self.path) // PROFILE_DTYPE.itemsize
+            self.records = np.memmap(self.path, dtype=PROFILE_DTYPE, mode='r+', shape=(count,))
+            # Clés gardées en octets : aucun décodage au chargement
+            self.index = {key: i for i, key in enumerate(self.records['subject'])}
+
+    def __len__(self):
+        return len(self.index)
+
+    def load(self, subject):
+        """(référence EAR, estimateur) du sujet, ou None s'il est inconnu"""
+        with self.lock:
+            i = self.index.get(profile_key(subject))
+            if i is None:
+                return None
+            record = self.records[i]
+            return (float(record['ear_reference']),
+                    StreamingMedian(record['count'], record['heights'], record['positions']))
+
+    def save(self, subject, ear_reference, estimator):
+        """Créer ou mettre à jour le profil du sujet"""
+        key = profile_key(subject)
+        record = np.zeros(1, dtype=PROFILE_DTYPE)
+        record['subject'] = key
+        record['ear_reference'] = ear_reference
+        record['count'] = estimator.count
+        record['heights'] = estimator.heights
+        record['positions'] = estimator.positions
+        record['updated'] = time.time()
+
+        with self.lock:
+            i = self.index.get(key)
+            if i is not None:
+                self.records[i] = record[0]
+                self.records.flush()
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(record.tobytes())
+            count = os.path.getsize(self.path) // PROFILE_DTYPE.itemsize
+            self.records = np.memmap(self.path, dtype=PROFILE_DTYPE, mode='r+', shape=(count,))
+            self.index[key] = count - 1
+
+
+class SubjectState:
+    """État de suivi d'un sujet : compteurs, calibration, historiques, suivi
+
+    Objet compact (__slots__, tableaux numpy) : peu coûteux à créer, à
+    sérialiser (to_bytes / from_bytes) et à évincer quand on suit beaucoup
+    de sujets dans un même processus.
+    """
+
+    __slots__ = (
+        'ear', 'eye_counter', 'blink_counter', 'drowsy_start_time', 'alarm_triggered',
+        'ear_history', 'closure_history', 'blink_history', 'closed_since', 'first_timestamp',
+        'ear_reference', 'calibrated', 'calibration_frames', 'calibration', 'subject',
+        'last_face', 'face_template', 'track_scale', 'track_score', 'face_score',
+        'frames_since_detection', 'last_eyes', 'eye_misses', 'eye_search', 'single_eye_frames',
+        'face_present', 'was_drowsy',
+        'eye_signature', 'eye_reuses', 'last_eye_results',
+    )
+
+    HISTORY_SIZE = 5
+    CALIBRATION_SIZE = 30
+
+    def __init__(self):
         # Variables de suivi
         self.ear = 0.3
         self.eye_counter = 0
@@ -96,16 +741,231 @@ class AdvancedDrowsinessDetector:
         self.alarm_triggered = False
 
         # Historique pour lissage
-        self.ear_history = []
-        self.history_size = 5
+        self.ear_history = RingBuffer(self.HISTORY_SIZE)
+
+        # Fenêtres longues : PERCLOS (1 = yeux fermés) et clignements (durée en s)
+        self.closure_history = RingBuffer(CONFIG['TEMPORAL_CAPACITY'])
+        self.blink_history = RingBuffer(CONFIG['TEMPORAL_CAPACITY'])
+        self.closed_since = None
+        self.first_timestamp = None
 
         # Référence EAR pour calibration
         self.ear_reference = 0.3
         self.calibrated = False
         self.calibration_frames = 0
-        self.calibration_values = []
+        self.calibration = StreamingMedian()
+        self.subject = None  # Identifiant du profil de calibration (None = non persisté)
+
+        # Suivi du visage entre deux détections complètes
+        self.last_face = None
+        self.face_template = None
+        self.track_scale = 1.0
+        self.track_score = 0.0
+        self.face_score = 0.0
+        self.frames_since_detection = 0
+
+        # Dernières positions des yeux, relatives au visage (x, y, w, h en fraction)
+        self.last_eyes = []
+        self.eye_misses = 0
+        self.eye_search = 'band'
+        self.single_eye_frames = 0  # Frames prédites consécutives avec un seul œil
+
+        # États précédents (transitions publiées sur le bus d'événements)
+        self.face_present = False
+        self.was_drowsy = False
+
+        # Filtrage par mouvement : zone des yeux réduite et derniers yeux / EAR
+        self.eye_signature = None
+        self.eye_reuses = 0
+        self.last_eye_results = None
+
+    def apply_profile(self, subject, profile):
+        """Reprendre la calibration enregistrée du sujet (précise dès la première frame)"""
+        self.subject = subject
+        if profile is None:
+            return
+        self.ear_reference, self.calibration = profile
+        self.calibration_frames = min(self.calibration.count, self.CALIBRATION_SIZE)
+        self.calibrated = self.calibration.count >= self.CALIBRATION_SIZE
+
+    def reset_alarm(self):
+        """Remettre à zéro la fermeture en cours et l'alarme (touche 'r')"""
+        self.eye_counter = 0
+        self.alarm_triggered = False
+        self.drowsy_start_time = None
+
+    def to_bytes(self):
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return pickle.loads(data)
+
+
+class AdvancedDrowsinessDetector:
+    """Détecteur avancé sans Dlib/MediaPipe
+
+    `models` (DetectionModels) est partagé ; `state` (SubjectState) porte
+    tout ce qui est propre au sujet et peut être échangé entre deux frames.
+    """
+
+    def __init__(self, models=None, state=None):
+        # Charger les backends de détection (visage / yeux), partagés
+        try:
+            self.models = models or DetectionModels.shared()
+            self.face_backend = self.models.face_backend
+            self.eye_backend = self.models.eye_backend
+
+        except FileNotFoundError as e:
+            print(f"❌ Impossible de charger les classificateurs: {e}")
+            print("Vérifiez que les fichiers de modèle sont dans le bon dossier")
+            print("Téléchargez depuis: https://github.com/opencv/opencv/tree/master/data")
+            exit(1)
 
-        print("✅ Détecteur avancé initialisé")
+        except Exception as e:
+            print(f"❌ Erreur d'initialisation: {e}")
+            exit(1)
+
+        self.state = state or SubjectState()
+
+        # Profils de calibration (CalibrationProfiles) et bus d'événements, optionnels
+        self.profiles = None
+        self.events = None
+        self.face_id = None  # Piste analysée (MultiFaceDetector), reprise dans les événements
+
+        # Prétraitement partagé et temps par étape (ms) de la dernière frame
+        self.preprocessor = FramePreprocessor()
+        self.timings = {}
+
+    def load_profile(self, subject):
+        """Associer le sujet et reprendre sa calibration si un profil existe"""
+        profile = self.profiles.load(subject) if self.profiles is not None else None
+        self.state.apply_profile(subject, profile)
+        return profile is not None
+
+    def reset_alarm(self):
+        self.state.reset_alarm()
+
+    def save_profile(self):
+        """Enregistrer la médiane affinée (la référence de la session en cours ne change pas)"""
+        if self.profiles is not None and self.state.subject is not None and self.state.calibrated:
+            self.profiles.save(self.state.subject, self.state.calibration.value(), self.state.calibration)
+
+    def emit(self, event_type, timestamp, **data):
+        """Publier un événement si un bus est attaché (avec face_id, None hors multi-visages)"""
+        if self.events is not None:
+            data['face_id'] = self.face_id
+            self.events.publish(Event(event_type, timestamp, data))
+
+    def warm_up(self, width=None, height=None):
+        """Premier passage des modèles sur une image vide (allocations, caches)
+
+        N'altère pas l'état de suivi : peut tourner en arrière-plan pendant
+        l'ouverture de la caméra.
+        """
+        width = width or CONFIG['FRAME_WIDTH']
+        height = height or CONFIG['FRAME_HEIGHT']
+        prep = FramePreprocessor().process(np.zeros((height, width, 3), dtype=np.uint8))
+        self.face_backend.detect(prep, 1, max(width, height))
+        roi = (0, 0, width // 4, height // 4)
+        if self.eye_backend.provides_ear:
+            self.eye_backend.eyes_with_ear(prep['gray'], roi)
+        else:
+            self.eye_backend.detect(prep['gray'][:roi[3], :roi[2]], 15, 80)
+
+    def detect_faces(self, prep):
+        """Tous les visages (pleine résolution) et leurs scores, sur le niveau réduit"""
+        scale = prep['scale']
+        min_size = max(1, CONFIG['MIN_FACE_SIZE'] // scale)
+        max_size = max(1, CONFIG['MAX_FACE_SIZE'] // scale)
+
+        faces, scores = self.face_backend.detect(prep, min_size, max_size)
+        return [(x * scale, y * scale, w * scale, h * scale) for x, y, w, h in faces], scores
+
+    def detect_face(self, prep):
+        """Détection complète du visage sur le niveau réduit de la pyramide"""
+        faces, scores = self.detect_faces(prep)
+
+        if len(faces) == 0:
+            return None
+
+        # Prendre le plus grand visage
+        best = max(range(len(faces)), key=lambda i: faces[i][2] * faces[i][3])
+        self.state.face_score = scores[best]
+        return faces[best]
+
+    def update_face_template(self, gray, face):
+        """Mémoriser un modèle réduit du visage pour le suivi"""
+        x, y, w, h = face
+        self.state.track_scale = CONFIG['TRACK_TEMPLATE_SIZE'] / float(w)
+        tw = CONFIG['TRACK_TEMPLATE_SIZE']
+        th = max(1, int(round(h * self.state.track_scale)))
+        self.state.face_template = cv2.resize(gray[y:y + h, x:x + w], (tw, th),
+                                              interpolation=cv2.INTER_AREA)
+
+    def track_face(self, gray):
+        """Suivre le visage par corrélation dans une fenêtre autour du dernier visage"""
+        if self.state.last_face is None or self.state.face_template is None:
+            return None
+
+        x, y, w, h = self.state.last_face
+        img_h, img_w = gray.shape[:2]
+        margin_x = int(w * CONFIG['TRACK_SEARCH_MARGIN'])
+        margin_y = int(h * CONFIG['TRACK_SEARCH_MARGIN'])
+
+        # Fenêtre de recherche limitée à l'image
+        sx0, sy0 = max(0, x - margin_x), max(0, y - margin_y)
+        sx1, sy1 = min(img_w, x + w + margin_x), min(img_h, y + h + margin_y)
+        if sx1 - sx0 < w or sy1 - sy0 < h:
+            return None  # Visage en bord d'image, re-détecter
+
+        # Recherche à l'échelle réduite du modèle
+        scale = self.state.track_scale
+        th, tw = self.state.face_template.shape[:2]
+        sw = max(tw, int(round((sx1 - sx0) * scale)))
+        sh = max(th, int(round((sy1 - sy0) * scale)))
+        window = cv2.resize(gray[sy0:sy1, sx0:sx1], (sw, sh),
+                            interpolation=cv2.INTER_AREA)
+
+        match = cv2.matchTemplate(window, self.state.face_template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (mx, my) = cv2.minMaxLoc(match)
+        self.state.track_score = float(score)
+
+        if score < CONFIG['TRACK_MIN_SCORE']:
+            return None  # Suivi perdu
+
+        nx = sx0 + int(round(mx / scale))
+        ny = sy0 + int(round(my / scale))
+        return min(nx, img_w - w), min(ny, img_h - h), w, h
+
+    def locate_face(self, prep):
+        """Localiser le visage : suivi rapide, détection complète si nécessaire
+
+        Retourne (face, tracked) où face vaut None si aucun visage.
+        """
+        gray = prep['equalized']
+        face = None
+        if (CONFIG['FACE_TRACKING'] and self.state.last_face is not None and
+                self.state.frames_since_detection < CONFIG['FACE_REDETECT_INTERVAL']):
+            face = self.track_face(gray)
+
+        if face is not None:
+            self.state.frames_since_detection += 1
+            self.state.last_face = face
+            return face, True
+
+        # Détection complète (intervalle atteint ou suivi perdu)
+        face = self.detect_face(prep)
+        self.state.frames_since_detection = 0
+        self.state.last_face = face
+        if face is None:
+            self.state.face_template = None
+            self.state.track_score = 0.0
+        else:
+            self.state.track_score = 1.0
+            if CONFIG['FACE_TRACKING']:
+                self.update_face_template(gray, face)
+        return face, False
 
     def detect_eyes(self, roi_gray, eye_region_height):
         """Détection des yeux avec paramètres optimisés"""
@@ -113,15 +973,60 @@ class AdvancedDrowsinessDetector:
         min_eye_size = max(15, eye_region_height // 12)
         max_eye_size = min(80, eye_region_height // 4)
 
-        eyes = self.eye_cascade.detectMultiScale(
-            roi_gray,
-            scaleFactor=1.1,
-            minNeighbors=5,  # Moins strict pour détecter plus d'yeux
-            minSize=(min_eye_size, min_eye_size),
-            maxSize=(max_eye_size, max_eye_size)
-        )
+        return self.eye_backend.detect(roi_gray, min_eye_size, max_eye_size)
+
+    def detect_eyes_predicted(self, gray, face_rect):
+        """Chercher chaque œil dans une petite fenêtre autour de sa position prédite
 
-        return eyes
+        La position est prédite à partir de la dernière position relative au
+        visage ; la plage de tailles est restreinte autour de la dernière taille.
+        Retourne des rectangles absolus.
+        """
+        x, y, w, h = face_rect
+        img_h, img_w = gray.shape[:2]
+        tolerance = CONFIG['EYE_SIZE_TOLERANCE']
+        found = []
+
+        for nx, ny, nw, nh in self.state.last_eyes:
+            ex, ey = x + int(nx * w), y + int(ny * h)
+            ew, eh = max(1, int(nw * w)), max(1, int(nh * h))
+            margin_x = int(ew * CONFIG['EYE_SEARCH_MARGIN'])
+            margin_y = int(eh * CONFIG['EYE_SEARCH_MARGIN'])
+
+            wx0, wy0 = max(0, ex - margin_x), max(0, ey - margin_y)
+            wx1, wy1 = min(img_w, ex + ew + margin_x), min(img_h, ey + eh + margin_y)
+            min_size = max(10, int(ew * (1 - tolerance)))
+            max_size = int(ew * (1 + tolerance)) + 1
+            if wx1 - wx0 < min_size or wy1 - wy0 < min_size:
+                continue
+
+            candidates = self.eye_backend.detect(gray[wy0:wy1, wx0:wx1], min_size, max_size)
+            if len(candidates) == 0:
+                continue
+
+            # Garder le candidat le plus proche de la position prédite
+            cx, cy = ex + ew / 2, ey + eh / 2
+            best = min(candidates, key=lambda c: (wx0 + c[0] + c[2] / 2 - cx) ** 2 +
+                                                 (wy0 + c[1] + c[3] / 2 - cy) ** 2)
+            rect = (wx0 + int(best[0]), wy0 + int(best[1]), int(best[2]), int(best[3]))
+
+            # Les fenêtres des deux yeux peuvent se chevaucher : éviter les doublons
+            if all(abs(rect[0] - other[0]) > rect[2] // 2 for other in found):
+                found.append(rect)
+
+        return found
+
+    def remember_eyes(self, face_rect, eyes):
+        """Mémoriser la position des yeux relative au visage pour la frame suivante"""
+        if eyes:
+            x, y, w, h = face_rect
+            self.state.last_eyes = [((ex - x) / w, (ey - y) / h, ew / w, eh / h)
+                                    for ex, ey, ew, eh in eyes]
+            self.state.eye_misses = 0
+        else:
+            self.state.eye_misses += 1
+            if self.state.eye_misses > CONFIG['EYE_PREDICTION_MAX_MISSES']:
+                self.state.last_eyes = []
 
     def calculate_ear_for_eye(self, eye_rect):
         """Calculer l'EAR pour un œil donné"""
@@ -139,203 +1044,513 @@ class AdvancedDrowsinessDetector:
         except:
             return 0.25
 
-    def detect_with_ear(self, frame, face_rect):
-        """Détection utilisant l'algorithme EAR"""
-        x, y, w, h = face_rect
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        # ROI pour les yeux (partie supérieure du visage)
-        roi_y_start = y + int(h * 0.2)  # 20% depuis le haut
-        roi_height = int(h * 0.4)  # 40% de hauteur
-        roi_gray = gray[roi_y_start:roi_y_start + roi_height, x:x + w]
-
-        # Améliorer le contraste pour mieux détecter les yeux
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        roi_gray = clahe.apply(roi_gray)
-
-        # Détecter les yeux
-        eyes = self.detect_eyes(roi_gray, roi_height)
-
-        ear_values = []
-        detected_eyes = []
+    def detect_with_ear(self, frame, face_rect, prep=None):
+        """Détection utilisant l'algorithme EAR
 
-        for (ex, ey, ew, eh) in eyes:
-            # Convertir en coordonnées absolues
-            abs_ex = x + ex
-            abs_ey = roi_y_start + ey
-
-            # Filtrer les faux positifs
-            aspect_ratio = ew / eh if eh > 0 else 0
-            if 0.5 < aspect_ratio < 3.0:  # Ratio réaliste pour un œil
-                detected_eyes.append((abs_ex, abs_ey, ew, eh))
+        Retourne (yeux, ear_par_oeil) : rectangles absolus et EAR de chaque œil.
+        """
+        x, y, w, h = face_rect
+        if prep is None:
+            prep = self.preprocessor.process(frame)
+
+        # ROI pour les yeux (partie supérieure du visage), déjà contrastée par CLAHE
+        roi_y_start = y + int(h * CONFIG['EYE_ROI_TOP'])  # 20% depuis le haut par défaut
+        roi_height = int(h * CONFIG['EYE_ROI_HEIGHT'])  # 40% de hauteur par défaut
+        roi_gray = prep['equalized'][roi_y_start:roi_y_start + roi_height, x:x + w]
+
+        # Détecter les yeux : fenêtres prédites d'abord, bande complète sinon
+        t0 = time.perf_counter()
+        eyes = []
+        self.state.eye_search = 'band'
+        if self.eye_backend.provides_ear:
+            # Le backend fournit directement l'EAR de chaque œil
+            eyes, ear_values = self.eye_backend.eyes_with_ear(prep['gray'], face_rect)
+            self.state.eye_search = 'landmarks'
+        elif CONFIG['EYE_PREDICTION'] and self.state.last_eyes:
+            eyes = self.detect_eyes_predicted(prep['equalized'], face_rect)
+            self.state.eye_search = 'prediction'
+            self.state.single_eye_frames = self.state.single_eye_frames + 1 if len(eyes) == 1 else 0
+        if not self.eye_backend.provides_ear and (
+                len(eyes) == 0 or self.state.single_eye_frames >= CONFIG['EYE_BAND_FALLBACK_FRAMES']):
+            # Aucun œil, ou un seul depuis trop longtemps : bande complète, sinon
+            # la prédiction ne chercherait plus que l'œil restant (coordonnées absolues)
+            band = [(x + int(ex), roi_y_start + int(ey), int(ew), int(eh))
+                    for (ex, ey, ew, eh) in self.detect_eyes(roi_gray, roi_height)]
+            self.state.single_eye_frames = 0
+            if len(band) >= len(eyes):
+                eyes = band
+                self.state.eye_search = 'band'
+        t1 = time.perf_counter()
+        self.timings['eye_cascade'] = (t1 - t0) * 1000
+
+        if self.eye_backend.provides_ear:
+            detected_eyes = eyes
+        else:
+            ear_values = []
+            detected_eyes = []
 
-                # Dessiner l'œil
-                cv2.rectangle(frame, (abs_ex, abs_ey),
-                              (abs_ex + ew, abs_ey + eh), (0, 255, 0), 2)
+            for (ex, ey, ew, eh) in eyes:
+                # Filtrer les faux positifs
+                aspect_ratio = ew / eh if eh > 0 else 0
+                if 0.5 < aspect_ratio < 3.0:  # Ratio réaliste pour un œil
+                    detected_eyes.append((ex, ey, ew, eh))
 
-                # Calculer EAR pour cet œil
-                ear = self.calculate_ear_for_eye((ex, ey, ew, eh))
-                ear_values.append(ear)
+                    # Calculer EAR pour cet œil
+                    ear = self.calculate_ear_for_eye((ex, ey, ew, eh))
+                    ear_values.append(float(ear))
 
-                # Afficher l'EAR pour cet œil
-                cv2.putText(frame, f"{ear:.2f}",
-                            (abs_ex, abs_ey - 5),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 0), 1)
+        self.remember_eyes(face_rect, detected_eyes)
 
         # Calculer l'EAR moyen
         if ear_values:
-            self.ear = np.mean(ear_values)
-
-            # Calibration
-            if not self.calibrated and self.calibration_frames < 30:
-                self.calibration_values.append(self.ear)
-                self.calibration_frames += 1
-
-                if self.calibration_frames >= 30:
-                    # Prendre la valeur médiane pour éviter les outliers
-                    self.ear_reference = np.median(self.calibration_values)
-                    self.calibrated = True
-                    print(f"✅ Calibration terminée. EAR référence: {self.ear_reference:.3f}")
+            self.state.ear = np.mean(ear_values)
+
+            # Calibration : médiane en flux (robuste aux clignements). La référence
+            # est figée après les 30 premières frames ; avec des profils, la
+            # médiane continue d'affiner le profil enregistré (prochaine session)
+            if not self.state.calibrated:
+                self.state.calibration.add(self.state.ear)
+                self.state.calibration_frames += 1
+
+                if self.state.calibration_frames >= SubjectState.CALIBRATION_SIZE:
+                    self.state.ear_reference = self.state.calibration.value()
+                    self.state.calibrated = True
+                    self.emit('calibration_done', time.time(), ear_reference=self.state.ear_reference)
+                    self.save_profile()
+            elif self.profiles is not None and CONFIG['CALIBRATION_PROFILES']:
+                self.state.calibration.add(self.state.ear)
+                if self.state.calibration.count % CONFIG['PROFILE_SAVE_INTERVAL'] == 0:
+                    self.save_profile()
 
             # Ajuster l'EAR par rapport à la référence
-            if self.calibrated:
-                adjustment = self.ear_reference / 0.28  # 0.28 est l'EAR moyen attendu
-                self.ear = self.ear * adjustment
+            if self.state.calibrated:
+                adjustment = self.state.ear_reference / 0.28  # 0.28 est l'EAR moyen attendu
+                self.state.ear = self.state.ear * adjustment
         else:
             # Si aucun œil détecté, considérer comme fermés
-            self.ear = 0.15
-
-        # Afficher le nombre d'yeux
-        cv2.putText(frame, f"Yeux: {len(detected_eyes)}",
-                    (x, y - 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-        return len(detected_eyes)
-
-    def detect(self, frame):
-        """Détection principale"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        # Améliorer le contraste
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        gray = clahe.apply(gray)
-
-        results = {
+            self.state.ear = 0.15
+
+        self.timings['ear'] = (time.perf_counter() - t1) * 1000
+        return detected_eyes, ear_values
+
+    def eye_region_unchanged(self, prep, eye_zone):
+        """Comparer la zone des yeux réduite à celle de la frame précédente
+
+        Retourne True si les yeux / EAR précédents peuvent être réutilisés :
+        écart moyen sous MOTION_THRESHOLD et moins de MOTION_MAX_REUSE
+        réutilisations d'affilée (une fermeture n'est jamais ratée plus longtemps).
+        """
+        zx, zy, zw, zh = eye_zone
+        region = prep['gray'][zy:zy + zh, zx:zx + zw]
+        if region.size == 0:
+            self.state.eye_signature = None
+            return False
+        signature = cv2.resize(region, CONFIG['MOTION_GRID'], interpolation=cv2.INTER_AREA)
+        previous = self.state.eye_signature
+        self.state.eye_signature = signature
+
+        if (previous is None or self.state.last_eye_results is None or
+                self.state.eye_reuses >= CONFIG['MOTION_MAX_REUSE']):
+            return False
+        change = cv2.norm(signature, previous, cv2.NORM_L1) / signature.size
+        return change < CONFIG['MOTION_THRESHOLD']
+
+    def update_long_window_metrics(self, results, now):
+        """PERCLOS, fréquence (par minute) et durée moyenne des clignements"""
+        self.state.closure_history.expire(now - CONFIG['PERCLOS_WINDOW'])
+        self.state.blink_history.expire(now - CONFIG['BLINK_RATE_WINDOW'])
+
+        results['perclos'] = self.state.closure_history.mean()
+        elapsed = min(CONFIG['BLINK_RATE_WINDOW'], now - self.state.first_timestamp)
+        results['blink_rate'] = len(self.state.blink_history) * 60.0 / elapsed if elapsed > 0 else 0.0
+        results['blink_duration'] = self.state.blink_history.mean()
+
+    def new_results(self):
+        """Résultats par défaut (aucun visage) pour l'état courant"""
+        return {
             'face_detected': False,
             'eyes_detected': 0,
-            'ear': self.ear,
+            'ear': self.state.ear,
             'is_drowsy': False,
             'is_blinking': False,
-            'blink_count': self.blink_counter,
-            'eye_state': 'INCONNU'
+            'blink_count': self.state.blink_counter,
+            'eye_state': 'INCONNU',
+            'face_tracked': False,
+            'face': None,
+            'eye_zone': None,
+            'eyes': [],
+            'eye_ears': [],
+            'eye_search': None,
+            'eye_reused': False,
+            'face_backend': self.face_backend.name,
+            'eye_backend': self.eye_backend.name,
+            'face_score': 0.0,
+            'eye_counter': self.state.eye_counter,
+            'alarm_triggered': self.state.alarm_triggered,
+            'calibrated': self.state.calibrated,
+            'calibration_frames': self.state.calibration_frames,
+            'perclos': 0.0,
+            'blink_rate': 0.0,
+            'blink_duration': 0.0,
+            'timings': self.timings
         }
 
-        # Détection des visages
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(CONFIG['MIN_FACE_SIZE'], CONFIG['MIN_FACE_SIZE']),
-            maxSize=(CONFIG['MAX_FACE_SIZE'], CONFIG['MAX_FACE_SIZE'])
-        )
-
-        if len(faces) == 0:
+    def detect(self, frame, timestamp=None):
+        """Détection principale (analyse seule, l'image n'est pas modifiée)
+
+        timestamp (secondes) permet de rejouer une vidéo plus vite que le
+        temps réel ; par défaut l'horloge murale est utilisée.
+        Le dessin des résultats est fait par draw_detections().
+        """
+        now = time.time() if timestamp is None else timestamp
+        # Prétraitement unique (gris + CLAHE + pyramide)
+        prep = self.preprocessor.process(frame)
+        self.timings = dict(self.preprocessor.timings)
+
+        # Localisation du visage (suivi ou détection complète)
+        t0 = time.perf_counter()
+        face, tracked = self.locate_face(prep)
+        self.timings['face'] = (time.perf_counter() - t0) * 1000
+
+        return self.analyze_face(frame, prep, face, tracked, now)
+
+    def analyze_face(self, frame, prep, face, tracked, now):
+        """Yeux, EAR et logique temporelle pour un visage déjà localisé (ou None)"""
+        results = self.new_results()
+        if self.state.first_timestamp is None:
+            self.state.first_timestamp = now
+
+        if face is None:
+            self.state.last_eyes = []
+            self.state.last_eye_results = None
+            if self.state.face_present:
+                self.state.face_present = False
+                self.emit('face_lost', now)
+            self.update_long_window_metrics(results, now)
             return results
 
-        results['face_detected'] = True
+        if not self.state.face_present:
+            self.state.face_present = True
+            self.emit('face_found', now, face=face)
 
-        # Prendre le plus grand visage
-        face = max(faces, key=lambda f: f[2] * f[3])
+        results['face_detected'] = True
+        results['face_tracked'] = tracked
+        results['face_score'] = self.state.track_score if tracked else self.state.face_score
+        results['face'] = face
         x, y, w, h = face
 
-        # Dessiner le rectangle du visage
-        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-
         # Zone des yeux (pour référence)
-        eye_zone_y = y + int(h * 0.2)
-        eye_zone_height = int(h * 0.4)
-        cv2.rectangle(frame, (x, eye_zone_y),
-                      (x + w, eye_zone_y + eye_zone_height),
-                      (255, 255, 0), 1)
-
-        # Détection avec EAR
-        eyes_count = self.detect_with_ear(frame, face)
+        results['eye_zone'] = (x, y + int(h * CONFIG['EYE_ROI_TOP']), w, int(h * CONFIG['EYE_ROI_HEIGHT']))
+
+        # Détection avec EAR, sautée si la zone des yeux n'a pas changé
+        t0 = time.perf_counter()
+        if CONFIG['MOTION_GATING'] and self.eye_region_unchanged(prep, results['eye_zone']):
+            # state.ear garde la valeur (déjà ajustée) de la dernière détection
+            eyes, eye_ears = self.state.last_eye_results
+            self.state.eye_reuses += 1
+            results['eye_reused'] = True
+        else:
+            eyes, eye_ears = self.detect_with_ear(frame, face, prep)
+            self.state.eye_reuses = 0
+            self.state.last_eye_results = (eyes, eye_ears)
+        self.timings['eyes'] = (time.perf_counter() - t0) * 1000
+        eyes_count = len(eyes)
         results['eyes_detected'] = eyes_count
+        results['eyes'] = eyes
+        results['eye_ears'] = eye_ears
+        results['eye_search'] = self.state.eye_search
 
-        # Lisser l'EAR avec moyenne mobile
-        self.ear_history.append(self.ear)
-        if len(self.ear_history) > self.history_size:
-            self.ear_history.pop(0)
-
-        smoothed_ear = np.mean(self.ear_history)
+        # Lisser l'EAR avec moyenne mobile (somme courante, O(1))
+        self.state.ear_history.push(self.state.ear)
+        smoothed_ear = self.state.ear_history.mean()
         results['ear'] = smoothed_ear
 
         # Détection d'état des yeux - LOGIQUE CORRIGÉE
         if eyes_count == 0:
             # Si aucun œil détecté
             results['eye_state'] = 'FERME'
-            self.eye_counter += 1
-            cv2.putText(frame, "FERME", (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            self.state.eye_counter += 1
         elif smoothed_ear < CONFIG['EYE_AR_THRESHOLD']:
             # Si EAR en dessous du seuil
             results['eye_state'] = 'FERME'
-            self.eye_counter += 1
-            cv2.putText(frame, "FERME", (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            self.state.eye_counter += 1
         else:
             # Yeux ouverts
             results['eye_state'] = 'OUVERT'
 
             # Détection de clignement
-            if self.eye_counter >= 2:  # Au moins 2 frames de fermeture = clignement
+            if self.state.eye_counter >= 2:  # Au moins 2 frames de fermeture = clignement
                 results['is_blinking'] = True
-                self.blink_counter += 1
-                results['blink_count'] = self.blink_counter
+                self.state.blink_counter += 1
+                results['blink_count'] = self.state.blink_counter
+                self.state.blink_history.push(now - self.state.closed_since, now)
+                self.emit('blink', now, duration=now - self.state.closed_since, count=self.state.blink_counter)
 
             # Réinitialiser
-            self.eye_counter = 0
-            self.drowsy_start_time = None
-            self.alarm_triggered = False
-
-            cv2.putText(frame, "OUVERT", (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            self.state.eye_counter = 0
+            self.state.drowsy_start_time = None
+            self.state.alarm_triggered = False
 
         # Vérifier la somnolence
-        if self.eye_counter >= CONFIG['EYE_AR_CONSEC_FRAMES']:
+        if self.state.eye_counter >= CONFIG['EYE_AR_CONSEC_FRAMES']:
             results['is_drowsy'] = True
 
             # Début timer
-            if self.drowsy_start_time is None:
-                self.drowsy_start_time = time.time()
+            if self.state.drowsy_start_time is None:
+                self.state.drowsy_start_time = now
 
             # Durée de somnolence
-            drowsy_duration = time.time() - self.drowsy_start_time
+            drowsy_duration = now - self.state.drowsy_start_time
 
             # Alarme après 1.5 secondes
-            if drowsy_duration >= 1.5 and not self.alarm_triggered:
-                self.alarm_triggered = True
-                cv2.putText(frame, "SOMMOLENCE!", (x, y - 40),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 3)
-
-        # Afficher les informations
-        info_y = y + h + 20
-        cv2.putText(frame, f"EAR: {smoothed_ear:.3f}", (x, info_y),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-
-        cv2.putText(frame, f"Compteur: {self.eye_counter}/{CONFIG['EYE_AR_CONSEC_FRAMES']}",
-                    (x, info_y + 20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 200, 0), 1)
-
-        # Afficher l'état de calibration
-        if not self.calibrated:
-            cv2.putText(frame, f"Calibration: {self.calibration_frames}/30",
-                        (x, info_y + 40),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 100, 100), 1)
+            if drowsy_duration >= 1.5 and not self.state.alarm_triggered:
+                self.state.alarm_triggered = True
+
+        if results['is_drowsy'] != self.state.was_drowsy:
+            self.state.was_drowsy = results['is_drowsy']
+            self.emit('drowsiness_onset' if self.state.was_drowsy else 'drowsiness_offset', now,
+                      eye_counter=self.state.eye_counter, ear=float(smoothed_ear))
+
+        # Début / fin de fermeture (durée des clignements)
+        if results['eye_state'] == 'FERME':
+            if self.state.closed_since is None:
+                self.state.closed_since = now
+        else:
+            self.state.closed_since = None
+        self.state.closure_history.push(results['eye_state'] == 'FERME', now)
+        self.update_long_window_metrics(results, now)
+
+        results['eye_counter'] = self.state.eye_counter
+        results['alarm_triggered'] = self.state.alarm_triggered
+        results['calibrated'] = self.state.calibrated
+        results['calibration_frames'] = self.state.calibration_frames
 
         return results
 
 
+def box_iou(a, b):
+    """Recouvrement (intersection / union) de deux rectangles (x, y, w, h)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class FaceTrack:
+    """Piste d'un visage : identifiant stable et état de suivi propre"""
+
+    __slots__ = ('id', 'state', 'face', 'misses')
+
+    def __init__(self, track_id, face):
+        self.id = track_id
+        self.state = SubjectState()
+        self.face = face
+        self.misses = 0
+
+
+class MultiFaceDetector:
+    """Suivi de tous les visages d'une frame, chacun avec son état
+
+    Le prétraitement et la détection des visages sont faits une fois par
+    frame ; les visages sont associés aux pistes par recouvrement, puis
+    les yeux / EAR de chaque visage sont calculés en parallèle (les
+    cascades libèrent le GIL). Même interface que AdvancedDrowsinessDetector :
+    detect() retourne les résultats du visage prioritaire (somnolent
+    d'abord, sinon le plus grand) et la liste complète dans 'faces'.
+    """
+
+    def __init__(self, models=None, workers=None):
+        self.main = AdvancedDrowsinessDetector(models=models)
+        self.models = self.main.models
+        self.preprocessor = self.main.preprocessor
+        self.pool = ThreadPoolExecutor(workers or CONFIG['FACE_WORKERS'],
+                                       thread_name_prefix='face')
+        self.local = threading.local()
+        self.tracks = {}
+        self.next_id = 1
+        self.primary = None
+        self.idle_state = SubjectState()
+        self.events = None
+        self.profiles = None  # Visages anonymes : pas de profil par sujet
+        self.timings = {}
+
+    @property
+    def state(self):
+        """État du visage prioritaire (pour l'affichage et les commandes)"""
+        return self.primary.state if self.primary is not None else self.idle_state
+
+    def warm_up(self, width=None, height=None):
+        self.main.warm_up(width, height)
+
+    def load_profile(self, subject):
+        return False
+
+    def save_profile(self):
+        pass
+
+    def reset_alarm(self):
+        for track in self.tracks.values():
+            track.state.reset_alarm()
+        self.idle_state.reset_alarm()
+
+    def detector(self):
+        """Détecteur du thread courant (l'état de la piste y est branché)"""
+        detector = getattr(self.local, 'detector', None)
+        if detector is None:
+            detector = self.local.detector = AdvancedDrowsinessDetector(models=self.models)
+        detector.events = self.events
+        return detector
+
+    def associate(self, faces):
+        """Associer les visages aux pistes (plus fort recouvrement d'abord)"""
+        pairs = sorted(((box_iou(track.face, face), track_id, i)
+                        for track_id, track in self.tracks.items()
+                        for i, face in enumerate(faces)), reverse=True)
+        matched, used = {}, set()
+        for iou, track_id, i in pairs:
+            if iou < CONFIG['FACE_MATCH_IOU']:
+                break
+            if track_id in matched or i in used:
+                continue
+            matched[track_id] = i
+            used.add(i)
+
+        for track_id, track in list(self.tracks.items()):
+            if track_id in matched:
+                track.face = faces[matched[track_id]]
+                track.misses = 0
+            else:
+                track.misses += 1
+                if track.misses > CONFIG['FACE_MAX_MISSES']:
+                    del self.tracks[track_id]
+
+        for i, face in enumerate(faces):
+            if i not in used and len(self.tracks) < CONFIG['MAX_FACES']:
+                self.tracks[self.next_id] = FaceTrack(self.next_id, face)
+                self.next_id += 1
+
+        return [track for track in self.tracks.values() if track.misses == 0]
+
+    def _analyze(self, track, frame, prep, now):
+        detector = self.detector()
+        detector.state = track.state
+        detector.face_id = track.id
+        detector.timings = {}
+        results = detector.analyze_face(frame, prep, track.face, False, now)
+        results['face_id'] = track.id
+        return results
+
+    def detect(self, frame, timestamp=None):
+        now = time.time() if timestamp is None else timestamp
+        prep = self.preprocessor.process(frame)
+        self.timings = dict(self.preprocessor.timings)
+
+        t0 = time.perf_counter()
+        faces, _ = self.main.detect_faces(prep)
+        # Garder les plus grands visages
+        faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)[:CONFIG['MAX_FACES']]
+        visible = self.associate(faces)
+        t1 = time.perf_counter()
+        self.timings['face'] = (t1 - t0) * 1000
+
+        if len(visible) > 1:
+            per_face = list(self.pool.map(lambda t: self._analyze(t, frame, prep, now), visible))
+        else:
+            per_face = [self._analyze(t, frame, prep, now) for t in visible]
+        self.timings['eyes'] = (time.perf_counter() - t1) * 1000
+
+        if not per_face:
+            self.primary = None
+            results = self.main.new_results()
+            results['timings'] = self.timings
+            results['faces'] = []
+            return results
+
+        best = max(range(len(per_face)), key=lambda i: (
+            per_face[i]['is_drowsy'], per_face[i]['face'][2] * per_face[i]['face'][3]))
+        self.primary = visible[best]
+        results = dict(per_face[best])
+        # Temps par étape de la frame : les étapes par visage sont additionnées
+        for face_results in per_face:
+            for stage in ('eye_cascade', 'ear'):
+                self.timings[stage] = self.timings.get(stage, 0.0) + face_results['timings'].get(stage, 0.0)
+        results['timings'] = self.timings
+        results['faces'] = per_face
+        return results
+
+
+def create_detector():
+    """Détecteur selon CONFIG['MULTI_FACE']"""
+    return MultiFaceDetector() if CONFIG['MULTI_FACE'] else AdvancedDrowsinessDetector()
+
+
+def draw_detections(frame, results):
+    """Dessiner les résultats de detect() sur l'image (affichage uniquement)"""
+    # Mode multi-visages : chaque visage avec son identifiant
+    for face_results in results.get('faces', [results]):
+        draw_face(frame, face_results)
+
+
+def draw_face(frame, results):
+    """Dessiner un visage, ses yeux et son état"""
+    if results['face'] is None:
+        return
+
+    x, y, w, h = results['face']
+
+    # Rectangle du visage
+    cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+    if 'face_id' in results:
+        cv2.putText(frame, f"#{results['face_id']}", (x + w - 30, y + 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+
+    # Zone des yeux (pour référence)
+    zx, zy, zw, zh = results['eye_zone']
+    cv2.rectangle(frame, (zx, zy), (zx + zw, zy + zh), (255, 255, 0), 1)
+
+    # Yeux et EAR par œil
+    for (ex, ey, ew, eh), ear in zip(results['eyes'], results['eye_ears']):
+        cv2.rectangle(frame, (ex, ey), (ex + ew, ey + eh), (0, 255, 0), 2)
+        cv2.putText(frame, f"{ear:.2f}", (ex, ey - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 0), 1)
+
+    # Nombre d'yeux
+    cv2.putText(frame, f"Yeux: {results['eyes_detected']}",
+                (x, y - 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+    # État des yeux
+    if results['eye_state'] == 'FERME':
+        cv2.putText(frame, "FERME", (x, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    else:
+        cv2.putText(frame, "OUVERT", (x, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+    if results['is_drowsy'] and results['alarm_triggered']:
+        cv2.putText(frame, "SOMMOLENCE!", (x, y - 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 3)
+
+    # Informations sous le visage
+    info_y = y + h + 20
+    cv2.putText(frame, f"EAR: {results['ear']:.3f}", (x, info_y),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    cv2.putText(frame, f"Compteur: {results['eye_counter']}/{CONFIG['EYE_AR_CONSEC_FRAMES']}",
+                (x, info_y + 20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 200, 0), 1)
+
+    # État de calibration
+    if not results['calibrated']:
+        cv2.putText(frame, f"Calibration: {results['calibration_frames']}/30",
+                    (x, info_y + 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 100, 100), 1)
+
+
 # ============================================
 # FONCTIONS UTILITAIRES
 # ============================================
@@ -368,7 +1583,8 @@ def init_camera():
 
 
 def init_audio():
-    """Initialiser l'audio"""
+    """Initialiser l'audio (pygame n'est importé qu'ici)"""
+    import pygame
     pygame.mixer.init()
 
     try:
@@ -386,13 +1602,31 @@ def init_audio():
     return sound
 
 
+def close_audio(sound):
+    """Arrêter le son et libérer le mixer"""
+    import pygame
+    sound.stop()
+    pygame.mixer.quit()
+
+
 def create_beep_sound():
     """Créer un bip"""
-    sample_rate = 22050
-    duration = 0.3
+    import pygame
+    return pygame.mixer.Sound(buffer=beep_waveform().tobytes())
+
+
+def beep_waveform(sample_rate=22050, duration=0.3, frequency=800):
+    """Onde du bip (int16 stéréo), mise en cache sur disque après la première synthèse"""
+    cache_path = os.path.join(CONFIG['CACHE_DIR'],
+                              f"beep_{frequency}hz_{sample_rate}_{duration}s.npy")
+    if os.path.exists(cache_path):
+        try:
+            return np.load(cache_path)
+        except (OSError, ValueError):
+            pass  # Cache corrompu : régénérer
 
     t = np.linspace(0, duration, int(sample_rate * duration), False)
-    wave = 0.7 * np.sin(2 * np.pi * 800 * t)
+    wave = 0.7 * np.sin(2 * np.pi * frequency * t)
 
     # Enveloppe
     envelope = np.ones_like(wave)
@@ -405,100 +1639,910 @@ def create_beep_sound():
     wave = np.int16(wave * 32767)
     wave = np.repeat(wave.reshape(-1, 1), 2, axis=1)
 
-    return pygame.mixer.Sound(buffer=wave.tobytes())
+    try:
+        os.makedirs(CONFIG['CACHE_DIR'], exist_ok=True)
+        np.save(cache_path, wave)
+    except OSError:
+        pass  # Pas de cache possible (disque en lecture seule)
+    return wave
+
+
+# Format binaire compact (un enregistrement par frame, lisible avec np.fromfile)
+EYE_STATES = ['INCONNU', 'OUVERT', 'FERME']
+LOG_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('ear', '<f4'),
+    ('eye_state', 'u1'),
+    ('eyes_detected', 'u1'),
+    ('drowsy', '?'),
+    ('blinks', '<u4'),
+])
+LOG_HEADER = ['Timestamp', 'EAR', 'EyeState', 'EyesDetected', 'Drowsy', 'Blinks']
 
 
 class DataLogger:
+    """Journal CSV tamponné, écrit par lots depuis un thread d'arrière-plan
+
+    Une erreur d'écriture (disque plein, fichier supprimé) n'arrête pas le
+    thread : les lignes restent en tampon, borné à LOG_MAX_BUFFER, et
+    l'écriture est retentée au lot suivant.
+    """
+
     def __init__(self):
-        if CONFIG['LOG_DATA']:
-            self.filename = f"drowsiness_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            with open(self.filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Timestamp', 'EAR', 'EyeState', 'EyesDetected', 'Drowsy', 'Blinks'])
+        self.enabled = CONFIG['LOG_DATA']
+        self.buffer = deque(maxlen=CONFIG['LOG_MAX_BUFFER'])
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.flush_event = threading.Event()
+        self.running = False
+        self.thread = None
+        self.filename = None
+        self.bin_filename = None
+        self.file_hour = None
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.write_errors = 0
+
+        if self.enabled:
+            self._open_files()
             print(f"📝 Log: {self.filename}")
+            self.running = True
+            self.thread = threading.Thread(target=self._writer_loop, name="logger", daemon=True)
+            self.thread.start()
+
+    def _open_files(self):
+        """Créer un nouveau fichier de log (au démarrage et à chaque rotation)"""
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        base = f"drowsiness_{stamp}"
+        suffix = 0
+        while os.path.exists(base + ".csv"):
+            suffix += 1
+            base = f"drowsiness_{stamp}_{suffix}"
+
+        self.filename = base + ".csv"
+        with open(self.filename, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(LOG_HEADER)
+        if CONFIG['LOG_BINARY']:
+            self.bin_filename = base + ".bin"
+            open(self.bin_filename, 'wb').close()
+        self.file_hour = datetime.now().strftime('%Y%m%d%H')
+
+    def _should_rotate(self):
+        if not os.path.exists(self.filename):
+            return True  # Supprimé par un nettoyage externe : nouveau fichier avec en-tête
+        if CONFIG['LOG_ROTATE_HOURLY'] and datetime.now().strftime('%Y%m%d%H') != self.file_hour:
+            return True
+        max_bytes = CONFIG['LOG_ROTATE_MB'] * 1024 * 1024
+        return max_bytes > 0 and os.path.getsize(self.filename) >= max_bytes
 
     def log(self, ear, eye_state, eyes_detected, drowsy, blinks):
-        if CONFIG['LOG_DATA']:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            with open(self.filename, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([timestamp, f"{ear:.3f}", eye_state, eyes_detected, drowsy, blinks])
+        """Ajouter une ligne au tampon (aucune E/S sur le thread appelant)"""
+        if not self.enabled:
+            return
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.rows_dropped += 1
+            self.buffer.append((time.time(), float(ear), eye_state,
+                                int(eyes_detected), bool(drowsy), int(blinks)))
+            pending = len(self.buffer)
+        if pending >= CONFIG['LOG_BATCH_SIZE']:
+            self.flush_event.set()
+
+    def _writer_loop(self):
+        while self.running:
+            self.flush_event.wait(CONFIG['LOG_FLUSH_INTERVAL'])
+            self.flush_event.clear()
+            self.flush()
+
+    def flush(self):
+        """Écrire le tampon courant en un seul lot ; retourne False si l'écriture a échoué"""
+        with self.write_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, deque(maxlen=self.buffer.maxlen)
+            if not rows:
+                return True
+            try:
+                self._write_rows(rows)
+            except Exception as e:
+                self.write_errors += 1
+                if self.write_errors == 1:
+                    print(f"⚠️  Écriture du log impossible ({e}), nouvel essai au prochain lot")
+                # Remettre les lignes devant les nouvelles, dans la limite du tampon
+                with self.lock:
+                    pending = len(rows) + len(self.buffer)
+                    rows.extend(self.buffer)
+                    self.buffer = rows
+                    self.rows_dropped += max(0, pending - len(rows))
+                return False
+            if self.write_errors:
+                print(f"📝 Log rétabli après {self.write_errors} échecs: {self.filename}")
+                self.write_errors = 0
+            return True
+
+    def _write_rows(self, rows):
+        if self._should_rotate():
+            self._open_files()
+            print(f"📝 Nouveau log: {self.filename}")
+
+        with open(self.filename, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(
+                [datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'), f"{ear:.3f}",
+                 state, eyes, drowsy, blinks]
+                for ts, ear, state, eyes, drowsy, blinks in rows)
+
+        if CONFIG['LOG_BINARY']:
+            records = np.empty(len(rows), dtype=LOG_DTYPE)
+            for i, (ts, ear, state, eyes, drowsy, blinks) in enumerate(rows):
+                records[i] = (ts, ear, EYE_STATES.index(state) if state in EYE_STATES else 0,
+                              min(eyes, 255), drowsy, blinks)
+            with open(self.bin_filename, 'ab') as f:
+                records.tofile(f)
+
+        self.rows_written += len(rows)
+
+    def close(self):
+        """Arrêter le thread d'écriture et vider le tampon"""
+        if self.thread is not None:
+            self.running = False
+            self.flush_event.set()
+            self.thread.join()
+            self.thread = None
+        if self.enabled and not self.flush():
+            print(f"❌ {len(self.buffer)} lignes de log non écrites")
+
+
+class LatestQueue:
+    """File bornée où la frame la plus récente gagne (les plus anciennes sont jetées)
+
+    Avec policy='drop_newest', c'est au contraire l'élément entrant qui est jeté.
+    """
+
+    def __init__(self, maxsize=1, policy='drop_oldest', on_drop=None):
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        # Appelé avec chaque élément jeté (ex. rendre un tampon à son pool)
+        self.on_drop = on_drop
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        dropped = None
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                self.dropped += 1
+                if self.policy == 'drop_newest':
+                    dropped = item
+                else:
+                    dropped = self.items.popleft()
+            if dropped is not item:
+                self.items.append(item)
+                self.put_count += 1
+                self.cond.notify()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def get(self, timeout=None):
+        """Retourne le plus ancien élément restant, ou None (timeout / fermeture)"""
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if self.items:
+                return self.items.popleft()
+            return None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {'depth': len(self.items), 'put': self.put_count, 'dropped': self.dropped}
+
+
+class PipelineRunner:
+    """Pipeline capture -> détection -> affichage sur des threads séparés
+
+    Le thread de capture lit et retourne les frames, le thread de détection
+    traite toujours la frame la plus récente, et le thread principal
+    récupère (frame, results) pour l'alarme, le log et l'affichage.
+    """
+
+    def __init__(self, cap, detector, queue_size=None, recorder=None, pool=None):
+        if queue_size is None:
+            queue_size = CONFIG['PIPELINE_QUEUE_SIZE']
+        self.reader = FrameReader(cap, pool)
+        self.pool = self.reader.pool
+        self.detector = detector
+        self.recorder = recorder
+        # Les frames jetées retournent au pool
+        self.frame_queue = LatestQueue(queue_size, on_drop=self.pool.release)
+        self.result_queue = LatestQueue(queue_size, on_drop=lambda item: self.pool.release(item[0]))
+        self.running = False
+        self.capture_failed = False
+        self.detect_error = None
+        self.pending_settings = {}
+        self.reset_pending = False
+        self.settings_lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._detect_loop, name="detection", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _capture_loop(self):
+        try:
+            while self.running:
+                ret, frame = self.reader.read()
+                if not ret:
+                    self.capture_failed = True
+                    break
+                self.frame_queue.put(frame)
+        finally:
+            # Débloquer la détection même si la capture lève une exception
+            self.frame_queue.close()
+
+    def configure(self, settings):
+        """Modifier CONFIG depuis un autre thread : appliqué avant la frame suivante"""
+        with self.settings_lock:
+            self.pending_settings.update(settings)
+
+    def reset_alarm(self):
+        """Réinitialiser l'alarme depuis un autre thread : fait avant la frame suivante"""
+        with self.settings_lock:
+            self.reset_pending = True
+
+    def _apply_settings(self):
+        with self.settings_lock:
+            settings, self.pending_settings = self.pending_settings, {}
+            reset, self.reset_pending = self.reset_pending, False
+        if settings:
+            CONFIG.update(settings)
+        if reset:
+            self.detector.reset_alarm()
+
+    def _detect_loop(self):
+        try:
+            while self.running:
+                frame = self.frame_queue.get(timeout=0.5)
+                if frame is None:
+                    if self.frame_queue.closed:
+                        break
+                    continue
+                # Jamais de changement de réglages (ni de remise à zéro) au milieu d'une frame
+                self._apply_settings()
+                timestamp = time.time()
+                if self.recorder is not None:
+                    self.recorder.write(frame, timestamp)
+                results = self.detector.detect(frame, timestamp)
+                self.result_queue.put((frame, results))
+        except Exception as e:
+            self.detect_error = e
+            print(f"❌ Erreur de détection: {e!r}")
+        finally:
+            # Débloquer l'affichage même si la détection lève une exception
+            self.result_queue.close()
+
+    @property
+    def finished(self):
+        return self.result_queue.closed and not self.result_queue.items
+
+    def get_result(self, timeout=None):
+        """Dernier couple (frame, results) disponible, ou None
+
+        La frame appartient à l'appelant jusqu'à release(frame).
+        """
+        return self.result_queue.get(timeout)
+
+    def release(self, frame):
+        self.pool.release(frame)
+
+    def stats(self):
+        return {
+            'capture': self.frame_queue.stats(),
+            'detection': self.result_queue.stats(),
+        }
 
+    def stop(self):
+        self.running = False
+        self.frame_queue.close()
+        self.result_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
 
-def draw_advanced_ui(frame, fps, status, results, alarm_active):
-    """Interface avancée"""
-    height, width = frame.shape[:2]
 
-    # Panneau supérieur
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (0, 0), (width, 140), (0, 0, 0), -1)
-    cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-
-    # Titre
-    cv2.putText(frame, "DETECTION DE SOMMOLENCE", (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-
-    # Statut
-    y = 60
-    status_color = (0, 255, 0)  # Vert par défaut
-
-    if "SOMMOLENCE" in status:
-        status_color = (0, 0, 255)  # Rouge pour somnolence
-    elif "FERME" in status:
-        status_color = (0, 165, 255)  # Orange pour yeux fermés
-
-    cv2.putText(frame, f"Statut: {status}", (10, y),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2)
-
-    # Métriques
-    y += 25
-    ear_color = (0, 255, 0) if results['ear'] > CONFIG['EYE_AR_THRESHOLD'] else (0, 0, 255)
-    cv2.putText(frame, f"EAR: {results['ear']:.3f}", (10, y),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.6, ear_color, 1)
-
-    # Barre de progression EAR
-    bar_x, bar_y = 100, y - 8
-    bar_width, bar_height = 150, 10
-    ear_percent = min(1.0, results['ear'] / 0.4)
-
-    cv2.rectangle(frame, (bar_x, bar_y),
-                  (bar_x + bar_width, bar_y + bar_height),
-                  (100, 100, 100), -1)
-    cv2.rectangle(frame, (bar_x, bar_y),
-                  (bar_x + int(bar_width * ear_percent), bar_y + bar_height),
-                  ear_color, -1)
-
-    # Seuil EAR
-    threshold_x = bar_x + int((CONFIG['EYE_AR_THRESHOLD'] / 0.4) * bar_width)
-    cv2.line(frame, (threshold_x, bar_y),
-             (threshold_x, bar_y + bar_height),
-             (255, 255, 255), 2)
-
-    y += 25
-    cv2.putText(frame, f"Yeux détectés: {results['eyes_detected']}", (10, y),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
-
-    y += 20
-    cv2.putText(frame, f"Clignements: {results['blink_count']}", (10, y),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
-
-    # FPS
-    if CONFIG['SHOW_FPS']:
-        fps_color = (0, 255, 0) if fps > 20 else (0, 165, 255) if fps > 10 else (0, 0, 255)
-        cv2.putText(frame, f"FPS: {fps:.1f}", (width - 100, 60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, fps_color, 1)
-
-    # Alarme
-    if alarm_active:
-        # LED clignotante
-        if int(time.time() * 3) % 2 == 0:
-            cv2.circle(frame, (width - 40, 30), 12, (0, 0, 255), -1)
-        cv2.putText(frame, "ALARME!", (width - 100, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+# ============================================
+# BUS D'ÉVÉNEMENTS
+# ============================================
+
+class Event:
+    """Événement typé émis par le détecteur ou la boucle principale
+
+    Types : 'frame', 'blink', 'face_lost', 'face_found', 'calibration_done',
+    'drowsiness_onset', 'drowsiness_offset', 'alarm_start', 'alarm_stop'.
+    """
+
+    __slots__ = ('type', 'timestamp', 'data')
+
+    def __init__(self, event_type, timestamp, data=None):
+        self.type = event_type
+        self.timestamp = timestamp
+        self.data = data or {}
+
+    def to_dict(self):
+        return {'type': self.type, 'timestamp': self.timestamp, 'data': self.data}
+
+
+class Subscription:
+    """Abonné avec sa propre file et son propre thread de consommation"""
+
+    def __init__(self, name, handler, types=None, maxsize=256, policy='drop_oldest'):
+        self.name = name
+        self.handler = handler
+        self.types = set(types) if types else None
+        self.queue = LatestQueue(maxsize, policy)
+        self.delivered = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, name=f"event-{name}", daemon=True)
+        self.thread.start()
+
+    def accepts(self, event_type):
+        return self.types is None or event_type in self.types
+
+    def _run(self):
+        while True:
+            event = self.queue.get(timeout=0.5)
+            if event is None:
+                if self.queue.closed:
+                    break
+                continue
+            try:
+                self.handler(event)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"⚠️  Abonné {self.name}: {e}")
+
+    def close(self, timeout=2.0):
+        self.queue.close()
+        self.thread.join(timeout)
+
+    def stats(self):
+        stats = self.queue.stats()
+        stats.update(delivered=self.delivered, errors=self.errors)
+        return stats
+
+
+class EventBus:
+    """Diffusion d'événements vers des abonnés indépendants
+
+    publish() ne fait qu'ajouter l'événement aux files des abonnés concernés :
+    un abonné lent ne ralentit jamais la boucle de détection, il perd des
+    événements selon sa politique (drop_oldest / drop_newest).
+    """
+
+    def __init__(self):
+        self.subscriptions = []
+
+    def subscribe(self, name, handler, types=None, maxsize=256, policy='drop_oldest'):
+        subscription = Subscription(name, handler, types, maxsize, policy)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def publish(self, event):
+        for subscription in self.subscriptions:
+            if subscription.accepts(event.type):
+                subscription.queue.put(event)
+
+    def stats(self):
+        return {s.name: s.stats() for s in self.subscriptions}
+
+    def close(self):
+        for subscription in self.subscriptions:
+            subscription.close()
+
+
+def audio_handler(sound):
+    """Abonné audio : jouer / arrêter l'alarme"""
+    def handle(event):
+        if event.type == 'alarm_start':
+            sound.play(loops=-1)
+        elif event.type == 'alarm_stop':
+            sound.stop()
+    return handle
+
+
+def console_handler(event):
+    """Abonné console : messages d'alarme et de calibration"""
+    data = event.data
+    if event.type == 'alarm_start':
+        print(f"\n🚨 ALARME ACTIVÉE! Yeux fermés depuis {data['eye_counter']} frames")
+        print(f"   EAR: {data['ear']:.3f} (seuil: {data['threshold']:.3f})")
+    elif event.type == 'alarm_stop':
+        print("🔇 Alarme arrêtée")
+    elif event.type == 'calibration_done':
+        print(f"✅ Calibration terminée. EAR référence: {data['ear_reference']:.3f}")
+
+
+def logger_handler(logger):
+    """Abonné journal : une ligne par événement 'frame'"""
+    def handle(event):
+        results = event.data
+        logger.log(results['ear'], results['eye_state'], results['eyes_detected'],
+                   results['is_drowsy'], results['blink_count'])
+    return handle
 
-    # Légende
-    cv2.putText(frame, "Vert=ouvert | Rouge=fermé | Bleu=visage | Jaune=zone yeux",
-                (10, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 150, 150), 1)
+
+def webhook_handler(url, timeout=None):
+    """Abonné webhook : POST JSON de chaque événement"""
+    timeout = CONFIG['WEBHOOK_TIMEOUT'] if timeout is None else timeout
+
+    def handle(event):
+        body = json.dumps(event.to_dict(), default=float).encode('utf-8')
+        request = urllib.request.Request(url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    return handle
+
+
+WEBHOOK_EVENTS = ('alarm_start', 'alarm_stop', 'drowsiness_onset', 'drowsiness_offset',
+                  'face_lost', 'calibration_done')
+
+
+def print_startup_timings():
+    """Afficher le temps de démarrage par étape"""
+    steps = ", ".join(f"{k}={v:.0f}ms" for k, v in STARTUP_TIMINGS.items() if k != 'first_frame')
+    print(f"⏱️  Démarrage: {steps}")
+    if 'first_frame' in STARTUP_TIMINGS:
+        print(f"   Première détection après {STARTUP_TIMINGS['first_frame']:.0f} ms")
+
+
+def allocation_stats(pool, detector):
+    """Allocations de tampons : pool de frames et prétraitement
+
+    Les petites images du suivi du visage (fenêtre réduite, scores de
+    matchTemplate, modèle) et la signature des yeux ne passent pas par ces
+    tampons et ne sont pas comptées.
+    """
+    stats = pool.stats()
+    stats['preprocessing'] = detector.preprocessor.allocations
+    return stats
+
+
+def print_pipeline_stats(runner):
+    """Afficher la profondeur des files et les frames jetées"""
+    for stage, stats in runner.stats().items():
+        print(f"   File {stage}: profondeur={stats['depth']} "
+              f"reçues={stats['put']} jetées={stats['dropped']}")
+
+
+# ============================================
+# CONTRÔLE DU BUDGET DE LATENCE
+# ============================================
+
+# Niveaux de réglage, du plus précis au plus économique
+QUALITY_LEVELS = [
+    {'FACE_PYRAMID_LEVEL': 0, 'FACE_SCALE_FACTOR': 1.1, 'EYE_SCALE_FACTOR': 1.1,
+     'FACE_REDETECT_INTERVAL': 5, 'EYE_SEARCH_MARGIN': 0.75},
+    {'FACE_PYRAMID_LEVEL': 1, 'FACE_SCALE_FACTOR': 1.1, 'EYE_SCALE_FACTOR': 1.1,
+     'FACE_REDETECT_INTERVAL': 10, 'EYE_SEARCH_MARGIN': 0.5},
+    {'FACE_PYRAMID_LEVEL': 1, 'FACE_SCALE_FACTOR': 1.2, 'EYE_SCALE_FACTOR': 1.15,
+     'FACE_REDETECT_INTERVAL': 15, 'EYE_SEARCH_MARGIN': 0.4},
+    {'FACE_PYRAMID_LEVEL': 2, 'FACE_SCALE_FACTOR': 1.2, 'EYE_SCALE_FACTOR': 1.2,
+     'FACE_REDETECT_INTERVAL': 20, 'EYE_SEARCH_MARGIN': 0.3},
+    {'FACE_PYRAMID_LEVEL': 2, 'FACE_SCALE_FACTOR': 1.3, 'EYE_SCALE_FACTOR': 1.25,
+     'FACE_REDETECT_INTERVAL': 30, 'EYE_SEARCH_MARGIN': 0.25},
+]
+
+
+# Sous-étapes déjà comprises dans 'eyes' (à ne pas compter deux fois)
+NESTED_TIMINGS = ('eye_cascade', 'ear')
+
+
+def frame_latency_ms(timings):
+    """Latence d'une frame : somme des étapes disjointes seulement"""
+    return sum(v for k, v in timings.items() if k not in NESTED_TIMINGS)
+
+
+class LatencyController:
+    """Ajuste les réglages de détection pour tenir un budget de latence par frame
+
+    La latence est lissée (moyenne exponentielle) et comparée au budget toutes
+    les `period` frames, avec hystérésis. EYE_AR_CONSEC_FRAMES est recalculé
+    selon la cadence mesurée pour toujours représenter la même durée.
+    Les nouveaux réglages passent par `apply` (CONFIG.update par défaut) ;
+    avec le pipeline, PipelineRunner.configure les applique entre deux frames
+    sur le thread de détection.
+    """
+
+    def __init__(self, budget_ms=None, period=30, alpha=0.1, apply=None):
+        self.budget_ms = CONFIG['LATENCY_BUDGET_MS'] if budget_ms is None else budget_ms
+        self.apply = CONFIG.update if apply is None else apply
+        self.period = period
+        self.alpha = alpha
+        self.latency_ms = None
+        self.interval_s = None
+        self.last_timestamp = None
+        self.frames = 0
+        self.adjustments = []
+        # Durée de fermeture équivalente aux réglages d'origine
+        self.consec_seconds = CONFIG['EYE_AR_CONSEC_FRAMES'] / float(CONFIG['NOMINAL_FPS'])
+        self.consec_frames = CONFIG['EYE_AR_CONSEC_FRAMES']
+        self.level = self._closest_level()
+
+    @staticmethod
+    def _closest_level():
+        """Niveau correspondant le mieux à la configuration courante"""
+        return min(range(len(QUALITY_LEVELS)), key=lambda i: sum(
+            CONFIG[k] != v for k, v in QUALITY_LEVELS[i].items()))
+
+    def update(self, frame_ms, timestamp=None):
+        """Enregistrer la latence d'une frame ; retourne True si les réglages ont changé"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.latency_ms is None:
+            self.latency_ms = frame_ms
+        else:
+            self.latency_ms += self.alpha * (frame_ms - self.latency_ms)
+
+        if self.last_timestamp is not None:
+            interval = timestamp - self.last_timestamp
+            if self.interval_s is None:
+                self.interval_s = interval
+            else:
+                self.interval_s += self.alpha * (interval - self.interval_s)
+        self.last_timestamp = timestamp
+
+        self.frames += 1
+        if self.frames % self.period:
+            return False
+
+        changed = False
+        if self.latency_ms > self.budget_ms and self.level < len(QUALITY_LEVELS) - 1:
+            changed = self._set_level(self.level + 1, "budget dépassé")
+        elif self.latency_ms < 0.6 * self.budget_ms and self.level > 0:
+            changed = self._set_level(self.level - 1, "marge disponible")
+
+        return self._rescale_thresholds() or changed
+
+    def _set_level(self, level, reason):
+        self.level = level
+        self.apply(QUALITY_LEVELS[level])
+        self._record(f"niveau {level} ({reason}, {self.latency_ms:.1f} ms / "
+                     f"{self.budget_ms:.1f} ms): " +
+                     ", ".join(f"{k}={v}" for k, v in QUALITY_LEVELS[level].items()))
+        return True
+
+    def _rescale_thresholds(self):
+        """Garder EYE_AR_CONSEC_FRAMES équivalent à une durée fixe"""
+        if not self.interval_s or self.interval_s <= 0:
+            return False
+        frames = max(2, int(round(self.consec_seconds / self.interval_s)))
+        if frames == self.consec_frames:
+            return False
+        self._record(f"EYE_AR_CONSEC_FRAMES {self.consec_frames} -> {frames} "
+                     f"({1.0 / self.interval_s:.1f} FPS, {self.consec_seconds:.2f} s)")
+        self.consec_frames = frames
+        self.apply({'EYE_AR_CONSEC_FRAMES': frames})
+        return True
+
+    def _record(self, message):
+        self.adjustments.append((time.time(), message))
+        print(f"⚙️  Réglage auto: {message}")
+
+
+# ============================================
+# MÉTRIQUES
+# ============================================
+
+# Bornes des histogrammes de latence (ms)
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 33, 50, 100, 200, 500]
+
+
+class LatencyHistogram:
+    """Histogramme cumulatif (format Prometheus) et fenêtre glissante d'échantillons"""
+
+    def __init__(self, window):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and value > LATENCY_BUCKETS[index]:
+            index += 1
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+
+class DetectionMetrics:
+    """Compteurs et histogrammes par étape de la boucle de détection
+
+    Désactivé (enabled=False), chaque appel retourne immédiatement.
+    """
+
+    COUNTERS = {
+        'frames_total': "Frames analysées",
+        'dropped_frames_total': "Frames jetées par le pipeline",
+        'faces_lost_total': "Pertes du visage",
+        'eyes_not_found_total': "Frames avec visage mais sans yeux",
+        'blinks_total': "Clignements détectés",
+        'alarms_total': "Alarmes déclenchées",
+        'face_redetections_total': "Détections complètes du visage",
+        'buffer_allocations_total': "Tampons de frame et de prétraitement alloués (stable en régime "
+                                    "établi ; le suivi du visage n'est pas compté)",
+    }
+
+    def __init__(self, enabled=True, window=None):
+        self.enabled = enabled
+        self.window = window or CONFIG['METRICS_WINDOW']
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.gauges = {'ear': 0.0, 'fps': 0.0}
+        self.histograms = {}
+        self.collectors = []
+        self.face_present = False
+        self.server = None
+
+    def inc(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] += value
+
+    def add_collector(self, collector):
+        """Fonction appelée à chaque lecture, retourne {compteur: valeur absolue}"""
+        self.collectors.append(collector)
+
+    def observe(self, results, fps=None):
+        """Enregistrer une frame analysée (résultats de detect())"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters['frames_total'] += 1
+            for stage, value in results['timings'].items():
+                histogram = self.histograms.get(stage)
+                if histogram is None:
+                    histogram = self.histograms[stage] = LatencyHistogram(self.window)
+                histogram.observe(value)
+
+            if self.face_present and not results['face_detected']:
+                self.counters['faces_lost_total'] += 1
+            self.face_present = results['face_detected']
+            if results['face_detected'] and results['eyes_detected'] == 0:
+                self.counters['eyes_not_found_total'] += 1
+            if not results['face_tracked']:
+                self.counters['face_redetections_total'] += 1
+            if results['is_blinking']:
+                self.counters['blinks_total'] += 1
+
+            self.gauges['ear'] = float(results['ear'])
+            if fps is not None:
+                self.gauges['fps'] = float(fps)
+
+    def render(self):
+        """Texte au format d'exposition Prometheus"""
+        with self.lock:
+            counters = dict(self.counters)
+            for collector in self.collectors:
+                counters.update(collector())
+
+            lines = []
+            for name, help_text in self.COUNTERS.items():
+                lines.append(f"# HELP drowsiness_{name} {help_text}")
+                lines.append(f"# TYPE drowsiness_{name} counter")
+                lines.append(f"drowsiness_{name} {counters[name]}")
+            for name, value in self.gauges.items():
+                lines.append(f"# TYPE drowsiness_{name} gauge")
+                lines.append(f"drowsiness_{name} {value:.4f}")
+
+            lines.append("# HELP drowsiness_stage_latency_ms Latence par étape (ms)")
+            lines.append("# TYPE drowsiness_stage_latency_ms histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ['+Inf'], histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'drowsiness_stage_latency_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'drowsiness_stage_latency_ms_sum{{stage="{stage}"}} {histogram.total:.3f}')
+                lines.append(f'drowsiness_stage_latency_ms_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append("# HELP drowsiness_stage_latency_recent_ms Quantiles sur les dernières frames")
+            lines.append("# TYPE drowsiness_stage_latency_recent_ms summary")
+            for stage, histogram in sorted(self.histograms.items()):
+                if not histogram.recent:
+                    continue
+                recent = np.percentile(np.fromiter(histogram.recent, dtype=np.float64), [50, 95, 99])
+                for quantile, value in zip(('0.5', '0.95', '0.99'), recent):
+                    lines.append(f'drowsiness_stage_latency_recent_ms{{stage="{stage}",quantile="{quantile}"}} {value:.3f}')
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host=None, port=None):
+        """Exposer /metrics sur HTTP dans un thread d'arrière-plan"""
+        host = host or CONFIG['METRICS_HOST']
+        port = CONFIG['METRICS_PORT'] if port is None else port
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Pas de log par requête
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        print(f"📈 Métriques: http://{host}:{self.server.server_address[1]}/metrics")
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class UICompositor:
+    """Interface avancée composée à partir de calques mis en cache
+
+    Le titre et la légende sont dessinés une seule fois. Chaque élément
+    dynamique (statut, EAR, yeux, clignements, FPS, alarme) a sa zone dans
+    un calque : elle n'est redessinée que si sa valeur affichée change. Par
+    frame, il ne reste qu'à assombrir le panneau (sur place, zone seule) et
+    à y recopier les pixels du calque.
+    """
+
+    PANEL_HEIGHT = 141  # Lignes 0 à 140 incluses, comme cv2.rectangle
+    SIDE_WIDTH = 110  # Colonne de droite (FPS, alarme)
+
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.layer = np.zeros((self.PANEL_HEIGHT, width, 3), dtype=np.uint8)
+        self.mask = np.zeros((self.PANEL_HEIGHT, width), dtype=np.uint8)
+        self.keys = {}
+        self.redraws = 0
+
+        side = width - self.SIDE_WIDTH
+        # Zones (y0, y1, x0, x1) de chaque élément dans le panneau
+        self.regions = {
+            'title': (0, 44, 0, side),
+            'alarm': (0, 44, side, width),
+            'status': (44, 68, 0, side),
+            'fps': (44, 68, side, width),
+            'ear': (68, 95, 0, side),
+            'eyes': (95, 117, 0, side),
+            'blinks': (117, self.PANEL_HEIGHT, 0, side),
+        }
+        self.update('title', True, lambda layer: cv2.putText(
+            layer, "DETECTION DE SOMMOLENCE", (10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2))
+
+        # Légende pré-rendue (bas de l'image, hors panneau)
+        self.legend_y = max(self.PANEL_HEIGHT, height - 25)
+        self.legend = np.zeros((height - self.legend_y, width, 3), dtype=np.uint8)
+        cv2.putText(self.legend, "Vert=ouvert | Rouge=fermé | Bleu=visage | Jaune=zone yeux",
+                    (10, height - 10 - self.legend_y), cv2.FONT_HERSHEY_SIMPLEX, 0.4,
+                    (150, 150, 150), 1)
+        self.legend_mask = self.legend.any(axis=2).astype(np.uint8)
+
+    def update(self, name, key, draw):
+        """Redessiner la zone `name` du calque seulement si `key` a changé"""
+        if self.keys.get(name, self) == key:
+            return
+        self.keys[name] = key
+        self.redraws += 1
+        y0, y1, x0, x1 = self.regions[name]
+        self.layer[y0:y1, x0:x1] = 0
+        if key is not None:
+            draw(self.layer)
+        self.mask[y0:y1, x0:x1] = self.layer[y0:y1, x0:x1].any(axis=2)
+
+    def draw_dynamic(self, fps, status, results, alarm_active):
+        # Statut
+        status_color = (0, 255, 0)  # Vert par défaut
+        if "SOMMOLENCE" in status:
+            status_color = (0, 0, 255)  # Rouge pour somnolence
+        elif "FERME" in status:
+            status_color = (0, 165, 255)  # Orange pour yeux fermés
+        self.update('status', status, lambda layer: cv2.putText(
+            layer, f"Statut: {status}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2))
+
+        # Métriques : EAR (3 décimales affichées) et barre de progression
+        ear = results['ear']
+        threshold = CONFIG['EYE_AR_THRESHOLD']
+        ear_color = (0, 255, 0) if ear > threshold else (0, 0, 255)
+        bar_x, bar_y = 100, 77
+        bar_width, bar_height = 150, 10
+        ear_fill = int(bar_width * min(1.0, ear / 0.4))
+        threshold_x = bar_x + int((threshold / 0.4) * bar_width)
+
+        def draw_ear(layer):
+            cv2.putText(layer, f"EAR: {ear:.3f}", (10, 85),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, ear_color, 1)
+            cv2.rectangle(layer, (bar_x, bar_y), (bar_x + bar_width, bar_y + bar_height),
+                          (100, 100, 100), -1)
+            cv2.rectangle(layer, (bar_x, bar_y), (bar_x + ear_fill, bar_y + bar_height),
+                          ear_color, -1)
+            # Seuil EAR
+            cv2.line(layer, (threshold_x, bar_y), (threshold_x, bar_y + bar_height),
+                     (255, 255, 255), 2)
+
+        self.update('ear', (f"{ear:.3f}", ear_color, ear_fill, threshold_x), draw_ear)
+
+        eyes = results['eyes_detected']
+        self.update('eyes', eyes, lambda layer: cv2.putText(
+            layer, f"Yeux détectés: {eyes}", (10, 110),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1))
+
+        blinks = results['blink_count']
+        self.update('blinks', blinks, lambda layer: cv2.putText(
+            layer, f"Clignements: {blinks}", (10, 130),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1))
+
+        # FPS
+        fps_key = None
+        if CONFIG['SHOW_FPS']:
+            fps_color = (0, 255, 0) if fps > 20 else (0, 165, 255) if fps > 10 else (0, 0, 255)
+            fps_key = (f"{fps:.1f}", fps_color)
+        self.update('fps', fps_key, lambda layer: cv2.putText(
+            layer, f"FPS: {fps_key[0]}", (self.width - 100, 60),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.6, fps_key[1], 1))
+
+        # Alarme, avec LED clignotante
+        alarm_key = None
+        if alarm_active:
+            alarm_key = int(time.time() * 3) % 2 == 0
+
+        def draw_alarm(layer):
+            if alarm_key:
+                cv2.circle(layer, (self.width - 40, 30), 12, (0, 0, 255), -1)
+            cv2.putText(layer, "ALARME!", (self.width - 100, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        self.update('alarm', alarm_key, draw_alarm)
+
+    def compose(self, frame, fps, status, results, alarm_active):
+        """Dessiner l'interface sur `frame` (sur place)"""
+        self.draw_dynamic(fps, status, results, alarm_active)
+
+        # Panneau supérieur : assombri sur place (zone seule), puis calque
+        panel = frame[:self.PANEL_HEIGHT]
+        cv2.convertScaleAbs(panel, dst=panel, alpha=0.3)
+        cv2.copyTo(self.layer, self.mask, panel)
+
+        legend = frame[self.legend_y:]
+        cv2.copyTo(self.legend, self.legend_mask, legend)
+
+
+_UI_COMPOSITORS = {}
+
+
+def draw_advanced_ui(frame, fps, status, results, alarm_active):
+    """Interface avancée (compositeur mis en cache par taille d'image)"""
+    height, width = frame.shape[:2]
+    compositor = _UI_COMPOSITORS.get((width, height))
+    if compositor is None:
+        compositor = _UI_COMPOSITORS[(width, height)] = UICompositor(width, height)
+    compositor.compose(frame, fps, status, results, alarm_active)
 
 
 # ============================================
@@ -510,18 +2554,66 @@ def main():
     print("SYSTEME DE DETECTION DE SOMMOLENCE")
     print("=" * 60)
 
-    # Initialisation
-    detector = AdvancedDrowsinessDetector()
+    # Initialisation (chaque étape est chronométrée)
+    main_start = time.perf_counter()
+    step_start = main_start
+
+    def startup_step(name):
+        nonlocal step_start
+        now = time.perf_counter()
+        STARTUP_TIMINGS[name] = (now - step_start) * 1000
+        step_start = now
+
+    detector = create_detector()
+    startup_step('detector')
+
+    if CONFIG['CALIBRATION_PROFILES']:
+        detector.profiles = CalibrationProfiles()
+        subject = CONFIG['SUBJECT_ID'] or 'camera-0'
+        if detector.load_profile(subject):
+            print(f"👤 Profil {subject}: EAR référence {detector.state.ear_reference:.3f} "
+                  f"({detector.state.calibration.count} mesures)")
+        startup_step('profiles')
+
+    # Chauffe des modèles en arrière-plan pendant l'ouverture de la caméra
+    warm_up = threading.Thread(target=detector.warm_up, name="warm-up", daemon=True)
+    warm_up.start()
 
     cap = init_camera()
     if cap is None:
         return
+    startup_step('camera')
 
     alarm_sound = init_audio()
+    startup_step('audio')
     logger = DataLogger()
+    startup_step('logger')
+
+    warm_up.join()
+    startup_step('warmup_wait')
+
+    # Bus d'événements : son, console, journal et webhook hors de la boucle
+    events = EventBus()
+    events.subscribe('audio', audio_handler(alarm_sound), types=('alarm_start', 'alarm_stop'))
+    events.subscribe('console', console_handler,
+                     types=('alarm_start', 'alarm_stop', 'calibration_done'))
+    events.subscribe('logger', logger_handler(logger), types=('frame',), maxsize=4096)
+    if CONFIG['WEBHOOK_URL']:
+        events.subscribe('webhook', webhook_handler(CONFIG['WEBHOOK_URL']),
+                         types=WEBHOOK_EVENTS, maxsize=64, policy='drop_newest')
+    detector.events = events
+
+    # Contrôle adaptatif de la latence (désactivé si LATENCY_BUDGET_MS vaut 0)
+    controller = LatencyController() if CONFIG['LATENCY_BUDGET_MS'] > 0 else None
+
+    # Métriques (aucun coût si METRICS_PORT vaut 0)
+    metrics = DetectionMetrics(enabled=bool(CONFIG['METRICS_PORT']))
+    if metrics.enabled:
+        metrics.serve()
 
     # Variables
     prev_time = time.time()
+    last_display = 0.0
     alarm_active = False
     alarm_start_time = None
     frame_count = 0
@@ -541,27 +2633,65 @@ def main():
     print("=" * 60)
 
     print("\n🚀 Démarrage... Gardez les yeux ouverts face à la caméra")
-    print("Le système se calibre automatiquement sur 30 frames")
+    if detector.state.calibrated:
+        print("Calibration reprise du profil enregistré")
+    else:
+        print("Le système se calibre automatiquement sur 30 frames")
+
+    # Enregistrement des frames exactes vues par le détecteur
+    recorder = None
+    if CONFIG['RECORD_PATH']:
+        from framestore import FrameRecorder
+        recorder = FrameRecorder(CONFIG['RECORD_PATH'])
+        print(f"💾 Enregistrement: {CONFIG['RECORD_PATH']}")
+
+    # Pipeline multi-thread (capture / détection / affichage)
+    runner = None
+    pool = BufferPool()
+    reader = FrameReader(cap, pool)
+    metrics.add_collector(lambda: {'buffer_allocations_total':
+                                   pool.allocations + detector.preprocessor.allocations})
+    if CONFIG['THREADED_PIPELINE']:
+        runner = PipelineRunner(cap, detector, recorder=recorder, pool=pool)
+        if controller is not None:
+            # Réglages appliqués par le thread de détection, entre deux frames
+            controller.apply = runner.configure
+        runner.start()
+        metrics.add_collector(lambda: {'dropped_frames_total': sum(
+            stats['dropped'] for stats in runner.stats().values())})
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("❌ Erreur de lecture de la caméra")
-            break
+        if runner is not None:
+            item = runner.get_result(timeout=1.0)
+            if item is None:
+                if runner.finished:
+                    if runner.detect_error is None:
+                        print("❌ Erreur de lecture de la caméra")
+                    break
+                continue
+            frame, results = item
+        else:
+            ret, frame = reader.read()
+            if not ret:
+                print("❌ Erreur de lecture de la caméra")
+                break
+
+            # Détection
+            timestamp = time.time()
+            if recorder is not None:
+                recorder.write(frame, timestamp)
+            results = detector.detect(frame, timestamp)
 
         frame_count += 1
+        if frame_count == 1:
+            STARTUP_TIMINGS['first_frame'] = (time.perf_counter() - main_start) * 1000
+            print_startup_timings()
 
         # FPS
         current_time = time.time()
-        fps = 1.0 / (current_time - prev_time)
+        fps = 1.0 / max(current_time - prev_time, 1e-6)
         prev_time = current_time
 
-        # Miroir pour effet naturel
-        frame = cv2.flip(frame, 1)
-
-        # Détection
-        results = detector.detect(frame)
-
         # Statut
         status = "VIGILANT"
         if not results['face_detected']:
@@ -573,44 +2703,58 @@ def main():
         elif results['eyes_detected'] == 0:
             status = "YEUX NON DETECTES"
 
-        # Alarme
-        if results['is_drowsy'] and detector.alarm_triggered:
+        # Alarme (son et messages traités par les abonnés du bus)
+        if results['is_drowsy'] and results['alarm_triggered']:
             if not alarm_active and CONFIG['ENABLE_BEEP']:
-                alarm_sound.play(loops=-1)
                 alarm_active = True
+                metrics.inc('alarms_total')
                 alarm_start_time = current_time
-                print(f"\n🚨 ALARME ACTIVÉE! Yeux fermés depuis {detector.eye_counter} frames")
-                print(f"   EAR: {results['ear']:.3f} (seuil: {CONFIG['EYE_AR_THRESHOLD']:.3f})")
+                events.publish(Event('alarm_start', current_time, {
+                    'eye_counter': results['eye_counter'],
+                    'ear': float(results['ear']),
+                    'threshold': CONFIG['EYE_AR_THRESHOLD'],
+                }))
 
         # Arrêt alarme
         if alarm_active:
             if (current_time - alarm_start_time >= CONFIG['ALARM_DURATION'] or
                     not results['is_drowsy']):
-                alarm_sound.stop()
                 alarm_active = False
-                print("🔇 Alarme arrêtée")
+                events.publish(Event('alarm_stop', current_time))
 
         # Logging
-        logger.log(results['ear'], results['eye_state'],
-                   results['eyes_detected'], results['is_drowsy'],
-                   results['blink_count'])
-
-        # Interface
-        draw_advanced_ui(frame, fps, status, results, alarm_active)
-
-        # Affichage
-        cv2.imshow('Detection de Somnolence - Q pour quitter', frame)
+        events.publish(Event('frame', current_time, results))
+
+        # Interface (dessin séparé de l'analyse), à la cadence DISPLAY_FPS
+        t0 = time.perf_counter()
+        display = (not CONFIG['DISPLAY_FPS'] or
+                   current_time - last_display >= 1.0 / CONFIG['DISPLAY_FPS'])
+        if display:
+            last_display = current_time
+            draw_detections(frame, results)
+            draw_advanced_ui(frame, fps, status, results, alarm_active)
+        results['timings']['render'] = (time.perf_counter() - t0) * 1000
+        metrics.observe(results, fps)
+        if controller is not None:
+            controller.update(frame_latency_ms(results['timings']), current_time)
+
+        # Affichage (imshow copie l'image : le tampon peut être rendu au pool)
+        if display:
+            cv2.imshow('Detection de Somnolence - Q pour quitter', frame)
+        reader.release(frame)
 
         # Commandes
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
             break
         elif key == ord('r'):
-            alarm_sound.stop()
+            events.publish(Event('alarm_stop', time.time()))
             alarm_active = False
-            detector.eye_counter = 0
-            detector.alarm_triggered = False
-            detector.drowsy_start_time = None
+            # Pipeline en threads : l'état n'est modifié que par le thread de détection
+            if runner is not None:
+                runner.reset_alarm()
+            else:
+                detector.reset_alarm()
             print("\n🔄 Système réinitialisé")
         elif key == ord('s'):
             CONFIG['ENABLE_BEEP'] = not CONFIG['ENABLE_BEEP']
@@ -628,25 +2772,46 @@ def main():
             print(f"   EAR actuel: {results['ear']:.3f}")
             print(f"   État yeux: {results['eye_state']}")
             print(f"   Yeux détectés: {results['eyes_detected']}")
-            print(f"   Compteur: {detector.eye_counter}/{CONFIG['EYE_AR_CONSEC_FRAMES']}")
-            print(f"   Calibré: {'OUI' if detector.calibrated else 'NON'}")
-            if detector.calibrated:
-                print(f"   EAR référence: {detector.ear_reference:.3f}")
+            print(f"   Compteur: {detector.state.eye_counter}/{CONFIG['EYE_AR_CONSEC_FRAMES']}")
+            print(f"   Calibré: {'OUI' if detector.state.calibrated else 'NON'}")
+            if detector.state.calibrated:
+                print(f"   EAR référence: {detector.state.ear_reference:.3f}")
             else:
-                print(f"   Calibration: {detector.calibration_frames}/30 frames")
+                print(f"   Calibration: {detector.state.calibration_frames}/30 frames")
+            print(f"   PERCLOS: {results['perclos']:.1%} | Clignements/min: {results['blink_rate']:.1f} "
+                  f"| Durée moyenne: {results['blink_duration'] * 1000:.0f} ms")
+            timings = ", ".join(f"{k}={v:.1f}ms" for k, v in results['timings'].items())
+            print(f"   Temps par étape: {timings}")
+            if runner is not None:
+                print_pipeline_stats(runner)
+            allocations = allocation_stats(pool, detector)
+            print(f"   Tampons: {allocations['allocations']} alloués, "
+                  f"{allocations['reuses']} réutilisés, prétraitement {allocations['preprocessing']}")
+            for name, stats in events.stats().items():
+                print(f"   Abonné {name}: {stats['delivered']} livrés, "
+                      f"{stats['dropped']} perdus, {stats['errors']} erreurs")
 
     # Nettoyage
+    if runner is not None:
+        runner.stop()
+    detector.save_profile()
+    events.close()
+    logger.close()
+    metrics.close()
+    if recorder is not None:
+        recorder.close()
     cap.release()
     cv2.destroyAllWindows()
-    alarm_sound.stop()
-    pygame.mixer.quit()
+    close_audio(alarm_sound)
 
     print(f"\n✅ Programme terminé")
     print(f"📊 Statistiques:")
     print(f"   Frames totales: {frame_count}")
-    print(f"   Clignements détectés: {detector.blink_counter}")
+    print(f"   Clignements détectés: {detector.state.blink_counter}")
     print(f"   Seuil EAR final: {CONFIG['EYE_AR_THRESHOLD']:.3f}")
-    print(f"   Calibration: {'Terminée' if detector.calibrated else 'Non terminée'}")
+    print(f"   Calibration: {'Terminée' if detector.state.calibrated else 'Non terminée'}")
+    if runner is not None:
+        print_pipeline_stats(runner)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+
+import cv2
+import numpy as np
+
+# ============================================
+# FORMAT DU CONTENEUR
+# ============================================
+# En-tête fixe suivi d'enregistrements de taille fixe :
+#   [horodatage float64][frame brute uint8 hauteur x largeur x canaux]
+# Les frames se relisent sans copie via np.memmap.
+MAGIC = b'DRWSFRM1'
+HEADER = struct.Struct('<8sIIIQ')  # magic, largeur, hauteur, canaux, nombre de frames
+HEADER_SIZE = 64
+
+
+def record_dtype(width, height, channels):
+    """Type numpy d'un enregistrement (horodatage + frame)"""
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    return np.dtype([('timestamp', '<f8'), ('frame', 'u1', shape)])
+
+
+class FrameRecorder:
+    """Enregistre les frames vues par le détecteur, avec leur horodatage"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.dtype = None
+        self.count = 0
+
+    def _open(self, frame):
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        self.shape = frame.shape
+        self.dtype = record_dtype(width, height, channels)
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, width, height, channels, 0).ljust(HEADER_SIZE, b'\0'))
+        self.record = np.zeros(1, dtype=self.dtype)
+
+    def write(self, frame, timestamp):
+        """Ajouter une frame (écriture séquentielle, aucune compression)"""
+        if self.file is None:
+            self._open(frame)
+        elif frame.shape != self.shape:
+            raise ValueError(f"Taille de frame {frame.shape} différente de {self.shape}")
+
+        self.record['timestamp'] = timestamp
+        self.record['frame'][0] = frame
+        self.file.write(self.record.tobytes())
+        self.count += 1
+
+    def close(self):
+        """Écrire le nombre de frames dans l'en-tête et fermer"""
+        if self.file is None:
+            return
+        height, width = self.shape[:2]
+        channels = self.shape[2] if len(self.shape) == 3 else 1
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, width, height, channels, self.count))
+        self.file.close()
+        self.file = None
+
+
+class FrameReplay:
+    """Relecture d'un enregistrement : frames en lecture seule, sans copie
+
+    Compatible avec l'interface de cv2.VideoCapture utilisée par le programme
+    (read / isOpened / release), en plus de l'itération (timestamp, frame).
+    """
+
+    def __init__(self, path, realtime=False):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path}: fichier vide ou en-tête tronqué")
+        magic, width, height, channels, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} n'est pas un enregistrement de frames")
+
+        self.dtype = record_dtype(width, height, channels)
+        available = max(0, os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+        if available == 0:
+            raise ValueError(f"{path}: aucune frame complète")
+        # Un enregistrement interrompu a un en-tête à 0 : se fier à la taille du fichier
+        self.count = min(count, available) if count else available
+        self.records = np.memmap(path, dtype=self.dtype, mode='r',
+                                 offset=HEADER_SIZE, shape=(self.count,))
+        # Vues par champ : frames[i] est une vue sur le fichier, sans copie
+        self.frames = self.records['frame']
+        self.timestamps = self.records['timestamp']
+        self.width, self.height = width, height
+        self.realtime = realtime
+        self.position = 0
+        self.clock_start = None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return float(self.timestamps[index]), self.frames[index]
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def isOpened(self):
+        return self.records is not None
+
+    def read(self, image=None):
+        """Frame suivante (ret, frame), au rythme d'origine si realtime
+
+        Comme cv2.VideoCapture.read, `image` (même forme) reçoit une copie ;
+        sinon la frame est une vue en lecture seule sur le fichier.
+        """
+        if self.records is None or self.position >= self.count:
+            return False, None
+        timestamp, frame = self[self.position]
+
+        if self.realtime:
+            offset = timestamp - float(self.timestamps[0])
+            if self.clock_start is None:
+                self.clock_start = time.perf_counter() - offset
+            delay = offset - (time.perf_counter() - self.clock_start)
+            if delay > 0:
+                time.sleep(delay)
+
+        self.position += 1
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def timestamp(self, index=None):
+        index = self.position - 1 if index is None else index
+        return float(self.timestamps[index])
+
+    def release(self):
+        self.records = self.frames = self.timestamps = None
+
+
+# ============================================
+# RELECTURE DANS LE DÉTECTEUR
+# ============================================
+
+def stable_results(results):
+    """Résultats sans les champs non déterministes (temps mesurés)"""
+    return {k: (float(v) if isinstance(v, np.floating) else v)
+            for k, v in results.items() if k != 'timings'}
+
+
+def replay_session(path, realtime=False, output=None):
+    """Rejouer un enregistrement dans le détecteur ; retourne (frames, empreinte, fps)"""
+    from eyesdetecv1 import AdvancedDrowsinessDetector
+
+    replay = FrameReplay(path, realtime=realtime)
+    detector = AdvancedDrowsinessDetector()
+    digest = hashlib.sha1()
+    out = open(output, 'w', encoding='utf-8') if output else None
+
+    start = time.perf_counter()
+    try:
+        while True:
+            ret, frame = replay.read()
+            if not ret:
+                break
+            # L'horodatage enregistré rend la logique temporelle reproductible
+            results = stable_results(detector.detect(frame, timestamp=replay.timestamp()))
+            line = json.dumps(results, sort_keys=True, default=str)
+            digest.update(line.encode('utf-8'))
+            if out is not None:
+                out.write(line + "\n")
+    finally:
+        if out is not None:
+            out.close()
+        replay.release()
+
+    elapsed = time.perf_counter() - start
+    return replay.count, digest.hexdigest(), replay.count / elapsed if elapsed > 0 else 0.0
+
+
+def record_session(source, path, seconds=None, frames=None):
+    """Enregistrer une caméra ou une vidéo dans un conteneur de frames
+
+    Les frames sont enregistrées en miroir, comme celles que le programme
+    principal analyse (et enregistre avec RECORD_PATH) : une session se
+    rejoue à l'identique quelle que soit sa provenance.
+    """
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    recorder = FrameRecorder(path)
+    start = time.time()
+    try:
+        while cap.isOpened():
+            if seconds is not None and time.time() - start >= seconds:
+                break
+            if frames is not None and recorder.count >= frames:
+                break
+            ret, frame = cap.read()
+            if not ret:
+                break
+            recorder.write(cv2.flip(frame, 1), time.time())
+    finally:
+        cap.release()
+        recorder.close()
+    return recorder.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enregistrement et relecture de sessions caméra")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    rec = sub.add_parser('record', help="enregistrer une caméra ou une vidéo")
+    rec.add_argument('source', help="index de caméra ou fichier vidéo")
+    rec.add_argument('path', help="fichier d'enregistrement")
+    rec.add_argument('--seconds', type=float, default=None)
+    rec.add_argument('--frames', type=int, default=None)
+
+    play = sub.add_parser('replay', help="rejouer un enregistrement dans le détecteur")
+    play.add_argument('path', help="fichier d'enregistrement")
+    play.add_argument('--realtime', action='store_true', help="respecter la cadence d'origine")
+    play.add_argument('--output', default=None, help="résultats par frame (JSON lines)")
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        count = record_session(args.source, args.path, args.seconds, args.frames)
+        print(f"💾 {count} frames enregistrées dans {args.path}")
+    else:
+        count, digest, fps = replay_session(args.path, args.realtime, args.output)
+        print(f"▶️  {count} frames rejouées à {fps:.1f} FPS")
+        print(f"   Empreinte des résultats: {digest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,593 @@
+import argparse
+import base64
+import hashlib
+import json
+import math
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from eyesdetecv1 import (CONFIG, AdvancedDrowsinessDetector, CalibrationProfiles, DetectionModels,
+                         RingBuffer, SubjectState)
+
+# ============================================
+# CONFIGURATION DU SERVEUR
+# ============================================
+SERVER_CONFIG = {
+    'HOST': '0.0.0.0',
+    'PORT': 8765,
+    'DECODE_WORKERS': 4,  # Threads de décodage JPEG (cv2.imdecode libère le GIL)
+    'DETECT_WORKERS': 4,  # Threads de détection (les cascades libèrent le GIL)
+    'BATCH_SIZE': 32,  # Frames regroupées par tour du planificateur
+    'BATCH_WAIT_MS': 2.0,  # Attente max pour compléter un lot
+    'MAX_SESSIONS': 500,  # Au-delà, nouvelles sessions refusées (503)
+    'MAX_PENDING': 256,  # Frames en cours toutes sessions confondues (503 au-delà)
+    'SESSION_MAX_INFLIGHT': 2,  # Frames en cours par session (la plus ancienne est abandonnée)
+    'SESSION_TIMEOUT': 60.0,  # Session inactive évincée après N secondes
+    'MAX_PARKED': 10000,  # États sérialisés gardés pour les sessions évincées
+    'REQUEST_TIMEOUT': 5.0,  # Attente max d'un résultat en HTTP
+    'LATENCY_WINDOW': 256,  # Latences gardées par session pour les statistiques
+    'MAX_FRAME_BYTES': 4 * 1024 * 1024,  # Taille max d'une frame JPEG (413 / WebSocket 1009)
+}
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def to_json(value):
+    """Conversion des types numpy pour json.dumps"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class ServerBusy(Exception):
+    """Admission refusée : serveur saturé"""
+
+
+# ============================================
+# SESSIONS
+# ============================================
+
+class FrameJob:
+    """Une frame reçue, avec ses horodatages pour la comptabilité de latence"""
+
+    __slots__ = ('session', 'seq', 'data', 'timestamp', 'frame', 'future',
+                 'received', 'decoded', 'started')
+
+    def __init__(self, session, seq, data, timestamp):
+        self.session = session
+        self.seq = seq
+        self.data = data
+        self.timestamp = timestamp
+        self.frame = None
+        self.future = Future()
+        self.received = time.perf_counter()
+        self.decoded = None
+        self.started = None
+
+
+class Session:
+    """État d'un client : état de suivi compact, ordre des frames et latences
+
+    Les modèles et les détecteurs sont partagés : une session ne coûte que
+    son SubjectState et ses compteurs.
+    """
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.state = SubjectState()
+        # Une seule frame d'une session analysée à la fois, dans l'ordre
+        self.lock = threading.Lock()
+        self.next_seq = 0
+        self.last_seq = -1
+        self.inflight = 0
+        self.frames = 0
+        self.dropped = 0
+        self.errors = 0
+        self.created = self.last_seen = time.time()
+        window = SERVER_CONFIG['LATENCY_WINDOW']
+        self.latency = {stage: RingBuffer(window) for stage in ('decode', 'queue', 'detect', 'total')}
+
+    def stats(self):
+        stats = {
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'inflight': self.inflight,
+            'idle_s': time.time() - self.last_seen,
+        }
+        for stage, ring in self.latency.items():
+            stats[f"{stage}_ms"] = ring.mean()
+        total = self.latency['total']
+        stats['total_p95_ms'] = (float(np.percentile(total.values[:total.count], 95))
+                                 if total.count else 0.0)
+        return stats
+
+
+# ============================================
+# MOTEUR : DÉCODAGE, LOTS, DÉTECTION
+# ============================================
+
+class IngestionServer:
+    """Décodage en pool, regroupement par lots entre sessions et détection en pool
+
+    submit() retourne un Future résolu avec le dict de résultats de detect()
+    et la latence de chaque étape (décodage, attente, détection, total).
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(SERVER_CONFIG, **(config or {}))
+        self.sessions = {}
+        # États des sessions évincées (octets), repris si le client revient
+        self.parked = {}
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_frames = 0
+        self.decode_pool = ThreadPoolExecutor(self.config['DECODE_WORKERS'],
+                                              thread_name_prefix='decode')
+        self.detect_pool = ThreadPoolExecutor(self.config['DETECT_WORKERS'],
+                                              thread_name_prefix='detect')
+        # Modèles communs et un détecteur par thread de détection
+        self.models = DetectionModels.shared()
+        # Profils de calibration : la session reprend la calibration de son identifiant
+        self.profiles = CalibrationProfiles() if CONFIG['CALIBRATION_PROFILES'] else None
+        self.local = threading.local()
+        self.ready = queue.Queue()
+        self.running = True
+        self.scheduler = threading.Thread(target=self._schedule, name='scheduler', daemon=True)
+        self.scheduler.start()
+
+    # --- Admission ---
+
+    def session(self, session_id):
+        """Session existante ou nouvelle, dans la limite de MAX_SESSIONS"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                if len(self.sessions) >= self.config['MAX_SESSIONS']:
+                    self.rejected += 1
+                    raise ServerBusy(f"{len(self.sessions)} sessions actives")
+                session = self.sessions[session_id] = Session(session_id)
+                parked = self.parked.pop(session_id, None)
+                if parked is not None:
+                    session.state = SubjectState.from_bytes(parked)
+                elif self.profiles is not None:
+                    session.state.apply_profile(session_id, self.profiles.load(session_id))
+            session.last_seen = time.time()
+            return session
+
+    def close_session(self, session_id):
+        with self.lock:
+            self.parked.pop(session_id, None)
+            return self.sessions.pop(session_id, None) is not None
+
+    def submit(self, session_id, data, timestamp=None):
+        """Accepter une frame JPEG ; lève ServerBusy si le serveur est saturé"""
+        session = self.session(session_id)
+        with self.lock:
+            if self.pending >= self.config['MAX_PENDING']:
+                self.rejected += 1
+                raise ServerBusy(f"{self.pending} frames en attente")
+            self.pending += 1
+            self.accepted += 1
+            job = FrameJob(session, session.next_seq, data,
+                           time.time() if timestamp is None else timestamp)
+            session.next_seq += 1
+            session.inflight += 1
+
+        self.decode_pool.submit(self._decode, job)
+        return job.future
+
+    # --- Étapes ---
+
+    def _decode(self, job):
+        buffer = np.frombuffer(job.data, dtype=np.uint8)
+        job.frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+        job.data = None
+        job.decoded = time.perf_counter()
+        if job.frame is None:
+            self._finish(job, error="image illisible")
+            return
+        self.ready.put(job)
+
+    def _schedule(self):
+        """Regrouper les frames décodées et répartir les sessions sur le pool"""
+        batch_size = self.config['BATCH_SIZE']
+        wait = self.config['BATCH_WAIT_MS'] / 1000
+        last_eviction = time.time()
+
+        while self.running:
+            try:
+                batch = [self.ready.get(timeout=0.5)]
+            except queue.Empty:
+                batch = []
+            deadline = time.perf_counter() + wait
+            while batch and len(batch) < batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.ready.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if batch:
+                self.batches += 1
+                self.batched_frames += len(batch)
+                groups = {}
+                for job in batch:
+                    groups.setdefault(job.session.id, []).append(job)
+                for jobs in groups.values():
+                    self.detect_pool.submit(self._detect, sorted(jobs, key=lambda j: j.seq))
+
+            if time.time() - last_eviction >= 1.0:
+                self.evict_idle()
+                last_eviction = time.time()
+
+    def detector(self):
+        """Détecteur du thread courant (prétraitement et temps propres au thread)"""
+        detector = getattr(self.local, 'detector', None)
+        if detector is None:
+            detector = self.local.detector = AdvancedDrowsinessDetector(models=self.models)
+            detector.profiles = self.profiles
+        return detector
+
+    def _detect(self, jobs):
+        session = jobs[0].session
+        detector = self.detector()
+        with session.lock:
+            detector.state = session.state
+            # Seules les SESSION_MAX_INFLIGHT frames les plus récentes sont analysées
+            keep = self.config['SESSION_MAX_INFLIGHT']
+            for job in jobs[:-keep]:
+                session.dropped += 1
+                self._finish(job, dropped=True)
+            for job in jobs[-keep:]:
+                if job.seq < session.last_seq:
+                    # Dépassée par une frame plus récente du même client
+                    session.dropped += 1
+                    self._finish(job, dropped=True)
+                    continue
+                job.started = time.perf_counter()
+                try:
+                    results = detector.detect(job.frame, timestamp=job.timestamp)
+                except Exception as e:
+                    session.errors += 1
+                    self._finish(job, error=str(e))
+                    continue
+                session.last_seq = job.seq
+                session.frames += 1
+                self._finish(job, results=results)
+
+    def _finish(self, job, results=None, error=None, dropped=False):
+        now = time.perf_counter()
+        session = job.session
+        latency = {'total_ms': (now - job.received) * 1000}
+        if job.decoded is not None:
+            latency['decode_ms'] = (job.decoded - job.received) * 1000
+        if job.started is not None:
+            latency['queue_ms'] = (job.started - job.decoded) * 1000
+            latency['detect_ms'] = (now - job.started) * 1000
+            for stage in ('decode', 'queue', 'detect', 'total'):
+                session.latency[stage].push(latency[f"{stage}_ms"])
+
+        with self.lock:
+            self.pending -= 1
+            session.inflight -= 1
+        job.frame = None
+
+        response = {'session': session.id, 'seq': job.seq, 'latency': latency}
+        if error is not None:
+            response['error'] = error
+        elif dropped:
+            response['dropped'] = True
+        else:
+            response['results'] = results
+        job.future.set_result(response)
+
+    # --- Maintenance ---
+
+    def evict_idle(self):
+        """Évincer les sessions inactives depuis SESSION_TIMEOUT secondes
+
+        Leur état est gardé sérialisé : un client qui revient reprend sa
+        calibration et ses fenêtres temporelles.
+        """
+        limit = time.time() - self.config['SESSION_TIMEOUT']
+        with self.lock:
+            idle = [sid for sid, s in self.sessions.items()
+                    if s.last_seen < limit and not s.inflight]
+            for sid in idle:
+                self.parked[sid] = self.sessions.pop(sid).state.to_bytes()
+            while len(self.parked) > self.config['MAX_PARKED']:
+                del self.parked[next(iter(self.parked))]
+        return idle
+
+    def stats(self):
+        with self.lock:
+            sessions = dict(self.sessions)
+            stats = {
+                'sessions': len(sessions),
+                'parked': len(self.parked),
+                'pending': self.pending,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'batches': self.batches,
+                'mean_batch': self.batched_frames / self.batches if self.batches else 0.0,
+            }
+        stats['per_session'] = {sid: s.stats() for sid, s in sessions.items()}
+        return stats
+
+    def close(self):
+        self.running = False
+        self.scheduler.join(timeout=2.0)
+        self.decode_pool.shutdown(wait=False)
+        self.detect_pool.shutdown(wait=False)
+
+
+# ============================================
+# WEBSOCKET (RFC 6455, sans dépendance)
+# ============================================
+
+def websocket_accept(key):
+    return base64.b64encode(hashlib.sha1(key.encode('ascii') + WEBSOCKET_GUID).digest()).decode('ascii')
+
+
+class MessageTooBig(Exception):
+    """Message WebSocket au-delà de la taille autorisée"""
+
+
+def read_websocket_message(rfile, max_size=None):
+    """Message complet (opcode, données) ; gère fragments et masque client
+
+    Lève MessageTooBig avant de lire une trame qui porterait le message
+    au-delà de max_size octets.
+    """
+    opcode, chunks, total = None, [], 0
+    while True:
+        header = rfile.read(2)
+        if len(header) < 2:
+            return 0x8, b''
+        fin, frame_opcode = header[0] & 0x80, header[0] & 0x0F
+        masked, length = header[1] & 0x80, header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', rfile.read(8))[0]
+        total += length
+        if max_size is not None and total > max_size:
+            raise MessageTooBig(f"{total} octets (max {max_size})")
+        mask = rfile.read(4) if masked else None
+        payload = rfile.read(length)
+        if mask:
+            # Démasquage vectorisé (XOR par blocs de 4 octets)
+            data = np.frombuffer(payload, dtype=np.uint8)
+            key = np.resize(np.frombuffer(mask, dtype=np.uint8), data.size)
+            payload = (data ^ key).tobytes()
+
+        if frame_opcode >= 0x8:
+            # Trames de contrôle : jamais fragmentées, possibles entre deux fragments
+            return frame_opcode, payload
+        if frame_opcode:
+            opcode = frame_opcode
+        chunks.append(payload)
+        if fin:
+            return opcode, b''.join(chunks)
+
+
+def websocket_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('>BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+# ============================================
+# HTTP
+# ============================================
+
+def make_handler(server):
+    """Routes : POST /sessions/<id>/frame, GET /sessions/<id>/ws,
+    DELETE /sessions/<id>, GET /stats"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Connexions persistantes pour les clients HTTP
+
+        def route(self):
+            parts = [p for p in self.path.split('?')[0].split('/') if p]
+            return parts
+
+        def send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, default=to_json).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            parts = self.route()
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.close_connection = True
+                self.send_error(400)
+                return
+            if length > server.config['MAX_FRAME_BYTES']:
+                # Corps non lu : la connexion ne peut pas être réutilisée
+                self.close_connection = True
+                limit = server.config['MAX_FRAME_BYTES']
+                self.send_json(413, {'error': f"frame trop grande (max {limit} octets)"},
+                               {'Connection': 'close'})
+                return
+            data = self.rfile.read(length)
+            if len(parts) != 3 or parts[0] != 'sessions' or parts[2] != 'frame':
+                self.send_error(404)
+                return
+
+            timestamp = self.headers.get('X-Timestamp')
+            if timestamp:
+                try:
+                    timestamp = float(timestamp)
+                except ValueError:
+                    timestamp = math.nan
+                if not math.isfinite(timestamp):
+                    self.send_json(400, {'error': "en-tête X-Timestamp invalide"})
+                    return
+            else:
+                timestamp = None
+            try:
+                future = server.submit(parts[1], data, timestamp)
+            except ServerBusy as e:
+                self.send_json(503, {'error': f"serveur saturé: {e}"}, {'Retry-After': '1'})
+                return
+            try:
+                response = future.result(timeout=server.config['REQUEST_TIMEOUT'])
+            except Exception:
+                self.send_json(504, {'error': "délai dépassé"})
+                return
+            self.send_json(422 if 'error' in response else 200, response)
+
+        def do_GET(self):
+            parts = self.route()
+            if parts == ['stats']:
+                self.send_json(200, server.stats())
+            elif len(parts) == 3 and parts[0] == 'sessions' and parts[2] == 'ws':
+                self.websocket(parts[1])
+            else:
+                self.send_error(404)
+
+        def do_DELETE(self):
+            parts = self.route()
+            if len(parts) == 2 and parts[0] == 'sessions' and server.close_session(parts[1]):
+                self.send_json(200, {'closed': parts[1]})
+            else:
+                self.send_error(404)
+
+        def websocket(self, session_id):
+            """Messages binaires = frames JPEG ; chaque réponse est un message texte JSON"""
+            key = self.headers.get('Sec-WebSocket-Key')
+            if not key or self.headers.get('Upgrade', '').lower() != 'websocket':
+                self.send_error(400)
+                return
+            try:
+                server.session(session_id)
+            except ServerBusy as e:
+                self.send_json(503, {'error': f"serveur saturé: {e}"}, {'Retry-After': '1'})
+                return
+            self.send_response(101)
+            self.send_header('Upgrade', 'websocket')
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Sec-WebSocket-Accept', websocket_accept(key))
+            self.end_headers()
+            self.wfile.flush()
+
+            send_lock = threading.Lock()
+
+            def send(opcode, payload):
+                with send_lock:
+                    try:
+                        self.wfile.write(websocket_frame(opcode, payload))
+                        self.wfile.flush()
+                    except OSError:
+                        pass  # Client parti : la réponse est perdue
+
+            def reply(future):
+                send(0x1, json.dumps(future.result(), default=to_json).encode('utf-8'))
+
+            while True:
+                try:
+                    opcode, payload = read_websocket_message(self.rfile, server.config['MAX_FRAME_BYTES'])
+                except MessageTooBig:
+                    send(0x8, struct.pack('>H', 1009))  # 1009 : message trop grand
+                    break
+                if opcode == 0x8:
+                    send(0x8, payload[:2])
+                    break
+                if opcode == 0x9:
+                    send(0xA, payload)
+                    continue
+                if opcode != 0x2:
+                    continue
+                try:
+                    # Les réponses partent dès que prêtes : le client peut enchaîner les frames
+                    server.submit(session_id, payload).add_done_callback(reply)
+                except ServerBusy as e:
+                    send(0x1, json.dumps({'session': session_id,
+                                          'error': f"serveur saturé: {e}"}).encode('utf-8'))
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass  # Pas de log par requête
+
+    return Handler
+
+
+class IngestionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # File d'écoute assez longue pour des centaines de clients qui se connectent ensemble
+    request_queue_size = 1024
+
+
+def serve(config=None):
+    """Démarrer le serveur ; retourne (serveur HTTP, moteur d'ingestion)"""
+    engine = IngestionServer(config)
+    httpd = IngestionHTTPServer((engine.config['HOST'], engine.config['PORT']), make_handler(engine))
+    return httpd, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur d'ingestion de frames JPEG (HTTP / WebSocket)")
+    parser.add_argument('--host', default=SERVER_CONFIG['HOST'])
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['PORT'])
+    parser.add_argument('--decode-workers', type=int, default=SERVER_CONFIG['DECODE_WORKERS'])
+    parser.add_argument('--detect-workers', type=int, default=SERVER_CONFIG['DETECT_WORKERS'])
+    parser.add_argument('--max-sessions', type=int, default=SERVER_CONFIG['MAX_SESSIONS'])
+    parser.add_argument('--max-pending', type=int, default=SERVER_CONFIG['MAX_PENDING'])
+    args = parser.parse_args()
+
+    # Le parallélisme vient des pools de threads, pas des threads internes d'OpenCV
+    cv2.setNumThreads(1)
+    httpd, engine = serve({
+        'HOST': args.host,
+        'PORT': args.port,
+        'DECODE_WORKERS': args.decode_workers,
+        'DETECT_WORKERS': args.detect_workers,
+        'MAX_SESSIONS': args.max_sessions,
+        'MAX_PENDING': args.max_pending,
+    })
+    print(f"🌐 Serveur d'ingestion sur http://{args.host}:{args.port} "
+          f"({args.decode_workers} décodage, {args.detect_workers} détection)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        engine.close()
+        stats = engine.stats()
+        print(f"\n📊 {stats['accepted']} frames acceptées, {stats['rejected']} refusées, "
+              f"lot moyen {stats['mean_batch']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
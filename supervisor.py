@@ -0,0 +1,282 @@
+import argparse
+import multiprocessing as mp
+import queue
+import time
+
+import cv2
+
+from eyesdetecv1 import CONFIG, AdvancedDrowsinessDetector
+
+# ============================================
+# CONFIGURATION DU SUPERVISEUR
+# ============================================
+SUPERVISOR_CONFIG = {
+    'REPORT_INTERVAL': 2.0,  # Secondes entre deux rapports par flux
+    'RESULT_QUEUE_SIZE': 64,  # File bornée vers le parent (contre-pression)
+    'MAX_RESTARTS': 3,  # Redémarrages max d'un worker planté
+}
+
+
+# ============================================
+# CÔTÉ WORKER
+# ============================================
+
+def parse_source(text):
+    """Index de caméra si numérique, sinon chemin de fichier / URL"""
+    return int(text) if str(text).isdigit() else text
+
+
+def open_source(source, start_frame=0):
+    """Ouvrir une caméra ou une vidéo, en reprenant à start_frame si possible"""
+    cap = cv2.VideoCapture(source)
+    if isinstance(source, int):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, CONFIG['FRAME_WIDTH'])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CONFIG['FRAME_HEIGHT'])
+    elif start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    return cap
+
+
+class StreamState:
+    """État d'un flux : capture, détecteur dédié et compteurs agrégés
+
+    `resume` (dernier rapport avant un plantage) reporte les compteurs
+    cumulés : un worker redémarré repart d'un détecteur neuf sans rien
+    perdre des totaux. Les fichiers sont horodatés en temps média
+    (index / FPS), les caméras en temps réel.
+    """
+
+    def __init__(self, source, cap, resume=None):
+        resume = resume or {}
+        self.source = source
+        self.cap = cap
+        self.detector = AdvancedDrowsinessDetector()
+        self.fps = None if isinstance(source, int) else (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        self.frames = resume.get('frames', 0)
+        self.face_frames = resume.get('face_frames', 0)
+        self.drowsy_frames = resume.get('drowsy_frames', 0)
+        self.alarms = resume.get('alarms', 0)
+        self.blink_base = resume.get('blinks', 0)  # Clignements des exécutions précédentes
+        self.alarm_active = False
+        self.last_results = None
+        self.start_time = time.time()
+        self.processed = 0
+        self.report_time = self.start_time
+        self.report_frames = 0
+
+    def media_time(self):
+        """Horodatage de la prochaine frame (None : horloge murale pour une caméra)"""
+        if self.fps is None:
+            return None
+        # frames inclut les frames lues avant un redémarrage (reprise à start_frame)
+        return self.frames / self.fps
+
+    def update(self, results):
+        self.frames += 1
+        self.processed += 1
+        self.face_frames += int(results['face_detected'])
+        self.drowsy_frames += int(results['is_drowsy'])
+        if self.detector.state.alarm_triggered and not self.alarm_active:
+            self.alarms += 1
+        self.alarm_active = self.detector.state.alarm_triggered
+        self.last_results = results
+
+    def report(self, worker_id, kind='report'):
+        """Rapport périodique : FPS instantané et compteurs cumulés"""
+        now = time.time()
+        window_fps = (self.processed - self.report_frames) / max(now - self.report_time, 1e-6)
+        self.report_time = now
+        self.report_frames = self.processed
+
+        last = self.last_results or {}
+        return {
+            'type': kind,
+            'worker': worker_id,
+            'source': self.source,
+            'frames': self.frames,
+            'fps': window_fps,
+            'avg_fps': self.processed / max(now - self.start_time, 1e-6),
+            'face_frames': self.face_frames,
+            'drowsy_frames': self.drowsy_frames,
+            'blinks': self.blink_base + self.detector.state.blink_counter,
+            'alarms': self.alarms,
+            'eye_state': last.get('eye_state', 'INCONNU'),
+            'ear': float(last.get('ear', 0.0)),
+        }
+
+
+def worker_main(worker_id, sources, resume, result_queue, config):
+    """Boucle d'un processus worker : tourniquet sur ses flux
+
+    resume : dernier rapport reçu de chaque flux (après un redémarrage).
+    """
+    CONFIG.update(config)
+    # Un thread OpenCV par processus : la montée en charge vient des processus
+    cv2.setNumThreads(1)
+
+    streams = []
+    for source in sources:
+        last = resume.get(source, {})
+        cap = open_source(source, last.get('frames', 0))
+        if not cap.isOpened():
+            result_queue.put({'type': 'error', 'worker': worker_id, 'source': source,
+                              'error': "ouverture impossible"})
+            continue
+        streams.append(StreamState(source, cap, last))
+
+    while streams:
+        for stream in list(streams):
+            ret, frame = stream.cap.read()
+            if not ret:
+                # Fin du flux : rapport final
+                stream.cap.release()
+                streams.remove(stream)
+                result_queue.put(stream.report(worker_id, kind='done'))
+                continue
+
+            stream.update(stream.detector.detect(frame, timestamp=stream.media_time()))
+
+            if time.time() - stream.report_time >= SUPERVISOR_CONFIG['REPORT_INTERVAL']:
+                # put() bloquant sur une file bornée : le worker ralentit si le parent sature
+                result_queue.put(stream.report(worker_id))
+
+
+# ============================================
+# CÔTÉ PARENT
+# ============================================
+
+class StreamSupervisor:
+    """Répartit les sources sur des processus et agrège leurs rapports"""
+
+    def __init__(self, sources, workers=None, max_restarts=None):
+        self.sources = [parse_source(s) for s in sources]
+        if workers is None:
+            workers = mp.cpu_count()
+        self.workers = max(1, min(workers, len(self.sources)))
+        self.max_restarts = (SUPERVISOR_CONFIG['MAX_RESTARTS']
+                             if max_restarts is None else max_restarts)
+        self.result_queue = mp.Queue(SUPERVISOR_CONFIG['RESULT_QUEUE_SIZE'])
+        self.shards = [self.sources[i::self.workers] for i in range(self.workers)]
+        self.processes = {}
+        self.restarts = {i: 0 for i in range(self.workers)}
+        self.latest = {}
+        self.finished = set()
+        self.failed = set()
+
+    def _spawn(self, worker_id):
+        remaining = [s for s in self.shards[worker_id]
+                     if s not in self.finished and s not in self.failed]
+        # Compteurs repris du dernier rapport (les caméras ne sont pas repositionnées)
+        resume = {s: self.latest[s] for s in remaining if s in self.latest}
+        process = mp.Process(target=worker_main, name=f"worker-{worker_id}",
+                             args=(worker_id, remaining, resume,
+                                   self.result_queue, dict(CONFIG)),
+                             daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+
+    def _handle(self, message, on_report):
+        source = message['source']
+        if message['type'] == 'error':
+            self.failed.add(source)
+            print(f"❌ Flux {source}: {message['error']}")
+            return
+        self.latest[source] = message
+        if message['type'] == 'done':
+            self.finished.add(source)
+        if on_report is not None:
+            on_report(message)
+
+    def _check_workers(self):
+        """Redémarrer les workers plantés qui ont encore des flux actifs"""
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self.processes[worker_id]
+
+            remaining = [s for s in self.shards[worker_id]
+                         if s not in self.finished and s not in self.failed]
+            if process.exitcode == 0 or not remaining:
+                continue
+
+            if self.restarts[worker_id] < self.max_restarts:
+                self.restarts[worker_id] += 1
+                print(f"♻️  Worker {worker_id} planté (code {process.exitcode}), "
+                      f"redémarrage {self.restarts[worker_id]}/{self.max_restarts}")
+                self._spawn(worker_id)
+            else:
+                print(f"❌ Worker {worker_id} abandonné après {self.max_restarts} redémarrages")
+                self.failed.update(remaining)
+
+    def run(self, on_report=None):
+        """Lancer les workers et bloquer jusqu'à la fin de tous les flux"""
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+        try:
+            while self.processes:
+                try:
+                    self._handle(self.result_queue.get(timeout=0.5), on_report)
+                    continue
+                except queue.Empty:
+                    pass
+                self._check_workers()
+        finally:
+            for process in self.processes.values():
+                process.terminate()
+
+        # Vider les derniers messages
+        while True:
+            try:
+                self._handle(self.result_queue.get_nowait(), on_report)
+            except queue.Empty:
+                break
+
+        return self.summary()
+
+    def summary(self):
+        """Résultats agrégés par flux et totaux"""
+        streams = {source: self.latest.get(source) for source in self.sources}
+        return {
+            'streams': streams,
+            'total_frames': sum(r['frames'] for r in streams.values() if r),
+            'total_fps': sum(r['avg_fps'] for r in streams.values() if r),
+            'restarts': sum(self.restarts.values()),
+            'failed': sorted(map(str, self.failed)),
+        }
+
+
+def print_report(message):
+    print(f"📡 [{message['worker']}] {message['source']}: {message['fps']:.1f} FPS | "
+          f"frames={message['frames']} clignements={message['blinks']} "
+          f"somnolence={message['drowsy_frames']} état={message['eye_state']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Supervision multi-flux de la somnolence")
+    parser.add_argument('sources', nargs='+',
+                        help="index de caméra, fichier vidéo ou URL de flux")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="nombre de processus (défaut: nombre de cœurs)")
+    parser.add_argument('--quiet', action='store_true',
+                        help="n'afficher que le résumé final")
+    args = parser.parse_args()
+
+    supervisor = StreamSupervisor(args.sources, workers=args.workers)
+    print(f"🚀 {len(supervisor.sources)} flux sur {supervisor.workers} processus")
+    summary = supervisor.run(on_report=None if args.quiet else print_report)
+
+    print(f"\n📊 Résumé:")
+    for source, report in summary['streams'].items():
+        if report is None:
+            print(f"   {source}: aucun résultat")
+            continue
+        print(f"   {source}: {report['frames']} frames, {report['avg_fps']:.1f} FPS, "
+              f"{report['blinks']} clignements, {report['alarms']} alarmes")
+    print(f"   Total: {summary['total_frames']} frames, {summary['total_fps']:.1f} FPS cumulés, "
+          f"{summary['restarts']} redémarrages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+import argparse
+import ast
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+
+import cv2
+import numpy as np
+
+from batch import iter_video_frames
+from eyesdetecv1 import CONFIG, AdvancedDrowsinessDetector, StreamingMedian, SubjectState
+
+# ============================================
+# CONFIGURATION DU BALAYAGE
+# ============================================
+SWEEP_CONFIG = {
+    'CACHE_DIR': os.path.join(CONFIG['CACHE_DIR'], 'sweep'),
+    'CACHE_VERSION': 1,  # À incrémenter si la détection des yeux change
+    'LABEL_SUFFIX': '.labels.json',  # clip.mp4 -> clip.labels.json
+    'METRIC': 'f1',  # f1 | accuracy | precision | recall
+    'TOP': 10,  # Réglages affichés en plus du front de Pareto
+}
+
+# Réglages rejoués sur les détections en cache, sans relancer les cascades.
+# Les autres clés de la grille changent les détections : une passe vidéo par jeu.
+DOWNSTREAM_KEYS = ('EYE_AR_THRESHOLD', 'EYE_AR_CONSEC_FRAMES', 'EAR_BANDS', 'EAR_CLOSED')
+
+DEFAULT_GRID = {
+    'EYE_SCALE_FACTOR': [1.1, 1.2],
+    'EYE_MIN_NEIGHBORS': [3, 5, 7],
+    'EYE_ROI_TOP': [0.15, 0.2, 0.25],
+    'EYE_AR_THRESHOLD': [0.18, 0.19, 0.20, 0.21, 0.22, 0.23, 0.24],
+    'EYE_AR_CONSEC_FRAMES': [5, 10, 15, 20],
+    'EAR_BANDS': [
+        ((0.4, 0.35), (0.3, 0.28), (0.2, 0.22), (0.1, 0.18)),
+        ((0.45, 0.35), (0.35, 0.28), (0.25, 0.22), (0.15, 0.18)),
+    ],
+}
+
+# Réglages fixes pendant le balayage : rien sur disque, calibration repartant de zéro
+SWEEP_OVERRIDES = {'CALIBRATION_PROFILES': False, 'RECORD_PATH': None, 'EYE_BACKEND': 'haar'}
+
+
+def expand(grid, keys):
+    """Produit cartésien des valeurs de `grid` restreint à `keys`"""
+    names = [k for k in grid if k in keys]
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[k] for k in names))]
+
+
+# ============================================
+# DÉTECTIONS EN CACHE (UNE PASSE PAR JEU DE CASCADES)
+# ============================================
+
+def detection_config(upstream):
+    """CONFIG complet d'une passe de détection (parent, réglages fixes, jeu amont)
+
+    Passé explicitement aux workers : un processus lancé en 'spawn' repart
+    du CONFIG du module, sans les modifications faites dans le parent.
+    """
+    config = dict(CONFIG)
+    config.update(SWEEP_OVERRIDES)
+    config.update(upstream)
+    return config
+
+
+def cache_path(clip, config):
+    """Fichier .npz des détections d'un clip pour un CONFIG de détection
+
+    Toutes les clés hors DOWNSTREAM_KEYS entrent dans la clé : changer
+    FACE_BACKEND, FACE_TRACKING, MIN_FACE_SIZE... relance la passe vidéo.
+    """
+    stat = os.stat(clip)
+    upstream = sorted((k, v) for k, v in config.items() if k not in DOWNSTREAM_KEYS)
+    key = json.dumps([SWEEP_CONFIG['CACHE_VERSION'], os.path.abspath(clip), stat.st_size,
+                      stat.st_mtime, upstream], default=str)
+    return os.path.join(SWEEP_CONFIG['CACHE_DIR'], hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+
+def record_clip(clip, config, path):
+    """Analyser un clip et garder visage / rectangles des yeux de chaque frame"""
+    CONFIG.update(config)
+    cv2.setNumThreads(1)
+
+    cap = cv2.VideoCapture(clip)
+    if not cap.isOpened():
+        return {'clip': clip, 'error': "ouverture impossible"}
+
+    detector = AdvancedDrowsinessDetector()
+    timestamps, faces, counts, rects = [], [], [], []
+    cpu_start = time.process_time()
+    try:
+        for index, timestamp, frame in iter_video_frames(cap):
+            results = detector.detect(frame, timestamp=timestamp)
+            timestamps.append(timestamp)
+            faces.append(results['face_detected'])
+            counts.append(len(results['eyes']))
+            rects.extend(results['eyes'])
+    finally:
+        cap.release()
+    cpu = time.process_time() - cpu_start
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, timestamps=np.array(timestamps, dtype=np.float64),
+             faces=np.array(faces, dtype=bool), counts=np.array(counts, dtype=np.int32),
+             rects=np.array(rects, dtype=np.int32).reshape(-1, 4), cpu_seconds=cpu)
+    os.replace(tmp, path)
+    return {'clip': clip, 'frames': len(timestamps), 'cpu_seconds': cpu}
+
+
+def _record_job(job):
+    return record_clip(**job)
+
+
+# ============================================
+# ÉVALUATION VECTORISÉE (EN AVAL DES CASCADES)
+# ============================================
+
+def rect_ears(rects, bands, closed):
+    """EAR de chaque rectangle, comme calculate_ear_for_eye()"""
+    ew = rects[:, 2].astype(np.float64)
+    eh = rects[:, 3].astype(np.float64)
+    ratio = np.divide(eh, ew, out=np.zeros_like(eh), where=ew > 0)
+
+    # Première bande satisfaite : affecter de la dernière à la première
+    ear = np.full(len(rects), closed, dtype=np.float64)
+    for min_ratio, value in reversed(bands):
+        ear[ratio > min_ratio] = value
+    ear[(ew == 0) | (eh == 0)] = 0.25
+
+    size_factor = np.minimum(1.0, ew * eh / 400)
+    return np.clip(ear * (0.8 + 0.4 * size_factor), 0.15, 0.35)
+
+
+def calibrated_ears(cache, bands, closed):
+    """EAR (ajusté par la calibration) des frames avec visage, dans l'ordre
+
+    La calibration suit celle du détecteur : médiane en flux des EAR bruts
+    des CALIBRATION_SIZE premières frames avec yeux, puis référence figée.
+    Ne dépend que des bandes : calculé une fois par jeu de bandes.
+    """
+    counts = cache['counts']
+    frame_of_rect = np.repeat(np.arange(len(counts)), counts)
+    sums = np.bincount(frame_of_rect, weights=rect_ears(cache['rects'], bands, closed),
+                       minlength=len(counts))
+    with_eyes = counts > 0
+    raw = sums[with_eyes] / counts[with_eyes]
+
+    factors = np.ones(len(raw))
+    size = SubjectState.CALIBRATION_SIZE
+    if len(raw) >= size:
+        median = StreamingMedian()
+        for value in raw[:size]:
+            median.add(value)
+        factors[size - 1:] = median.value() / 0.28
+
+    # Sans yeux, l'EAR vaut 0.15 (non ajusté)
+    ear = np.full(len(counts), 0.15)
+    ear[with_eyes] = raw * factors
+    faces = cache['faces']
+    return ear[faces], counts[faces]
+
+
+def drowsy_frames(cache, ear, counts, threshold, consec):
+    """is_drowsy par frame pour un seuil et un nombre de frames consécutives"""
+    # Moyenne mobile sur les HISTORY_SIZE dernières frames avec visage
+    size = SubjectState.HISTORY_SIZE
+    total = np.cumsum(ear)
+    window = total.copy()
+    window[size:] -= total[:-size]
+    smoothed = window / np.minimum(np.arange(1, len(ear) + 1), size)
+
+    # Compteur de fermeture : position dans la série de frames fermées en cours
+    closed = (counts == 0) | (smoothed < threshold)
+    index = np.arange(len(closed))
+    last_open = np.maximum.accumulate(np.where(closed, -1, index))
+    counter = index - last_open
+
+    drowsy = np.zeros(len(cache['faces']), dtype=bool)
+    drowsy[cache['faces']] = counter >= consec
+    return drowsy
+
+
+def load_labels(clip, timestamps):
+    """Vérité terrain par frame depuis clip.labels.json ({"drowsy": [[début, fin], ...]})"""
+    path = os.path.splitext(clip)[0] + SWEEP_CONFIG['LABEL_SUFFIX']
+    with open(path, encoding='utf-8') as f:
+        intervals = sorted(json.load(f)['drowsy'])
+    truth = np.zeros(len(timestamps), dtype=bool)
+    for start, end in intervals:
+        truth[(timestamps >= start) & (timestamps < end)] = True
+    return truth
+
+
+def scores(tp, fp, fn, tn):
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'accuracy': (tp + tn) / (tp + fp + fn + tn) if tp + fp + fn + tn else 0.0,
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def evaluate_upstream(upstream, clips, downstream_sets, config):
+    """Scores de tous les réglages aval pour un jeu de cascades (détections en cache)"""
+    caches = []
+    frames = 0
+    cpu = 0.0
+    for clip in clips:
+        with np.load(cache_path(clip, config)) as data:
+            cache = {k: data[k] for k in data.files}
+        cache['truth'] = load_labels(clip, cache['timestamps'])
+        caches.append(cache)
+        frames += len(cache['timestamps'])
+        cpu += float(cache['cpu_seconds'])
+
+    memo = {}
+    results = []
+    for downstream in downstream_sets:
+        settings = dict(config, **downstream)
+        bands = tuple(tuple(b) for b in settings['EAR_BANDS'])
+        tp = fp = fn = tn = 0
+        for i, cache in enumerate(caches):
+            key = (i, bands, settings['EAR_CLOSED'])
+            if key not in memo:
+                memo[key] = calibrated_ears(cache, bands, settings['EAR_CLOSED'])
+            ear, counts = memo[key]
+            predicted = drowsy_frames(cache, ear, counts, settings['EYE_AR_THRESHOLD'],
+                                      settings['EYE_AR_CONSEC_FRAMES'])
+            truth = cache['truth']
+            tp += int(np.count_nonzero(predicted & truth))
+            fp += int(np.count_nonzero(predicted & ~truth))
+            fn += int(np.count_nonzero(~predicted & truth))
+            tn += int(np.count_nonzero(~predicted & ~truth))
+
+        result = {'params': dict(upstream, **downstream), 'frames': frames,
+                  'cpu_ms_per_frame': cpu * 1000 / frames if frames else 0.0}
+        result.update(scores(tp, fp, fn, tn))
+        results.append(result)
+    return results
+
+
+def _evaluate_job(job):
+    return evaluate_upstream(**job)
+
+
+def pareto_front(results, metric):
+    """Réglages qu'aucun autre ne bat à la fois en coût CPU et en score"""
+    front = []
+    best = -1.0
+    for result in sorted(results, key=lambda r: (r['cpu_ms_per_frame'], -r[metric])):
+        if result[metric] > best:
+            front.append(result)
+            best = result[metric]
+    return front
+
+
+# ============================================
+# BALAYAGE
+# ============================================
+
+def run_sweep(clips, grid, jobs=1):
+    upstream_sets = expand(grid, [k for k in grid if k not in DOWNSTREAM_KEYS])
+    downstream_sets = expand(grid, DOWNSTREAM_KEYS)
+
+    configs = [detection_config(upstream) for upstream in upstream_sets]
+
+    # 1. Détections manquantes : une passe vidéo par (clip, jeu de cascades)
+    work = [dict(clip=clip, config=config, path=cache_path(clip, config))
+            for config in configs for clip in clips]
+    missing = [job for job in work if not os.path.exists(job['path'])]
+    print(f"🔍 {len(upstream_sets)} jeux de cascades x {len(downstream_sets)} réglages aval, "
+          f"{len(clips)} clips ({len(work) - len(missing)} passes en cache, {len(missing)} à faire)")
+
+    failed = set()
+    if missing:
+        with mp.Pool(max(1, min(jobs, len(missing)))) as pool:
+            for done, summary in enumerate(pool.imap_unordered(_record_job, missing), 1):
+                if 'error' in summary:
+                    print(f"   ❌ {summary['clip']}: {summary['error']}")
+                    failed.add(summary['clip'])
+                    continue
+                print(f"   [{done}/{len(missing)}] {summary['clip']}: {summary['frames']} frames, "
+                      f"{summary['cpu_seconds']:.1f} s CPU")
+
+    clips = [clip for clip in clips if clip not in failed]
+    if not clips:
+        return []
+
+    # 2. Réglages aval rejoués sur les détections, un processus par jeu de cascades
+    evaluation = [dict(upstream=upstream, clips=clips, downstream_sets=downstream_sets,
+                       config=config)
+                  for upstream, config in zip(upstream_sets, configs)]
+    with mp.Pool(max(1, min(jobs, len(evaluation)))) as pool:
+        return [r for results in pool.imap(_evaluate_job, evaluation) for r in results]
+
+
+def parse_grid(text):
+    """KEY=[v1, v2, ...] -> (KEY, liste de valeurs Python)"""
+    key, _, value = text.partition('=')
+    if key not in CONFIG:
+        raise SystemExit(f"❌ Clé CONFIG inconnue: {key}")
+    try:
+        values = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        raise SystemExit(f"❌ Valeurs illisibles pour {key}: {value}")
+    return key, list(values) if isinstance(values, list) else [values]
+
+
+def describe(params, grid):
+    """Seules les clés qui varient dans la grille"""
+    return ', '.join(f"{k}={params[k]}" for k in grid if len(grid[k]) > 1)
+
+
+def print_results(title, results, grid, metric):
+    print(f"\n{title}")
+    print(f"   {'CPU ms/frame':>12}{metric:>10}{'exact.':>9}{'préc.':>8}{'rappel':>8}  réglages")
+    for r in results:
+        print(f"   {r['cpu_ms_per_frame']:>12.2f}{r[metric]:>10.3f}{r['accuracy']:>9.3f}"
+              f"{r['precision']:>8.3f}{r['recall']:>8.3f}  {describe(r['params'], grid)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Balayage des réglages du détecteur sur des clips annotés")
+    parser.add_argument('clips', nargs='+',
+                        help=f"vidéos, chacune avec son fichier *{SWEEP_CONFIG['LABEL_SUFFIX']}")
+    parser.add_argument('--grid', action='append', default=[],
+                        help="KEY=[v1, v2] remplace les valeurs de la grille par défaut")
+    parser.add_argument('--only', action='store_true',
+                        help="ne balayer que les clés passées par --grid")
+    parser.add_argument('--jobs', type=int, default=mp.cpu_count(), help="processus")
+    parser.add_argument('--metric', default=SWEEP_CONFIG['METRIC'],
+                        choices=['f1', 'accuracy', 'precision', 'recall'])
+    parser.add_argument('--output', default=None, help="écrire tous les résultats en JSON")
+    args = parser.parse_args()
+
+    overrides = dict(parse_grid(text) for text in args.grid)
+    grid = overrides if args.only else dict(DEFAULT_GRID, **overrides)
+
+    clips = []
+    for clip in args.clips:
+        labels = os.path.splitext(clip)[0] + SWEEP_CONFIG['LABEL_SUFFIX']
+        if os.path.exists(labels):
+            clips.append(clip)
+        else:
+            print(f"⚠️ {clip}: annotations absentes ({labels}), clip ignoré")
+    if not clips:
+        raise SystemExit("❌ Aucun clip annoté")
+
+    wall_start = time.perf_counter()
+    results = run_sweep(clips, grid, args.jobs)
+    if not results:
+        raise SystemExit("❌ Aucun clip analysé")
+    front = pareto_front(results, args.metric)
+
+    top = sorted(results, key=lambda r: (-r[args.metric], r['cpu_ms_per_frame']))
+    print_results(f"🏆 Meilleurs réglages ({args.metric})", top[:SWEEP_CONFIG['TOP']],
+                  grid, args.metric)
+    print_results("📈 Front de Pareto (coût CPU croissant)", front, grid, args.metric)
+    print(f"\n⚡ {len(results)} réglages évalués en {time.perf_counter() - wall_start:.1f} s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'grid': grid, 'metric': args.metric, 'results': results,
+                       'pareto': front}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
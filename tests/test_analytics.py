@@ -0,0 +1,71 @@
+import csv
+
+import numpy as np
+
+from analytics import ColumnStore
+from eyesdetecv1 import LOG_DTYPE, LOG_HEADER
+
+
+def write_rows(path, rows, header=False):
+    """Lignes au format DataLogger (AAAA-MM-JJ HH:MM:SS, ear, état, yeux, somnolent, clignements)"""
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(LOG_HEADER)
+        writer.writerows([f"2026-10-17 10:00:{second:02d}", f"{ear:.3f}", 'OUVERT', 2, False, blinks]
+                         for second, ear, blinks in rows)
+
+
+def test_reingest_only_reads_new_lines(tmp_path):
+    log = str(tmp_path / 'drowsiness_1.csv')
+    write_rows(log, [(0, 0.30, 0), (1, 0.31, 0), (2, 0.29, 1)], header=True)
+    store = ColumnStore(str(tmp_path / 'store'))
+    assert store.ingest(log, 'car-1') == 3
+    assert store.ingest(log, 'car-1') == 0
+
+    write_rows(log, [(3, 0.28, 1), (4, 0.27, 2)])
+    assert store.ingest(log, 'car-1') == 2
+    assert store.rows == 5
+
+    columns, starts = store.select()
+    assert list(columns['ear']) == list(np.float32([0.30, 0.31, 0.29, 0.28, 0.27]))
+    # Un morceau par ingestion : les agrégations ne relient pas deux morceaux
+    assert list(starts) == [True, False, False, True, False]
+
+
+def test_partial_line_waits_for_next_ingest(tmp_path):
+    log = str(tmp_path / 'drowsiness_1.csv')
+    write_rows(log, [(0, 0.30, 0)], header=True)
+    with open(log, 'a', encoding='utf-8') as f:
+        f.write("2026-10-17 10:00:01,0.3")  # Ligne en cours d'écriture
+    store = ColumnStore(str(tmp_path / 'store'))
+    assert store.ingest(log) == 1
+
+    with open(log, 'a', encoding='utf-8') as f:
+        f.write("10,OUVERT,2,False,0\r\n")
+    assert store.ingest(log) == 1
+    assert list(store.select()[0]['ear']) == list(np.float32([0.30, 0.31]))
+
+
+def test_reopened_store_resumes_and_drops_unindexed_tail(tmp_path):
+    log = str(tmp_path / 'drowsiness_1.bin')
+    records = np.zeros(4, dtype=LOG_DTYPE)
+    records['timestamp'] = 1000.0 + np.arange(4)
+    records['ear'] = [0.30, 0.31, 0.29, 0.28]
+    with open(log, 'wb') as f:
+        f.write(records[:2].tobytes() + records[2].tobytes()[:5])  # Dernier enregistrement incomplet
+
+    path = str(tmp_path / 'store')
+    assert ColumnStore(path).ingest(log, 'car-1') == 2
+
+    # Ingestion interrompue : colonnes écrites, index non enregistré
+    interrupted = ColumnStore(path)
+    interrupted.append({name: records[name][2:] for name in records.dtype.names}, 'car-1')
+
+    with open(log, 'wb') as f:
+        f.write(records.tobytes())
+    store = ColumnStore(path)
+    assert store.rows == 2
+    assert store.ingest(log, 'car-1') == 2
+    assert store.rows == 4
+    assert list(store.select(units=['car-1'])[0]['ear']) == list(records['ear'])
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+import eyesdetecv1
+from eyesdetecv1 import (PROFILE_DTYPE, AdvancedDrowsinessDetector, CalibrationProfiles,
+                         StreamingMedian, SubjectState, profile_key)
+
+
+def median_of(values):
+    median = StreamingMedian()
+    for value in values:
+        median.add(value)
+    return median
+
+
+def test_streaming_median_is_exact_for_few_values():
+    assert median_of([]).value() == 0.3
+    assert median_of([0.31, 0.27, 0.29]).value() == pytest.approx(0.29)
+    assert median_of([0.35, 0.21, 0.30, 0.28, 0.26]).value() == pytest.approx(0.28)
+
+
+@pytest.mark.parametrize('count, tolerance', [(30, 0.01), (1000, 0.005), (20000, 0.002)])
+def test_streaming_median_tracks_exact_median(count, tolerance):
+    # EAR ouverts avec 10 % de clignements (valeurs basses)
+    rng = np.random.default_rng(count)
+    values = np.where(rng.random(count) < 0.1, rng.uniform(0.12, 0.18, count),
+                      rng.normal(0.30, 0.02, count))
+    assert median_of(values).value() == pytest.approx(np.median(values), abs=tolerance)
+
+
+def test_profile_key_keeps_short_ids():
+    assert profile_key('camera-0') == b'camera-0'
+    assert profile_key('é' * 32) == ('é' * 32).encode('utf-8')
+
+
+def test_profile_key_hashes_long_ids_without_cutting_characters():
+    key = profile_key('é' * 35)  # 70 octets UTF-8
+    assert key.startswith(b'sha1:')
+    assert len(key) <= PROFILE_DTYPE['subject'].itemsize
+    assert key == profile_key('é' * 35)
+    assert key != profile_key('é' * 36)
+
+
+def test_profiles_round_trip_long_and_short_ids(tmp_path):
+    path = str(tmp_path / 'profiles.bin')
+    long_id = 'poste-' + 'é' * 40
+    profiles = CalibrationProfiles(path)
+    profiles.save(long_id, 0.29, median_of([0.29] * 40))
+    profiles.save('camera-0', 0.31, median_of([0.31] * 40))
+    profiles.save(long_id, 0.27, median_of([0.27] * 40))
+
+    reloaded = CalibrationProfiles(path)
+    assert len(reloaded) == 2
+    assert reloaded.load(long_id)[0] == pytest.approx(0.27)
+    assert reloaded.load('camera-0')[0] == pytest.approx(0.31)
+    assert reloaded.load('inconnu') is None
+
+
+class FakeEyes:
+    """Deux yeux dont la hauteur (donc l'EAR) est fixée par le test"""
+
+    name = 'fake'
+    provides_ear = False
+
+    def __init__(self):
+        self.height = 20
+
+    def detect(self, gray, min_size, max_size):
+        return [(10, 10, 40, self.height), (120, 10, 40, self.height)]
+
+
+def run_detector(detector, eyes, frames, height, start):
+    eyes.height = height
+    for k in range(start, start + frames):
+        detector.detect(np.zeros((480, 640, 3), dtype=np.uint8), timestamp=k / 30)
+    return start + frames
+
+
+def make_detector(monkeypatch, profiles=None):
+    monkeypatch.setitem(eyesdetecv1.CONFIG, 'EYE_PREDICTION', False)
+    monkeypatch.setitem(eyesdetecv1.CONFIG, 'PROFILE_SAVE_INTERVAL', 60)
+    monkeypatch.setitem(eyesdetecv1.CONFIG, 'CALIBRATION_PROFILES', profiles is not None)
+    detector = AdvancedDrowsinessDetector()
+    detector.locate_face = lambda prep: ((100, 100, 200, 200), False)
+    detector.eye_backend = eyes = FakeEyes()
+    if profiles is not None:
+        detector.profiles = profiles
+        detector.load_profile('sujet')
+    return detector, eyes
+
+
+def test_reference_is_frozen_after_initial_calibration(monkeypatch):
+    detector, eyes = make_detector(monkeypatch)
+    k = run_detector(detector, eyes, SubjectState.CALIBRATION_SIZE, 20, 0)
+    reference = detector.state.ear_reference
+    assert detector.state.calibrated
+
+    # Longue série d'yeux mi-clos : la référence de la session ne dérive pas
+    run_detector(detector, eyes, 400, 14, k)
+    assert detector.state.ear_reference == reference
+    assert detector.state.calibration.count == SubjectState.CALIBRATION_SIZE
+
+
+def test_profile_is_refined_without_moving_live_reference(monkeypatch, tmp_path):
+    profiles = CalibrationProfiles(str(tmp_path / 'profiles.bin'))
+    detector, eyes = make_detector(monkeypatch, profiles)
+    k = run_detector(detector, eyes, SubjectState.CALIBRATION_SIZE, 20, 0)
+    reference = detector.state.ear_reference
+    saved = profiles.load('sujet')[0]
+
+    run_detector(detector, eyes, 400, 14, k)
+    assert detector.state.ear_reference == reference
+    assert profiles.load('sujet')[0] < saved
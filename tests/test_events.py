@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pytest
+
+import eyesdetecv1
+from eyesdetecv1 import (AdvancedDrowsinessDetector, Event, EventBus, MultiFaceDetector,
+                         SubjectState, webhook_handler)
+
+
+@pytest.fixture
+def webhook_server():
+    """Serveur HTTP local qui remplace le vrai webhook et garde les requêtes reçues"""
+    received = []
+    status = {'code': 200}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            received.append((self.path, self.headers['Content-Type'], json.loads(body)))
+            self.send_response(status['code'])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+    yield url, received, status
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_webhook_posts_event_as_json(webhook_server):
+    url, received, _ = webhook_server
+    webhook_handler(url)(Event('alarm_start', 12.5, {'ear': 0.12, 'eye_counter': 14}))
+
+    assert received == [('/hook', 'application/json', {
+        'type': 'alarm_start', 'timestamp': 12.5, 'data': {'ear': 0.12, 'eye_counter': 14}})]
+
+
+def test_webhook_subscriber_only_receives_its_types(webhook_server):
+    url, received, _ = webhook_server
+    bus = EventBus()
+    subscription = bus.subscribe('webhook', webhook_handler(url), types=('alarm_start', 'alarm_stop'))
+    bus.publish(Event('frame', 1.0))
+    bus.publish(Event('alarm_start', 2.0))
+    bus.publish(Event('alarm_stop', 3.0))
+
+    assert wait_for(lambda: subscription.delivered == 2)
+    bus.close()
+    assert [body['type'] for _, _, body in received] == ['alarm_start', 'alarm_stop']
+
+
+def test_webhook_errors_are_counted_not_raised(webhook_server):
+    url, received, status = webhook_server
+    status['code'] = 500
+    bus = EventBus()
+    subscription = bus.subscribe('webhook', webhook_handler(url))
+    bus.publish(Event('alarm_start', 1.0))
+    bus.publish(Event('alarm_stop', 2.0))
+
+    assert wait_for(lambda: subscription.errors == 2)
+    bus.close()
+    assert len(received) == 2
+
+
+@pytest.mark.parametrize('policy, kept', [('drop_oldest', [96, 97, 98, 99]),
+                                          ('drop_newest', [1, 2, 3, 4])])
+def test_slow_subscriber_drops_instead_of_blocking(policy, kept):
+    release = threading.Event()
+    slow_seen, fast_seen = [], []
+
+    def slow(event):
+        release.wait(5.0)
+        slow_seen.append(event.data['i'])
+
+    bus = EventBus()
+    slow_sub = bus.subscribe('slow', slow, maxsize=4, policy=policy)
+    fast_sub = bus.subscribe('fast', lambda event: fast_seen.append(event.data['i']))
+
+    # Le thread lent est bloqué sur le premier événement
+    bus.publish(Event('frame', 0.0, {'i': 0}))
+    assert wait_for(lambda: slow_sub.queue.stats()['depth'] == 0)
+
+    start = time.perf_counter()
+    for i in range(1, 100):
+        bus.publish(Event('frame', float(i), {'i': i}))
+    elapsed = time.perf_counter() - start
+
+    # publish() ne bloque jamais sur l'abonné lent
+    assert elapsed < 0.5
+    assert slow_sub.stats()['dropped'] == 95
+
+    release.set()
+    assert wait_for(lambda: slow_sub.delivered == 5 and fast_sub.delivered == 100)
+    bus.close()
+    assert slow_seen == [0] + kept
+    assert fast_seen == list(range(100))
+
+
+class OpenEyes:
+    """Deux yeux ouverts dans chaque bande : la calibration se termine après 30 frames"""
+
+    name = 'open'
+    provides_ear = False
+
+    def detect(self, gray, min_size, max_size):
+        return [(10, 10, 40, 20), (120, 10, 40, 20)]
+
+
+def calibration_events(detector):
+    bus = EventBus()
+    seen = []
+    bus.subscribe('test', seen.append, types=('calibration_done',))
+    detector.events = bus
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    for k in range(SubjectState.CALIBRATION_SIZE):
+        detector.detect(frame, timestamp=k / 30)
+    return bus, seen
+
+
+def test_single_face_events_have_no_face_id(monkeypatch):
+    monkeypatch.setitem(eyesdetecv1.CONFIG, 'CALIBRATION_PROFILES', False)
+    detector = AdvancedDrowsinessDetector()
+    detector.locate_face = lambda prep: ((100, 100, 200, 200), False)
+    detector.eye_backend = OpenEyes()
+
+    bus, seen = calibration_events(detector)
+    assert wait_for(lambda: len(seen) == 1)
+    assert seen[0].data['face_id'] is None
+    bus.close()
+
+
+def test_multi_face_events_carry_face_id(monkeypatch):
+    monkeypatch.setitem(eyesdetecv1.CONFIG, 'CALIBRATION_PROFILES', False)
+    detector = MultiFaceDetector(workers=2)
+    detector.main.detect_faces = lambda prep: ([(40, 100, 200, 200), (360, 100, 200, 200)], [])
+    detector.models = type('Models', (), {'face_backend': detector.models.face_backend,
+                                          'eye_backend': OpenEyes()})()
+
+    bus, seen = calibration_events(detector)
+    assert wait_for(lambda: len(seen) == 2)
+    assert sorted(event.data['face_id'] for event in seen) == [1, 2]
+    bus.close()
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+
+from framestore import HEADER_SIZE, FrameRecorder, FrameReplay, record_session
+
+
+def test_recording_round_trip(tmp_path):
+    path = str(tmp_path / 'session.frm')
+    frames = [np.full((48, 64, 3), i, dtype=np.uint8) for i in range(5)]
+    recorder = FrameRecorder(path)
+    for i, frame in enumerate(frames):
+        recorder.write(frame, 100.0 + i / 30)
+    recorder.close()
+
+    replay = FrameReplay(path)
+    assert len(replay) == 5
+    for i, (timestamp, frame) in enumerate(replay):
+        assert timestamp == pytest.approx(100.0 + i / 30)
+        np.testing.assert_array_equal(frame, frames[i])
+    replay.release()
+
+
+def test_record_session_stores_mirrored_frames(tmp_path):
+    # Moitié gauche blanche : l'orientation se voit dans l'enregistrement
+    video = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    image[:, :32] = 255
+    for _ in range(3):
+        writer.write(image)
+    writer.release()
+
+    path = str(tmp_path / 'session.frm')
+    assert record_session(video, path) == 3
+
+    cap = cv2.VideoCapture(video)
+    ret, decoded = cap.read()
+    cap.release()
+    _, recorded = FrameReplay(path)[0]
+    np.testing.assert_array_equal(recorded, cv2.flip(decoded, 1))
+    assert recorded[:, 48:].mean() > 200
+
+
+@pytest.mark.parametrize('size', [0, 10, HEADER_SIZE + 100])
+def test_empty_or_truncated_file_is_rejected(tmp_path, size):
+    path = str(tmp_path / 'session.frm')
+    recorder = FrameRecorder(path)
+    recorder.write(np.zeros((48, 64, 3), dtype=np.uint8), 0.0)
+    recorder.close()
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+
+    with pytest.raises(ValueError):
+        FrameReplay(path)
@@ -0,0 +1,77 @@
+import pickle
+
+import pytest
+
+from eyesdetecv1 import RingBuffer
+
+
+def contents(buffer):
+    """Valeurs présentes, de la plus ancienne à la plus récente"""
+    _, values, timestamps, _ = buffer.__getstate__()
+    return list(values), list(timestamps)
+
+
+def test_wraparound_keeps_the_latest_values():
+    buffer = RingBuffer(5)
+    for i in range(12):
+        buffer.push(float(i), timestamp=i)
+
+    assert len(buffer) == 5
+    assert contents(buffer) == ([7.0, 8.0, 9.0, 10.0, 11.0], [7.0, 8.0, 9.0, 10.0, 11.0])
+    assert buffer.mean() == pytest.approx(9.0)
+
+
+def test_growth_past_initial_size_keeps_order():
+    capacity = 3 * RingBuffer.INITIAL_SIZE
+    buffer = RingBuffer(capacity)
+    for i in range(capacity + 10):
+        buffer.push(float(i), timestamp=i)
+
+    values, _ = contents(buffer)
+    assert len(buffer) == capacity
+    assert values == [float(i) for i in range(10, capacity + 10)]
+    assert buffer.total == pytest.approx(sum(values))
+
+
+def test_expire_drops_old_values_across_the_wrap():
+    buffer = RingBuffer(4)
+    for i in range(6):
+        buffer.push(float(i), timestamp=10.0 + i)
+
+    buffer.expire(14.0)
+    assert contents(buffer) == ([4.0, 5.0], [14.0, 15.0])
+    assert buffer.mean() == pytest.approx(4.5)
+
+    buffer.push(6.0, timestamp=16.0)
+    assert contents(buffer)[0] == [4.0, 5.0, 6.0]
+
+    buffer.expire(100.0)
+    assert len(buffer) == 0
+    assert buffer.total == 0.0
+
+
+def test_mean_default_and_clear():
+    buffer = RingBuffer(3)
+    assert buffer.mean() == 0.0
+    assert buffer.mean(default=0.3) == 0.3
+    buffer.push(0.2)
+    buffer.push(0.4)
+    assert buffer.mean(default=0.3) == pytest.approx(0.3)
+    buffer.push(1.0)
+    assert buffer.mean() == pytest.approx(1.6 / 3)
+
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.mean(default=-1.0) == -1.0
+
+
+def test_pickle_round_trip_after_wrap():
+    buffer = RingBuffer(5)
+    for i in range(8):
+        buffer.push(float(i), timestamp=i)
+
+    restored = pickle.loads(pickle.dumps(buffer))
+    assert contents(restored) == contents(buffer)
+    restored.push(8.0, timestamp=8)
+    assert contents(restored)[0] == [4.0, 5.0, 6.0, 7.0, 8.0]
+    assert restored.mean() == pytest.approx(6.0)
@@ -0,0 +1,47 @@
+import http.client
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import server
+
+
+@pytest.fixture
+def client():
+    httpd, engine = server.serve({'HOST': '127.0.0.1', 'PORT': 0,
+                                  'DECODE_WORKERS': 1, 'DETECT_WORKERS': 1})
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    connection = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=10)
+    yield connection, engine
+    connection.close()
+    httpd.shutdown()
+    httpd.server_close()
+    engine.close()
+
+
+def post_frame(connection, headers=None):
+    ok, jpeg = cv2.imencode('.jpg', np.zeros((48, 64, 3), dtype=np.uint8))
+    connection.request('POST', '/sessions/s1/frame', body=jpeg.tobytes(), headers=headers or {})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+@pytest.mark.parametrize('value', ['abc', 'nan', 'inf', '1.5.2'])
+def test_malformed_timestamp_is_rejected(client, value):
+    connection, engine = client
+    status, body = post_frame(connection, {'X-Timestamp': value})
+    assert status == 400
+    assert b'X-Timestamp' in body
+    assert engine.stats()['accepted'] == 0
+
+
+def test_valid_timestamp_is_processed(client):
+    connection, engine = client
+    status, body = post_frame(connection, {'X-Timestamp': '12.5'})
+    assert status == 200
+    # La connexion reste utilisable après un refus
+    assert post_frame(connection, {'X-Timestamp': 'abc'})[0] == 400
+    assert post_frame(connection)[0] == 200
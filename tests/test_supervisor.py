@@ -0,0 +1,105 @@
+import multiprocessing as mp
+import os
+import queue
+
+import cv2
+import numpy as np
+import pytest
+
+import supervisor
+from eyesdetecv1 import AdvancedDrowsinessDetector
+
+FRAMES = 40
+
+pytestmark = pytest.mark.skipif(mp.get_start_method() != 'fork',
+                                reason="les workers doivent hériter des remplacements de test")
+
+
+def write_video(path):
+    """Vidéo locale : frames blanches (visage simulé) et noires en alternance"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+    for i in range(FRAMES):
+        writer.write(np.full((48, 64, 3), 255 if i % 2 == 0 else 0, dtype=np.uint8))
+    writer.release()
+
+
+def fake_detect(self, frame, timestamp=None):
+    """Résultats déterminés par l'image : visage et clignement sur les frames blanches"""
+    results = self.new_results()
+    if frame.mean() > 127:
+        results['face_detected'] = True
+        results['is_drowsy'] = True
+        self.state.blink_counter += 1
+    return results
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    path = str(tmp_path / 'clip.avi')
+    write_video(path)
+    monkeypatch.setattr(AdvancedDrowsinessDetector, 'detect', fake_detect)
+    # Un rapport par frame : la reprise se fait exactement là où le worker s'est arrêté
+    monkeypatch.setitem(supervisor.SUPERVISOR_CONFIG, 'REPORT_INTERVAL', 0.0)
+    return path
+
+
+def test_local_file_counts_every_frame(video):
+    summary = supervisor.StreamSupervisor([video], workers=1).run()
+
+    report = summary['streams'][video]
+    assert report['type'] == 'done'
+    assert report['frames'] == FRAMES
+    assert report['face_frames'] == FRAMES // 2
+    assert report['blinks'] == FRAMES // 2
+    assert summary['restarts'] == 0
+
+
+def test_restart_keeps_counters(video, tmp_path, monkeypatch):
+    marker = str(tmp_path / 'crashed')
+    worker_main = supervisor.worker_main
+
+    def crashing_worker(*args):
+        # Première exécution seulement : plantage brutal après 15 frames
+        if not os.path.exists(marker):
+            open(marker, 'w').close()
+            update = supervisor.StreamState.update
+
+            def update_then_crash(self, results):
+                update(self, results)
+                if self.processed == 15:
+                    self.cap.release()
+                    os._exit(1)
+
+            supervisor.StreamState.update = update_then_crash
+        worker_main(*args)
+
+    monkeypatch.setattr(supervisor, 'worker_main', crashing_worker)
+    summary = supervisor.StreamSupervisor([video], workers=1).run()
+
+    report = summary['streams'][video]
+    assert summary['restarts'] == 1
+    assert report['type'] == 'done'
+    # Les compteurs d'avant le plantage sont repris, pas remis à zéro
+    assert report['frames'] == FRAMES
+    assert report['face_frames'] == FRAMES // 2
+    assert report['drowsy_frames'] == FRAMES // 2
+    assert report['blinks'] == FRAMES // 2
+
+
+def test_file_frames_use_media_time(video, monkeypatch):
+    timestamps = []
+
+    def recording_detect(self, frame, timestamp=None):
+        timestamps.append(timestamp)
+        return fake_detect(self, frame, timestamp)
+
+    monkeypatch.setattr(AdvancedDrowsinessDetector, 'detect', recording_detect)
+    results = queue.Queue()
+    # Reprise après un plantage à la frame 10 : l'horloge média continue
+    supervisor.worker_main(0, [video], {video: {'frames': 10}}, results, {})
+
+    assert len(timestamps) == FRAMES - 10
+    assert timestamps == pytest.approx([i / 30 for i in range(10, FRAMES)])
+    reports = [results.get_nowait() for _ in range(results.qsize())]
+    assert reports[-1]['type'] == 'done'
+    assert reports[-1]['frames'] == FRAMES
@@ -0,0 +1,119 @@
+import itertools
+
+import cv2
+import numpy as np
+import pytest
+
+import sweep
+from eyesdetecv1 import CONFIG, AdvancedDrowsinessDetector
+
+FRAMES = 600
+FACE = (100, 100, 200, 200)
+
+
+def make_plan(seed=3):
+    """Pour chaque frame : None (pas de visage) ou rectangles des yeux dans la bande"""
+    rng = np.random.default_rng(seed)
+    plan = []
+    for k in range(FRAMES):
+        if 300 < k < 340 or k % 97 < 3:
+            plan.append(None)
+        elif k % 50 < int(rng.integers(0, 12)):
+            plan.append([])
+        else:
+            plan.append([(10, 10, int(rng.integers(15, 45)), int(rng.integers(3, 22)))
+                         for _ in range(int(rng.integers(1, 3)))])
+    return plan
+
+
+class ScriptedEyes:
+    name = 'scripted'
+    provides_ear = False
+
+    def __init__(self, plan, current):
+        self.plan = plan
+        self.current = current
+
+    def detect(self, gray, min_size, max_size):
+        # Coordonnées relatives à la bande des yeux du visage FACE
+        return [(x - 100, y - 140, w, h) for x, y, w, h in self.plan[self.current[0]]]
+
+
+def scripted_detector(plan):
+    """Détecteur réel dont seuls le visage et les cascades des yeux sont scriptés"""
+    detector = AdvancedDrowsinessDetector()
+    current = [0]
+    frames = itertools.count()
+    detector.locate_face = lambda prep: ((None, False) if plan[current[0]] is None
+                                         else (FACE, False))
+    detector.eye_backend = ScriptedEyes(plan, current)
+    detect = detector.detect
+
+    def scripted_detect(frame, timestamp=None):
+        current[0] = next(frames)
+        return detect(frame, timestamp=timestamp)
+
+    detector.detect = scripted_detect
+    return detector
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+    for _ in range(FRAMES):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.fixture(autouse=True)
+def isolated_config(monkeypatch, tmp_path):
+    # record_clip modifie CONFIG : état restauré après chaque test
+    for key, value in CONFIG.items():
+        monkeypatch.setitem(CONFIG, key, value)
+    monkeypatch.setitem(sweep.SWEEP_CONFIG, 'CACHE_DIR', str(tmp_path / 'cache'))
+
+
+def test_cache_key_covers_every_detection_setting(clip):
+    base = sweep.detection_config({})
+    path = sweep.cache_path(clip, base)
+    for key, value in [('FACE_BACKEND', 'lbp'), ('FACE_PYRAMID_LEVEL', 2),
+                       ('FACE_TRACKING', False), ('EYE_PREDICTION', False),
+                       ('MOTION_GATING', True), ('MIN_FACE_SIZE', 80), ('MAX_FACE_SIZE', 300)]:
+        assert sweep.cache_path(clip, dict(base, **{key: value})) != path, key
+    for key, value in [('EYE_AR_THRESHOLD', 0.3), ('EYE_AR_CONSEC_FRAMES', 3),
+                       ('EAR_CLOSED', 0.1)]:
+        assert sweep.cache_path(clip, dict(base, **{key: value})) == path, key
+
+
+def test_detection_config_starts_from_parent_config(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'FACE_PYRAMID_LEVEL', 2)
+    config = sweep.detection_config({'EYE_MIN_NEIGHBORS': 3})
+    assert config['FACE_PYRAMID_LEVEL'] == 2
+    assert config['EYE_MIN_NEIGHBORS'] == 3
+    assert config['CALIBRATION_PROFILES'] is False
+
+
+def test_replay_matches_full_run(clip, monkeypatch):
+    plan = make_plan()
+    monkeypatch.setattr(sweep, 'AdvancedDrowsinessDetector', lambda: scripted_detector(plan))
+    config = sweep.detection_config({'EYE_PREDICTION': False})
+    path = sweep.cache_path(clip, config)
+    summary = sweep.record_clip(clip, config, path)
+    assert summary['frames'] == FRAMES
+    with np.load(path) as data:
+        cache = {k: data[k] for k in data.files}
+
+    for threshold, consec, bands in itertools.product(
+            (0.18, 0.22), (3, 10), sweep.DEFAULT_GRID['EAR_BANDS']):
+        CONFIG.update(EYE_AR_THRESHOLD=threshold, EYE_AR_CONSEC_FRAMES=consec, EAR_BANDS=bands)
+        detector = scripted_detector(plan)
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        full = np.array([detector.detect(frame, timestamp=k / 30)['is_drowsy']
+                         for k in range(FRAMES)])
+
+        ear, counts = sweep.calibrated_ears(cache, bands, CONFIG['EAR_CLOSED'])
+        replay = sweep.drowsy_frames(cache, ear, counts, threshold, consec)
+        assert full.any()
+        np.testing.assert_array_equal(replay, full)